@@ -0,0 +1,550 @@
+"""
+Ajuste de los pesos de las evaluaciones con posiciones guardadas (Texel)
+
+Las evaluaciones de este módulo son lineales en características del
+tablero, y el valor para el jugador 1 es tanh(z / 2), con z la suma de
+las características por sus pesos; es 2 p - 1, donde p = sigmoide(z) es
+la probabilidad de que gane el jugador 1. Los pesos se ajustan para que
+p se parezca al resultado de las partidas (1, 1/2 o 0) en un archivo de
+`registros.py`:
+
+    python torneo.py othello --tiempos 0.1 0.1 --partidas 2000 \\
+        --salida partidas.jsonl
+    python registros.py othello partidas.jsonl othello.pos
+    python ajuste.py othello othello.pos
+
+Hay dos métodos:
+
+    1- Regresión logística con el método de Newton (por omisión): pocas
+       pasadas sobre todos los datos, con regularización L2
+    2- Descenso por coordenadas de Texel: mueve un peso a la vez un paso
+       mientras baje el error cuadrático
+
+Las características se calculan sobre tableros de bits con operaciones
+que sirven igual para enteros de Python (una posición, en la búsqueda) y
+para arreglos de numpy de uint64 (millones de posiciones, al ajustar):
+
+    Conecta4: ventanas de cuatro con 1, 2 y 3 fichas propias y ninguna
+        del rival, amenazas (casillas vacías que completan cuatro) en
+        filas impares y pares, y fichas por distancia a la columna central
+    Othello: fichas en cada una de las 10 clases de casillas (por
+        simetría; esquinas, X, C, ...), movilidad, fichas en la frontera y
+        fichas estables
+
+Todas son la diferencia entre el jugador 1 y el -1. Los pesos se guardan
+en JSON (ARCHIVO_PESOS) y cada `Evaluacion` los carga al crearse, con
+los pesos iniciales de la familia si no hay archivo.
+
+"""
+
+import argparse
+import json
+import os
+from time import perf_counter
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from conect4 import Conecta4
+from othello import Othello
+from othello_bitboard import DIRECCIONES, TODO, desplaza
+from othello_bitboard import mascara_jugadas as jugadas_bits
+from registros import FORMATOS, carga
+
+# Archivo de pesos de cada juego, junto a este módulo
+ARCHIVO_PESOS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "pesos_{}.json"
+)
+
+# Posiciones por lote al calcular las características de un archivo
+LOTE = 1 << 16
+
+
+def _cuenta(b):
+    """
+    Número de bits en 1 de un entero o de cada elemento de un arreglo
+
+    """
+    if isinstance(b, int):
+        return b.bit_count()
+    return np.bitwise_count(b).astype(np.int32)
+
+
+def _bits(casillas):
+    return sum(1 << k for k in casillas)
+
+
+# ---------------------------------------------------------------------
+# Conecta4: bit 7 c + r para la columna c y la fila r (0 abajo)
+# ---------------------------------------------------------------------
+
+
+def _ventanas_c4():
+    ventanas = []
+    for c in range(7):
+        for r in range(6):
+            for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                celdas = [(c + k * dc, r + k * dr) for k in range(4)]
+                if all(0 <= x < 7 and 0 <= y < 6 for x, y in celdas):
+                    ventanas.append(_bits(7 * x + y for x, y in celdas))
+    return tuple(ventanas)
+
+
+VENTANAS_C4 = _ventanas_c4()
+
+# Filas 1, 3 y 5 contando desde abajo
+IMPARES_C4 = _bits(7 * c + r for c in range(7) for r in (0, 2, 4))
+PARES_C4 = _bits(7 * c + r for c in range(7) for r in (1, 3, 5))
+
+# Casillas de las columnas a distancia 0, 1, 2 y 3 del centro
+DISTANCIAS_C4 = tuple(
+    _bits(7 * c + r for c in range(7) for r in range(6) if abs(c - 3) == d)
+    for d in range(4)
+)
+
+
+def caracteristicas_conecta4(uno, dos):
+    """
+    Características de Conecta4 con las fichas de cada jugador (enteros o
+    arreglos de uint64), como lista en el orden de FAMILIAS["conecta4"]
+
+    """
+    ventanas = [0] * 6
+    amenazas1 = amenazas2 = 0
+    for ventana in VENTANAS_C4:
+        n1, n2 = _cuenta(uno & ventana), _cuenta(dos & ventana)
+        for k in (1, 2, 3):
+            ventanas[k - 1] += (n1 == k) & (n2 == 0)
+            ventanas[k + 2] += (n2 == k) & (n1 == 0)
+        amenazas1 |= ((n1 == 3) & (n2 == 0)) * (ventana & ~uno)
+        amenazas2 |= ((n2 == 3) & (n1 == 0)) * (ventana & ~dos)
+    return [
+        ventanas[0] - ventanas[3],
+        ventanas[1] - ventanas[4],
+        ventanas[2] - ventanas[5],
+        _cuenta(amenazas1 & IMPARES_C4) - _cuenta(amenazas2 & IMPARES_C4),
+        _cuenta(amenazas1 & PARES_C4) - _cuenta(amenazas2 & PARES_C4),
+    ] + [_cuenta(uno & m) - _cuenta(dos & m) for m in DISTANCIAS_C4]
+
+
+def clase_columna(a):
+    """
+    Índice de la característica de la columna a (su distancia al centro)
+
+    """
+    return 5 + abs(a - 3)
+
+
+# ---------------------------------------------------------------------
+# Othello: bit 8 i + j para la casilla (i, j)
+# ---------------------------------------------------------------------
+
+
+def _clase_othello(i, j):
+    a, b = min(i, 7 - i), min(j, 7 - j)
+    return min(a, b), max(a, b)
+
+
+CLASES_OTHELLO = tuple(
+    sorted({_clase_othello(i, j) for i in range(8) for j in range(8)})
+)
+MASCARAS_CLASES = tuple(
+    _bits(8 * i + j for i in range(8) for j in range(8) if _clase_othello(i, j) == c)
+    for c in CLASES_OTHELLO
+)
+
+MASCARAS_DIRECCION = dict(DIRECCIONES)
+
+# Casillas sin vecina en la dirección n
+BORDES = {
+    n: TODO ^ desplaza(TODO, -n, MASCARAS_DIRECCION[-n]) for n in MASCARAS_DIRECCION
+}
+
+
+def estables(propias):
+    """
+    Fichas que ya no se pueden voltear: las que en cada una de las cuatro
+    líneas que pasan por ellas tienen de un lado la orilla o una ficha
+    propia estable. Es una cota inferior, crece desde las esquinas.
+
+    """
+    resultado = propias & 0
+    while True:
+        # Una copia: con arreglos `&=` modificaría a `propias`
+        nuevas = propias & TODO
+        for n in (1, 7, 8, 9):
+            antes = desplaza(resultado, n, MASCARAS_DIRECCION[n]) | BORDES[-n]
+            despues = desplaza(resultado, -n, MASCARAS_DIRECCION[-n]) | BORDES[n]
+            nuevas &= antes | despues
+        if np.array_equal(nuevas, resultado):
+            return resultado
+        resultado = nuevas
+
+
+def caracteristicas_othello(negras, blancas):
+    """
+    Características de Othello con las fichas de cada color (enteros o
+    arreglos de uint64), como lista en el orden de FAMILIAS["othello"]
+
+    """
+    vacias = (negras | blancas) ^ TODO
+    junto_vacia = 0
+    for n, mascara in DIRECCIONES:
+        junto_vacia |= desplaza(vacias, n, mascara)
+    return [_cuenta(negras & m) - _cuenta(blancas & m) for m in MASCARAS_CLASES] + [
+        _cuenta(jugadas_bits(negras, blancas)) - _cuenta(jugadas_bits(blancas, negras)),
+        _cuenta(negras & junto_vacia) - _cuenta(blancas & junto_vacia),
+        _cuenta(estables(negras)) - _cuenta(estables(blancas)),
+    ]
+
+
+def clase_casilla(a):
+    """
+    Índice de la característica de la clase de la casilla a
+
+    """
+    return CLASES_OTHELLO.index(_clase_othello(*a))
+
+
+class Familia(NamedTuple):
+    """
+    Las características de un juego
+
+    """
+
+    nombres: tuple
+    # (fichas1, fichas2) -> lista de características
+    calcula: Callable
+    iniciales: tuple
+    # jugada -> índice de la característica de su casilla, para ordenar
+    clase_jugada: Callable
+
+
+FAMILIAS = {
+    "conecta4": Familia(
+        (
+            "ventanas_1",
+            "ventanas_2",
+            "ventanas_3",
+            "amenazas_impares",
+            "amenazas_pares",
+        )
+        + tuple(f"columna_{d}" for d in range(4)),
+        caracteristicas_conecta4,
+        (0.02, 0.05, 0.1, 0.5, 0.3, 0.1, 0.05, 0.0, -0.05),
+        clase_columna,
+    ),
+    "othello": Familia(
+        tuple(f"casilla_{a}{b}" for a, b in CLASES_OTHELLO)
+        + ("movilidad", "frontera", "estables"),
+        caracteristicas_othello,
+        # Clases: 00 esquina, 01 C, 02, 03, 11 X, 12, 13, 22, 23, 33
+        (0.5, -0.1, 0.05, 0.02, -0.25, -0.02, -0.02, 0.01, 0.0, 0.0)
+        + (0.05, -0.03, 0.1),
+        clase_casilla,
+    ),
+}
+
+
+def matriz(familia, fichas1, fichas2):
+    """
+    Arreglo (n, características) de float32 para n posiciones
+
+    """
+    columnas = familia.calcula(
+        np.asarray(fichas1, dtype=np.uint64), np.asarray(fichas2, dtype=np.uint64)
+    )
+    return np.stack(columnas, axis=1).astype(np.float32)
+
+
+def datos(registros, familia, lote=LOTE):
+    """
+    Características y objetivos de un arreglo de registros (por ejemplo
+    el memmap de `registros.carga`), por lotes
+
+    Regresa
+    -------
+    tuple: (X, y), con X de (n, características) y y el resultado de cada
+        partida para el jugador 1 como 1, 1/2 o 0
+
+    """
+    n = len(registros)
+    X = np.empty((n, len(familia.nombres)), dtype=np.float32)
+    for k in range(0, n, lote):
+        parte = registros[k : k + lote]
+        X[k : k + lote] = matriz(familia, parte["fichas1"], parte["fichas2"])
+    y = (registros["resultado"].astype(np.float32) + 1) / 2
+    return X, y
+
+
+def sigmoide(z):
+    return 1 / (1 + np.exp(-z))
+
+
+def error(X, y, pesos):
+    """
+    Error cuadrático medio entre sigmoide(X pesos) y los resultados
+
+    """
+    return float(np.mean((sigmoide(X @ pesos) - y) ** 2))
+
+
+def regresion_logistica(X, y, pesos=None, iteraciones=25, regularizacion=1e-4):
+    """
+    Pesos que minimizan la entropía cruzada de sigmoide(X pesos) contra
+    y, más regularizacion * |pesos|² / 2, con el método de Newton
+
+    Regresa
+    -------
+    numpy.ndarray: los pesos (float64)
+
+    """
+    X64 = X.astype(np.float64)
+    n, m = X64.shape
+    pesos = np.zeros(m) if pesos is None else np.array(pesos, dtype=np.float64)
+    for _ in range(iteraciones):
+        p = sigmoide(X64 @ pesos)
+        gradiente = X64.T @ (p - y) / n + regularizacion * pesos
+        hessiana = (X64.T * (p * (1 - p))) @ X64 / n + regularizacion * np.eye(m)
+        paso = np.linalg.solve(hessiana, gradiente)
+        pesos -= paso
+        if np.abs(paso).max() < 1e-7:
+            break
+    return pesos
+
+
+def descenso_coordenadas(X, y, pesos=None, paso=0.01, rondas=100):
+    """
+    Ajuste de Texel: en cada ronda se prueba sumar y restar `paso` a cada
+    peso y se conserva el cambio si baja el error cuadrático. Termina
+    cuando una ronda no mejora nada. El producto X pesos se actualiza con
+    la columna del peso que cambia, sin volver a multiplicar.
+
+    Regresa
+    -------
+    numpy.ndarray: los pesos (float64)
+
+    """
+    pesos = np.zeros(X.shape[1]) if pesos is None else np.array(pesos, dtype=float)
+    z = X @ pesos
+    mejor = np.mean((sigmoide(z) - y) ** 2)
+    for _ in range(rondas):
+        mejoro = False
+        for k in range(len(pesos)):
+            for delta in (paso, -paso):
+                prueba = z + delta * X[:, k]
+                e = np.mean((sigmoide(prueba) - y) ** 2)
+                if e < mejor:
+                    mejor, z, mejoro = e, prueba, True
+                    pesos[k] += delta
+                    break
+        if not mejoro:
+            break
+    return pesos
+
+
+def guarda_pesos(archivo, juego, pesos, **extra):
+    """
+    Guarda los pesos de un juego en JSON, con el nombre de cada
+    característica y los datos de `extra`
+
+    """
+    nombres = FAMILIAS[juego].nombres
+    with open(archivo, "w") as f:
+        json.dump(
+            {
+                "juego": juego,
+                "pesos": dict(zip(nombres, (float(p) for p in pesos))),
+                **extra,
+            },
+            f,
+            indent=2,
+        )
+
+
+def carga_pesos(juego, archivo=None):
+    """
+    Pesos de un juego desde un archivo de `guarda_pesos`. Si archivo es
+    None se usa ARCHIVO_PESOS y, si no existe, los pesos iniciales de la
+    familia.
+
+    """
+    familia = FAMILIAS[juego]
+    if archivo is None:
+        archivo = ARCHIVO_PESOS.format(juego)
+        if not os.path.exists(archivo):
+            return np.array(familia.iniciales)
+    with open(archivo) as f:
+        contenido = json.load(f)
+    if contenido["juego"] != juego:
+        raise ValueError(f"{archivo} tiene pesos de {contenido['juego']}")
+    faltan = set(familia.nombres) - set(contenido["pesos"])
+    if faltan:
+        raise ValueError(f"A {archivo} le faltan los pesos {sorted(faltan)}")
+    return np.array([contenido["pesos"][nombre] for nombre in familia.nombres])
+
+
+class Evaluacion:
+    """
+    Evaluación lineal con pesos ajustados para los estados de un modelo
+
+    Se usa como `evalua` (llamándola con un estado), como `evalua_lote`
+    (método `lote`) y como `ordena` (método `ordena`, por el peso de la
+    clase de casilla o columna de cada jugada). Se puede mandar a otros
+    procesos.
+
+    Parametros
+    ----------
+    juego (ModeloJuegoZT2): Modelo con formato en `registros.FORMATOS`
+    archivo (str): Archivo de pesos (ver `carga_pesos`)
+
+    """
+
+    def __init__(self, juego, archivo=None):
+        self.modelo = type(juego)
+        self.juego = FORMATOS[self.modelo].juego
+        self.pesos = carga_pesos(self.juego, archivo)
+        self._pesos = self.pesos.tolist()
+
+    @property
+    def familia(self):
+        return FAMILIAS[self.juego]
+
+    def __call__(self, s):
+        z = sum(
+            p * x
+            for p, x in zip(
+                self._pesos, self.familia.calcula(*FORMATOS[self.modelo].a_bits(s))
+            )
+        )
+        return float(np.tanh(z / 2))
+
+    def lote(self, estados):
+        a_bits = FORMATOS[self.modelo].a_bits
+        fichas1, fichas2 = zip(*(a_bits(s) for s in estados))
+        return np.tanh(matriz(self.familia, fichas1, fichas2) @ self.pesos / 2)
+
+    def ordena(self, jugadas, jugador):
+        if len(jugadas) < 2:
+            # Incluye el pase de Othello, que siempre es la única jugada
+            return list(jugadas)
+        clase = self.familia.clase_jugada
+        return sorted(jugadas, key=lambda a: -self._pesos[clase(a)])
+
+
+# Con los pesos de ARCHIVO_PESOS al importar el módulo
+evalua_conecta4 = Evaluacion(Conecta4())
+evalua_othello = Evaluacion(Othello())
+
+
+def verifica(juego, partidas=5, d=3, semilla=0):
+    """
+    Revisa, en posiciones de partidas al azar, que `Evaluacion.lote` dé
+    lo mismo que evaluar uno por uno y que `minimax.jugador_negamax`
+    acepte la Evaluacion como evalua, su `ordena` y su `lote`
+
+    Regresa
+    -------
+    int: número de posiciones revisadas
+
+    """
+    from random import Random
+
+    from minimax import Busqueda, jugador_negamax
+
+    evaluacion = Evaluacion(juego)
+    azar = Random(semilla)
+    posiciones = []
+    for _ in range(partidas):
+        s, j = juego.inicializa()
+        while not juego.terminal(s):
+            posiciones.append((s, j))
+            s, j = (
+                juego.transicion(s, azar.choice(list(juego.jugadas_legales(s, j))), j),
+                -j,
+            )
+    lote = evaluacion.lote([s for s, _ in posiciones])
+    for (s, _), v in zip(posiciones, lote.tolist()):
+        if abs(evaluacion(s) - v) > 1e-5:
+            raise AssertionError(f"lote da {v} y la evaluación {evaluacion(s)}")
+    busqueda = Busqueda(semilla=semilla)
+    for s, j in posiciones[:: max(1, len(posiciones) // 10)]:
+        a = jugador_negamax(
+            juego,
+            s,
+            j,
+            ordena=evaluacion.ordena,
+            d=d,
+            evalua=evaluacion,
+            busqueda=busqueda,
+            evalua_lote=evaluacion.lote,
+        )
+        if a not in list(juego.jugadas_legales(s, j)):
+            raise AssertionError(f"jugador_negamax regresó la jugada ilegal {a}")
+    return len(posiciones)
+
+
+def ajusta(archivo, juego, metodo="newton", salida=None, validacion=0.1, semilla=0):
+    """
+    Ajusta los pesos de un juego con las posiciones de un archivo de
+    registros y los guarda
+
+    Una fracción `validacion` de las posiciones (al azar) no se usa para
+    ajustar, solo para medir el error.
+
+    Regresa
+    -------
+    tuple: (pesos, dict con posiciones, segundos de cada parte y error
+        de los pesos iniciales y finales en validación)
+
+    """
+    familia = FAMILIAS[juego]
+    t0 = perf_counter()
+    X, y = datos(carga(archivo), familia)
+    t1 = perf_counter()
+    prueba = np.random.default_rng(semilla).random(len(y)) < validacion
+    iniciales = np.array(familia.iniciales)
+    if metodo == "newton":
+        pesos = regresion_logistica(X[~prueba], y[~prueba])
+    else:
+        pesos = descenso_coordenadas(X[~prueba], y[~prueba], iniciales)
+    t2 = perf_counter()
+    resumen = {
+        "posiciones": len(y),
+        "segundos_caracteristicas": t1 - t0,
+        "segundos_ajuste": t2 - t1,
+        "error_inicial": error(X[prueba], y[prueba], iniciales),
+        "error": error(X[prueba], y[prueba], pesos),
+    }
+    if salida is not None:
+        guarda_pesos(salida, juego, pesos, metodo=metodo, **resumen)
+    return pesos, resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("juego", choices=sorted(FAMILIAS))
+    parser.add_argument("posiciones", help="archivo de registros.py")
+    parser.add_argument("--metodo", choices=("newton", "texel"), default="newton")
+    parser.add_argument("--salida", help="archivo de pesos (por omisión ARCHIVO_PESOS)")
+    parser.add_argument("--validacion", type=float, default=0.1)
+    args = parser.parse_args()
+
+    pesos, resumen = ajusta(
+        args.posiciones,
+        args.juego,
+        args.metodo,
+        args.salida or ARCHIVO_PESOS.format(args.juego),
+        args.validacion,
+    )
+    for nombre, peso in zip(FAMILIAS[args.juego].nombres, pesos):
+        print(f"{nombre:18} {peso:+.4f}")
+    n = resumen["posiciones"]
+    print(
+        f"{n} posiciones, características {resumen['segundos_caracteristicas']:.1f} s "
+        f"({60 * n / resumen['segundos_caracteristicas']:.0f} por minuto), "
+        f"ajuste {resumen['segundos_ajuste']:.1f} s"
+    )
+    print(
+        f"error en validación {resumen['error_inicial']:.4f} -> {resumen['error']:.4f}"
+    )
@@ -0,0 +1,346 @@
+"""
+Libros de aperturas
+
+Un libro guarda, para posiciones del principio de la partida, las jugadas
+que conviene hacer con un peso cada una. `minimax.minimax_iterativo` y
+`minimax.jugador_negamax` lo consultan antes de buscar (parámetro
+`libro`): si la posición está, eligen al azar una de sus jugadas con
+probabilidad proporcional a su peso, así que las partidas no se repiten,
+y no buscan.
+
+Las posiciones se identifican por la clave canónica del juego
+(`clave_canonica`, combinada con TURNO si juega el jugador -1) y las
+jugadas se guardan como quedan en el representante canónico, así que una
+entrada sirve para todas las posiciones simétricas. Como las claves
+canónicas cambian de un modelo a otro, el libro es de un modelo (su
+nombre va en la cabecera).
+
+Los libros se generan de dos formas:
+
+    1- Por búsqueda: en cada posición hasta `plies` jugadas desde la
+       inicial se busca cada jugada a profundidad fija y se guardan las
+       que quedan a `margen` o menos de la mejor
+    2- Con estadísticas de partidas (`torneo.py`): las jugadas que los
+       motores hicieron en las primeras `plies` jugadas, con peso igual a
+       los puntos que obtuvieron (2 por victoria, 1 por empate)
+
+    python aperturas.py busqueda conecta4 --plies 4 --profundidad 8
+    python aperturas.py partidas othello partidas.jsonl --plies 10
+
+El archivo tiene una cabecera de CABECERA.size bytes (MARCA, versión,
+modelo y número de entradas) y luego tres columnas: las claves (uint64,
+ordenadas), las jugadas codificadas (`codifica_jugada`, uint16) y los
+pesos (uint32). Cada columna se lee con `numpy.memmap` y una consulta es
+una búsqueda binaria sobre las claves, de unos microsegundos.
+
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+
+import numpy as np
+
+from transposicion import TURNO
+
+# Marca, versión, modelo y número de entradas
+CABECERA = struct.Struct("<6sB25sQ")
+MARCA = b"ZT2APE"
+VERSION = 1
+
+# Libros abiertos en este proceso, por archivo
+_LIBROS = {}
+
+
+def clave_libro(juego, s, j):
+    """
+    Regresa (clave, simetria): la clave con la que la posición s, con j
+    en turno, está en los libros, y la simetría que la lleva a su
+    representante canónico
+
+    """
+    clave, simetria = juego.clave_canonica(s)
+    return clave ^ (TURNO if j == -1 else 0), simetria
+
+
+class Libro:
+    """
+    Libro de aperturas de un archivo, leído con `numpy.memmap`
+
+    Al mandarlo a otro proceso solo viaja el nombre del archivo, que se
+    vuelve a abrir allá (ver `abre`).
+
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        with open(archivo, "rb") as f:
+            datos = f.read(CABECERA.size)
+        if len(datos) < CABECERA.size:
+            raise ValueError(f"{archivo} no tiene cabecera")
+        marca, version, modelo, n = CABECERA.unpack(datos)
+        if marca != MARCA or version != VERSION:
+            raise ValueError(
+                f"{archivo} no es un libro de aperturas (versión {VERSION})"
+            )
+        self.modelo = modelo.rstrip(b"\0").decode()
+        self.claves, self.jugadas, self.pesos = (
+            (
+                np.memmap(archivo, dtype=tipo, mode="r", offset=inicio, shape=(n,))
+                if n
+                else np.zeros(0, dtype=tipo)
+            )
+            for tipo, inicio in _columnas(n)
+        )
+
+    def __len__(self):
+        return len(self.claves)
+
+    def __reduce__(self):
+        return abre, (self.archivo,)
+
+    def opciones(self, juego, s, j):
+        """
+        Lista de (jugada, peso) del libro para la posición s con j en
+        turno, vacía si no está. Solo incluye jugadas legales.
+
+        """
+        if type(juego).__name__ != self.modelo:
+            raise ValueError(f"El libro {self.archivo} es de {self.modelo}")
+        clave, simetria = clave_libro(juego, s, j)
+        clave = np.uint64(clave)
+        inicio = int(np.searchsorted(self.claves, clave))
+        if inicio == len(self.claves) or self.claves[inicio] != clave:
+            return []
+        fin = int(np.searchsorted(self.claves, clave, side="right"))
+        legales = list(juego.jugadas_legales(s, j))
+        opciones = []
+        for codigo, peso in zip(
+            self.jugadas[inicio:fin].tolist(), self.pesos[inicio:fin].tolist()
+        ):
+            a = juego.jugada_original(juego.decodifica_jugada(codigo), simetria)
+            if a in legales:
+                opciones.append((a, peso))
+        return opciones
+
+    def jugada(self, juego, s, j, azar=random):
+        """
+        Una jugada del libro elegida al azar con probabilidad proporcional
+        a su peso, o None si la posición no está en el libro
+
+        """
+        opciones = self.opciones(juego, s, j)
+        if not opciones:
+            return None
+        jugadas, pesos = zip(*opciones)
+        return azar.choices(jugadas, weights=pesos)[0]
+
+
+def abre(archivo):
+    """
+    El Libro del archivo, abierto una sola vez por proceso
+
+    """
+    archivo = os.path.abspath(archivo)
+    if archivo not in _LIBROS:
+        _LIBROS[archivo] = Libro(archivo)
+    return _LIBROS[archivo]
+
+
+def _columnas(n):
+    """
+    (tipo, posición en el archivo) de cada columna de un libro de n
+    entradas
+
+    """
+    return (
+        ("<u8", CABECERA.size),
+        ("<u2", CABECERA.size + 8 * n),
+        ("<u4", CABECERA.size + 10 * n),
+    )
+
+
+def escribe(archivo, juego, entradas):
+    """
+    Escribe un libro
+
+    Parametros
+    ----------
+    juego (ModeloJuegoZT2): Modelo del libro
+    entradas (dict): {clave: {jugada codificada: peso}}, con las claves de
+        `clave_libro` y las jugadas como quedan en el representante
+        canónico
+
+    Regresa
+    -------
+    int: número de entradas (pares posición, jugada)
+
+    """
+    filas = sorted(
+        (clave, -peso, codigo)
+        for clave, jugadas in entradas.items()
+        for codigo, peso in jugadas.items()
+        if peso > 0
+    )
+    n = len(filas)
+    claves = np.array([f[0] for f in filas], dtype="<u8")
+    codigos = np.array([f[2] for f in filas], dtype="<u2")
+    pesos = np.array([-f[1] for f in filas], dtype="<u4")
+    with open(archivo, "wb") as f:
+        f.write(CABECERA.pack(MARCA, VERSION, type(juego).__name__.encode(), n))
+        for columna in (claves, codigos, pesos):
+            f.write(columna.tobytes())
+    _LIBROS.pop(os.path.abspath(archivo), None)
+    return n
+
+
+def _codigo(juego, a, simetria):
+    return juego.codifica_jugada(juego.transforma_jugada(a, simetria))
+
+
+def genera_por_busqueda(
+    juego, plies, evalua, ordena=None, d=6, margen=0.0, busqueda=None
+):
+    """
+    Libro con las mejores jugadas según el negamax a profundidad d de
+    cada posición a menos de `plies` jugadas de la inicial (una por clase
+    de simetría). Las posiciones con una sola jugada no se guardan.
+
+    Cada jugada se busca por separado (su valor es el de la posición a la
+    que lleva, a profundidad d - 1) y se guardan con peso 1 las que
+    quedan a `margen` o menos de la mejor.
+
+    Regresa
+    -------
+    dict: entradas para `escribe`
+
+    """
+    from minimax import Busqueda, jugador_negamax
+
+    if busqueda is None:
+        busqueda = Busqueda(semilla=0)
+    entradas, vistas = {}, set()
+    nivel = [juego.inicializa()]
+    for _ in range(plies):
+        siguiente = []
+        for s, j in nivel:
+            clave, simetria = clave_libro(juego, s, j)
+            if clave in vistas or juego.terminal(s):
+                continue
+            vistas.add(clave)
+            valores = {}
+            for a in juego.jugadas_legales(s, j):
+                hijo = juego.transicion(s, a, j)
+                siguiente.append((hijo, -j))
+                if juego.terminal(hijo):
+                    valores[a] = j * juego.ganancia(hijo)
+                elif d > 1:
+                    jugador_negamax(
+                        juego, hijo, -j, ordena, d - 1, evalua, busqueda=busqueda
+                    )
+                    valores[a] = -busqueda.valor
+                else:
+                    valores[a] = j * evalua(hijo)
+            if len(valores) < 2:
+                continue
+            mejor = max(valores.values())
+            entradas[clave] = {
+                _codigo(juego, a, simetria): 1
+                for a, v in valores.items()
+                if v >= mejor - margen
+            }
+        nivel = siguiente
+    return entradas
+
+
+def genera_por_partidas(juego, partidas, plies, minimo=2):
+    """
+    Libro con las jugadas que hicieron los motores en las primeras
+    `plies` jugadas de las partidas de un archivo de `torneo.py` (las de
+    la apertura al azar no cuentan). El peso de una jugada es la suma de
+    los puntos que obtuvo quien la hizo: 2 por victoria y 1 por empate.
+
+    Parametros
+    ----------
+    partidas (str): Archivo JSON lines de `torneo.torneo`
+    minimo (int): Veces que se debe haber jugado una jugada para entrar
+
+    Regresa
+    -------
+    dict: entradas para `escribe`
+
+    """
+    # (clave, jugada codificada) -> [veces, puntos]
+    conteos = {}
+    with open(partidas) as f:
+        for linea in f:
+            registro = json.loads(linea)
+            ganancia = registro["ganancia"]
+            s, j = juego.inicializa()
+            for a in registro["apertura"]:
+                s, j = juego.transicion(s, _jugada(a), j), -j
+            plies_hechos = len(registro["apertura"])
+            for jugada in registro["jugadas"][: max(0, plies - plies_hechos)]:
+                a = _jugada(jugada["jugada"])
+                if a != juego.pase:
+                    clave, simetria = clave_libro(juego, s, j)
+                    conteo = conteos.setdefault(
+                        (clave, _codigo(juego, a, simetria)), [0, 0]
+                    )
+                    conteo[0] += 1
+                    conteo[1] += 1 + (ganancia * j > 0) - (ganancia * j < 0)
+                s, j = juego.transicion(s, a, j), -j
+    entradas = {}
+    for (clave, codigo), (veces, puntos) in conteos.items():
+        if veces >= minimo and puntos > 0:
+            entradas.setdefault(clave, {})[codigo] = puntos
+    return entradas
+
+
+def _jugada(a):
+    # JSON convierte las tuplas en listas
+    return tuple(a) if isinstance(a, list) else a
+
+
+def _modelos():
+    from conect4 import Conecta4, evalua_3con, ordena_centro
+    from conect4_bitboard import Conecta4Bitboard, evalua_3con_bits
+    from othello import Othello, evalua, ordena_jugadas
+    from othello_bitboard import OthelloBitboard, evalua_bits
+
+    return {
+        "conecta4": (Conecta4, evalua_3con, ordena_centro),
+        "conecta4_bitboard": (Conecta4Bitboard, evalua_3con_bits, ordena_centro),
+        "othello": (Othello, evalua, ordena_jugadas),
+        "othello_bitboard": (OthelloBitboard, evalua_bits, ordena_jugadas),
+    }
+
+
+if __name__ == "__main__":
+    modelos = _modelos()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("metodo", choices=("busqueda", "partidas"))
+    parser.add_argument("juego", choices=sorted(modelos))
+    parser.add_argument("partidas", nargs="?", help="archivo JSON lines de torneo.py")
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--profundidad", type=int, default=6)
+    parser.add_argument("--margen", type=float, default=0.0)
+    parser.add_argument("--minimo", type=int, default=2)
+    parser.add_argument("--salida", help="por omisión <juego>.aperturas")
+    args = parser.parse_args()
+
+    modelo, ev, ordena = modelos[args.juego]
+    juego = modelo()
+    if args.metodo == "busqueda":
+        entradas = genera_por_busqueda(
+            juego, args.plies, ev, ordena, args.profundidad, args.margen
+        )
+    elif args.partidas is None:
+        parser.error("falta el archivo de partidas")
+    else:
+        entradas = genera_por_partidas(juego, args.partidas, args.plies, args.minimo)
+    salida = args.salida or f"{args.juego}.aperturas"
+    n = escribe(salida, juego, entradas)
+    print(f"{len(entradas)} posiciones y {n} jugadas en {salida}")
@@ -0,0 +1,863 @@
+"""
+Comparaciones de rendimiento entre modelos de juego y variantes del negamax
+
+Se ejecuta como script:
+
+    python benchmark.py
+
+Para comparar dos versiones del código con posiciones fijas y guardar los
+resultados, ver `suite.py`. Aquí solo se mide: que cada variante encuentre
+lo mismo que la búsqueda sencilla se revisa en `test_equivalencias.py`.
+
+"""
+
+import os
+from random import Random, seed
+from time import perf_counter
+from typing import NamedTuple
+
+from minimax import Busqueda, jugador_negamax, minimax_iterativo, negamax
+from transposicion import TablaTransposicion
+
+
+class ContadorNodos:
+    """
+    Envuelve un modelo de juego y cuenta los nodos que genera la búsqueda
+    (llamadas a `transicion` y a `hace_jugada`) y los estados que crea
+    (llamadas a `transicion`)
+
+    """
+
+    def __init__(self, juego):
+        self.juego = juego
+        self.nodos = 0
+        self.estados = 0
+
+    def __getattr__(self, nombre):
+        return getattr(self.juego, nombre)
+
+    def transicion(self, s, a, j):
+        self.nodos += 1
+        self.estados += 1
+        return self.juego.transicion(s, a, j)
+
+    def hace_jugada(self, s, a, j):
+        self.nodos += 1
+        return self.juego.hace_jugada(s, a, j)
+
+
+class Medicion(NamedTuple):
+    resultado: object
+    nodos: int
+    estados: int
+    segundos: float
+    busqueda: Busqueda
+
+
+def mide(busca, juego, estado, jugador, semilla=0, cuenta=True, **opciones):
+    """
+    Corre y cronometra una búsqueda. Todas las comparaciones de este
+    módulo miden así, para que las variantes solo difieran en opciones.
+
+    Parametros
+    ----------
+    busca (function): negamax, minimax_iterativo o jugador_negamax
+    semilla (int): Semilla del orden aleatorio, en `random` y en la
+        Busqueda que se crea si opciones no trae una
+    cuenta (bool): Si True, la búsqueda recibe el juego envuelto en un
+        ContadorNodos. Con procesos hay que usar False, y los nodos son
+        los de la Busqueda.
+    opciones: Los demás argumentos de busca
+
+    Regresa
+    -------
+    Medicion: resultado de busca, nodos, estados creados, segundos y la
+        Busqueda usada
+
+    """
+    seed(semilla)
+    if opciones.get("busqueda") is None:
+        opciones["busqueda"] = Busqueda(semilla=semilla)
+    busqueda = opciones["busqueda"]
+    contador = ContadorNodos(juego) if cuenta else juego
+    t0 = perf_counter()
+    resultado = busca(contador, estado, jugador, **opciones)
+    segundos = perf_counter() - t0
+    if not cuenta:
+        return Medicion(resultado, busqueda.nodos, 0, segundos, busqueda)
+    return Medicion(resultado, contador.nodos, contador.estados, segundos, busqueda)
+
+
+def muestra(etiqueta, medicion, jugada):
+    print(
+        f"  {etiqueta:16} {medicion.nodos:8d} nodos {medicion.segundos:7.2f} s"
+        f"  jugada {jugada}"
+    )
+
+
+def apertura_aleatoria(juego, jugadas, semilla=0):
+    """
+    Devuelve (estado, jugador) después de `jugadas` jugadas al azar
+
+    """
+    azar = Random(semilla)
+    s, j = juego.inicializa()
+    for _ in range(jugadas):
+        s = juego.transicion(s, azar.choice(list(juego.jugadas_legales(s, j))), j)
+        j = -j
+    return s, j
+
+
+def final_aleatorio(juego, vacias, azar):
+    """
+    Devuelve (estado, jugador) de Othello con `vacias` casillas vacías,
+    jugando al azar desde la posición inicial
+
+    """
+    s, j = juego.inicializa()
+    while 64 - (s.negras | s.blancas).bit_count() > vacias:
+        s = juego.transicion(s, azar.choice(juego.jugadas_legales(s, j)), j)
+        j = -j
+    return s, j
+
+
+def casos_bitboard(d_conecta4, d_othello):
+    """
+    (nombre, juego, d, evalua, ordena) de Conecta4Bitboard y OthelloBitboard
+
+    """
+    from conect4 import ordena_centro
+    from conect4_bitboard import Conecta4Bitboard, evalua_3con_bits
+    from othello import ordena_jugadas
+    from othello_bitboard import OthelloBitboard, evalua_bits
+
+    return (
+        ("Conecta4", Conecta4Bitboard(), d_conecta4, evalua_3con_bits, ordena_centro),
+        ("Othello", OthelloBitboard(), d_othello, evalua_bits, ordena_jugadas),
+    )
+
+
+def compara_othello_bitboard(d=4, jugadas=10, semilla=0):
+    """
+    Nodos por segundo de `othello.Othello` contra `OthelloBitboard` en la
+    misma posición y a la misma profundidad
+
+    """
+    from othello import Othello, evalua
+    from othello_bitboard import OthelloBitboard, de_arreglo, evalua_bits
+
+    s, j = apertura_aleatoria(Othello(), jugadas, semilla)
+    print(f"Othello, profundidad {d}, {jugadas} jugadas de apertura")
+    for nombre, juego, estado, ev in (
+        ("Othello", Othello(), s, evalua),
+        ("OthelloBitboard", OthelloBitboard(), de_arreglo(s), evalua_bits),
+    ):
+        m = mide(negamax, juego, estado, j, semilla, d=d, evalua=ev)
+        print(
+            f"  {nombre:16} {m.nodos:8d} nodos {m.segundos:7.2f} s"
+            f" {m.nodos / m.segundos:10.0f} nodos/s"
+        )
+
+
+def compara_othello_vectorizado(jugadas=20, repeticiones=2000, semilla=0):
+    """
+    Microsegundos por llamada de `jugadas_legales` y `transicion` de
+    `othello.Othello` (vectorizadas con NumPy) contra la implementación
+    original casilla por casilla, en una misma posición de medio juego
+
+    """
+    from timeit import timeit
+
+    from othello import Othello, jugadas_legales_por_casilla, transicion_por_casilla
+
+    juego = Othello()
+    s, j = apertura_aleatoria(juego, jugadas, semilla)
+    a = juego.jugadas_legales(s, j)[0]
+    print(f"Othello, {jugadas} jugadas de apertura, microsegundos por llamada")
+    for nombre, por_casilla, vectorizada in (
+        (
+            "jugadas_legales",
+            lambda: jugadas_legales_por_casilla(s, j),
+            lambda: juego.jugadas_legales(s, j),
+        ),
+        (
+            "transicion",
+            lambda: transicion_por_casilla(s, a, j),
+            lambda: juego.transicion(s, a, j),
+        ),
+    ):
+        t_casilla = timeit(por_casilla, number=repeticiones) / repeticiones * 1e6
+        t_vector = timeit(vectorizada, number=repeticiones) / repeticiones * 1e6
+        print(
+            f"  {nombre:16} {t_casilla:8.1f} contra {t_vector:8.1f}"
+            f"  x{t_casilla / t_vector:.1f}"
+        )
+
+
+def compara_tabla(d_conecta4=8, d_othello=6, semilla=0):
+    """
+    Nodos del negamax sin tabla de transposición y con ella, desde la
+    posición inicial de Conecta4 y de Othello
+
+    """
+    for nombre, juego, d, ev, ordena in casos_bitboard(d_conecta4, d_othello):
+        s, j = juego.inicializa()
+        print(f"{nombre}, posición inicial, profundidad {d}")
+        for tabla, transp in (
+            ("sin tabla", TablaTransposicion(0)),
+            ("con tabla", None),
+        ):
+            m = mide(
+                negamax,
+                juego,
+                s,
+                j,
+                semilla,
+                ordena=ordena,
+                d=d,
+                evalua=ev,
+                busqueda=Busqueda(transp=transp, semilla=semilla),
+            )
+            traza, v = m.resultado
+            muestra(tabla, m, f"{traza[0]} valor {v:.4f}")
+
+
+def compara_persistencia(tiempo=1, jugadas=8, semilla=0):
+    """
+    Profundidad que alcanza `minimax_iterativo` en cada turno de una
+    partida de Conecta4, con una Busqueda nueva en cada turno y con una
+    Busqueda que se conserva entre turnos
+
+    """
+    from conect4 import ordena_centro
+    from conect4_bitboard import Conecta4Bitboard, evalua_3con_bits
+
+    juego = Conecta4Bitboard()
+    print(f"Conecta4, {tiempo} s por jugada")
+    for nombre, persistente in (("nueva", False), ("persistente", True)):
+        busquedas = {1: Busqueda(), -1: Busqueda()}
+        s, j = apertura_aleatoria(juego, 2, semilla)
+        profundidades = []
+        for _ in range(jugadas):
+            if juego.terminal(s):
+                break
+            m = mide(
+                minimax_iterativo,
+                juego,
+                s,
+                j,
+                semilla,
+                tiempo=tiempo,
+                ordena=ordena_centro,
+                evalua=evalua_3con_bits,
+                busqueda=busquedas[j] if persistente else Busqueda(),
+            )
+            profundidades.append(m.busqueda.profundidad)
+            s, j = juego.transicion(s, m.resultado, j), -j
+        promedio = sum(profundidades) / len(profundidades)
+        print(f"  {nombre:12} profundidades {profundidades} promedio {promedio:.1f}")
+
+
+def mide_latencia(tiempo=0.5, jugadas=10, semilla=0):
+    """
+    Tiempo real que tarda `minimax_iterativo` en cada jugada de una partida
+    de Othello contra el presupuesto `tiempo`
+
+    """
+    from othello import Othello, evalua, ordena_jugadas
+
+    juego = Othello()
+    s, j = apertura_aleatoria(juego, 16, semilla)
+    latencias = []
+    for _ in range(jugadas):
+        if juego.terminal(s) or not juego.jugadas_legales(s, j):
+            break
+        m = mide(
+            minimax_iterativo,
+            juego,
+            s,
+            j,
+            semilla,
+            tiempo=tiempo,
+            ordena=ordena_jugadas,
+            evalua=evalua,
+        )
+        latencias.append(m.segundos)
+        s, j = juego.transicion(s, m.resultado, j), -j
+    print(
+        f"Othello, {tiempo} s por jugada: máxima {max(latencias):.3f} s, "
+        f"promedio {sum(latencias) / len(latencias):.3f} s"
+    )
+
+
+def compara_ordenamiento(d_conecta4=10, d_othello=6, semilla=0):
+    """
+    Nodos que necesita `minimax_iterativo` para llegar a una profundidad
+    fija sin ordenamiento dinámico y con asesinas e historia
+
+    """
+    for nombre, juego, d, ev, ordena in casos_bitboard(d_conecta4, d_othello):
+        s, j = apertura_aleatoria(juego, 4, semilla)
+        print(f"{nombre}, profundidad {d}")
+        for etiqueta, dinamico in (("estático", False), ("dinámico", True)):
+            m = mide(
+                minimax_iterativo,
+                juego,
+                s,
+                j,
+                semilla,
+                tiempo=1e6,
+                ordena=ordena,
+                d=d,
+                evalua=ev,
+                busqueda=Busqueda(semilla=semilla, dinamico=dinamico),
+            )
+            muestra(etiqueta, m, m.resultado)
+
+
+def compara_pvs(d=6, jugadas=20, aspiracion=0.05, semilla=1):
+    """
+    Nodos del negamax a profundidad fija en un medio juego de Othello:
+    ventana completa, PVS, y PVS con ventanas de aspiración dentro de
+    `minimax_iterativo`
+
+    """
+    from othello import ordena_jugadas
+    from othello_bitboard import OthelloBitboard, evalua_bits
+
+    juego = OthelloBitboard()
+    s, j = apertura_aleatoria(juego, jugadas, semilla)
+    print(f"Othello, {jugadas} jugadas de apertura, profundidad {d}")
+    comunes = dict(ordena=ordena_jugadas, d=d, evalua=evalua_bits)
+    for etiqueta, pvs in (("negamax", False), ("PVS", True)):
+        m = mide(negamax, juego, s, j, semilla, pvs=pvs, **comunes)
+        muestra(etiqueta, m, m.resultado[0][0])
+    for etiqueta, pvs, asp in (
+        ("iterativo", False, None),
+        ("iterativo + PVS", True, aspiracion),
+    ):
+        m = mide(
+            minimax_iterativo,
+            juego,
+            s,
+            j,
+            semilla,
+            tiempo=1e6,
+            pvs=pvs,
+            aspiracion=asp,
+            **comunes,
+        )
+        muestra(etiqueta, m, m.resultado)
+
+
+def compara_lotes(d_conecta4=7, d_othello=4, hojas=1000, semilla=1):
+    """
+    Evaluación por lotes contra una llamada por hoja: microsegundos por
+    hoja evaluando `hojas` estados, y nodos y tiempo del negamax a
+    profundidad fija con evalua_lote y sin él
+
+    """
+    from conect4 import Conecta4, evalua_3con, evalua_3con_lote, ordena_centro
+    from othello import Othello, evalua, evalua_lote, ordena_jugadas
+
+    for nombre, juego, d, ev, lote, ordena in (
+        (
+            "Conecta4",
+            Conecta4(),
+            d_conecta4,
+            evalua_3con,
+            evalua_3con_lote,
+            ordena_centro,
+        ),
+        ("Othello", Othello(), d_othello, evalua, evalua_lote, ordena_jugadas),
+    ):
+        s, j = apertura_aleatoria(juego, 4, semilla)
+        estados = [s] * hojas
+        t0 = perf_counter()
+        [ev(e) for e in estados]
+        t_hoja = (perf_counter() - t0) / hojas * 1e6
+        t0 = perf_counter()
+        lote(estados)
+        t_lote = (perf_counter() - t0) / hojas * 1e6
+        print(
+            f"{nombre}: {t_hoja:.1f} contra {t_lote:.1f} microsegundos por hoja,"
+            f" profundidad {d}"
+        )
+        for etiqueta, evalua_lote_ in (("por hoja", None), ("por lotes", lote)):
+            m = mide(
+                negamax,
+                juego,
+                s,
+                j,
+                semilla,
+                ordena=ordena,
+                d=d,
+                evalua=ev,
+                evalua_lote=evalua_lote_,
+            )
+            muestra(
+                etiqueta,
+                m,
+                f"{m.resultado[0][0]}  {m.busqueda.evaluaciones} hojas",
+            )
+
+
+def compara_incremental(d_conecta4=7, d_othello=4, semilla=1):
+    """
+    Tiempo del negamax a profundidad fija con la evaluación completa y
+    con los modelos que llevan acumuladores de evaluación en el estado
+
+    """
+    from conect4 import (
+        Conecta4,
+        Conecta4Incremental,
+        evalua_3con,
+        evalua_3con_incremental,
+        ordena_centro,
+    )
+    from othello import (
+        Othello,
+        OthelloIncremental,
+        evalua,
+        evalua_incremental,
+        ordena_jugadas,
+    )
+
+    for nombre, d, ordena, variantes in (
+        (
+            "Conecta4",
+            d_conecta4,
+            ordena_centro,
+            (
+                ("completa", Conecta4(), evalua_3con),
+                ("incremental", Conecta4Incremental(), evalua_3con_incremental),
+            ),
+        ),
+        (
+            "Othello",
+            d_othello,
+            ordena_jugadas,
+            (
+                ("completa", Othello(), evalua),
+                ("incremental", OthelloIncremental(), evalua_incremental),
+            ),
+        ),
+    ):
+        print(f"{nombre}, profundidad {d}")
+        for etiqueta, juego, ev in variantes:
+            s, j = apertura_aleatoria(juego, 4, semilla)
+            m = mide(negamax, juego, s, j, semilla, ordena=ordena, d=d, evalua=ev)
+            muestra(etiqueta, m, m.resultado[0][0])
+
+
+def compara_hace_deshace(d_gato=9, d_conecta4=7, d_othello=4, semilla=1):
+    """
+    Estados creados, memoria y tiempo del negamax a profundidad fija con
+    `transicion`, que crea un estado por nodo, y con `hace_jugada` y
+    `deshace_jugada` sobre un solo estado. El pico de memoria se mide con
+    tracemalloc en una segunda corrida, para no afectar el tiempo.
+
+    """
+    import tracemalloc
+
+    from conect4 import Conecta4, evalua_3con, ordena_centro
+    from gato import Gato
+    from othello import Othello, evalua, ordena_jugadas
+
+    for nombre, juego, d, ev, ordena, jugadas in (
+        ("Gato", Gato(), d_gato, lambda s: 0, None, 0),
+        ("Conecta4", Conecta4(), d_conecta4, evalua_3con, ordena_centro, 4),
+        ("Othello", Othello(), d_othello, evalua, ordena_jugadas, 4),
+    ):
+        s, j = apertura_aleatoria(juego, jugadas, semilla)
+        print(f"{nombre}, profundidad {d}")
+        for etiqueta, mutable in (("transicion", False), ("hace/deshace", True)):
+            # mide lo vuelve a envolver para contar los nodos de cada corrida
+            modelo = ContadorNodos(juego)
+            modelo.hace_y_deshace = mutable
+            opciones = dict(ordena=ordena, d=d, evalua=ev)
+            m = mide(negamax, modelo, s, j, semilla, **opciones)
+            # La tabla de transposición se crea antes, para no contarla
+            busqueda = Busqueda(semilla=semilla)
+            tracemalloc.start()
+            mide(negamax, modelo, s, j, semilla, busqueda=busqueda, **opciones)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"  {etiqueta:14} {m.nodos:8d} nodos {m.estados:8d} estados"
+                f" {m.segundos:7.2f} s  pico {pico / 1024:6.1f} KiB"
+            )
+
+
+def muestra_estadisticas(d=9, semilla=0):
+    """
+    Estadísticas de `minimax_iterativo` hasta profundidad d desde la
+    posición inicial de Conecta4, y tiempo de la misma búsqueda sin
+    estadísticas
+
+    """
+    from conect4 import ordena_centro
+    from conect4_bitboard import Conecta4Bitboard, evalua_3con_bits
+
+    juego = Conecta4Bitboard()
+    s, j = juego.inicializa()
+    print(f"Conecta4, posición inicial, profundidad {d}")
+    mediciones = {
+        con: mide(
+            minimax_iterativo,
+            juego,
+            s,
+            j,
+            semilla,
+            cuenta=False,
+            tiempo=1e6,
+            ordena=ordena_centro,
+            d=d,
+            evalua=evalua_3con_bits,
+            estadisticas=con,
+        )
+        for con in (False, True)
+    }
+    print(mediciones[True].resultado[1])
+    print(
+        f"  {mediciones[False].segundos:.2f} s sin estadísticas,"
+        f" {mediciones[True].segundos:.2f} s con ellas"
+    )
+
+
+def compara_final(vacias=(10, 12, 14), posiciones=3, semilla=0):
+    """
+    Tiempo de `othello_final.resuelve` en posiciones al azar con las
+    casillas vacías dadas
+
+    """
+    from othello_bitboard import OthelloBitboard
+    from othello_final import resuelve
+
+    juego = OthelloBitboard()
+    print("Othello, finales resueltos")
+    for n in vacias:
+        azar = Random(semilla)
+        for _ in range(posiciones):
+            s, j = final_aleatorio(juego, n, azar)
+            t0 = perf_counter()
+            _, valor, nodos = resuelve(s.negras, s.blancas, j)
+            print(
+                f"  {n:2d} vacías  {valor:+3d}  {nodos:7d} nodos"
+                f" {perf_counter() - t0:6.2f} s"
+            )
+
+
+def mide_solucion(fichas=(24, 20, 16), posiciones=3, semilla=0):
+    """
+    Tiempo de `conect4_solucion` para encontrar la jugada perfecta en
+    posiciones al azar de Conecta4 con las fichas dadas, sin libro
+
+    """
+    from conect4_bitboard import Conecta4Bitboard
+    from conect4_solucion import Solucionador
+
+    juego = Conecta4Bitboard()
+    print("Conecta4, jugada perfecta")
+    for n in fichas:
+        azar = Random(semilla)
+        for _ in range(posiciones):
+            s, j = juego.inicializa()
+            while (s.jugador1 | s.jugador2).bit_count() < n:
+                hijos = [juego.transicion(s, a, j) for a in juego.jugadas_legales(s, j)]
+                s = azar.choice([h for h in hijos if not juego.terminal(h)])
+                j = -j
+            solucionador = Solucionador(libro=None)
+            propias = s.jugador1 if j == 1 else s.jugador2
+            t0 = perf_counter()
+            c, valor = solucionador.mejor_jugada(propias, s.jugador1 | s.jugador2)
+            print(
+                f"  {n:2d} fichas  columna {c}  valor {valor:+3d}"
+                f"  {solucionador.nodos:8d} nodos {perf_counter() - t0:6.2f} s"
+            )
+
+
+def compara_simetrias(d_conecta4=8, d_othello=5, semilla=0):
+    """
+    Nodos, aciertos en la tabla de transposición y tiempo del negamax con
+    y sin claves canónicas (`Busqueda(simetrias=True)`), desde la posición
+    inicial de cada juego
+
+    """
+    from gato import Gato
+    from othello import Othello, evalua, ordena_jugadas
+
+    conecta4, othello_bits = casos_bitboard(d_conecta4, d_othello)
+    for nombre, juego, d, ev, ordena in (
+        ("Gato", Gato(), None, None, None),
+        ("Conecta4Bitboard",) + conecta4[1:],
+        ("Othello", Othello(), d_othello, evalua, ordena_jugadas),
+        ("OthelloBitboard",) + othello_bits[1:],
+    ):
+        s, j = juego.inicializa()
+        print(f"{nombre}, posición inicial, d={d}")
+        for simetrias in (False, True):
+            m = mide(
+                jugador_negamax,
+                juego,
+                s,
+                j,
+                semilla,
+                cuenta=False,
+                ordena=ordena,
+                d=d,
+                evalua=ev,
+                busqueda=Busqueda(semilla=semilla, simetrias=simetrias),
+                estadisticas=True,
+            )
+            a, estadisticas = m.resultado
+            print(
+                f"  {'canónicas' if simetrias else 'normales':10}"
+                f" {estadisticas.nodos:8d} nodos"
+                f"  aciertos TT {estadisticas.tasa_aciertos_tt:6.1%}"
+                f"  {m.segundos:6.2f} s  jugada {a}"
+            )
+
+
+def compara_registros(posiciones=1_000_000, lote=4096, semilla=0):
+    """
+    Tamaño y velocidad de los registros binarios (`registros.py`) contra
+    guardar los estados de Othello con pickle, con posiciones al azar
+
+    """
+    import pickle
+    import tempfile
+
+    import numpy as np
+
+    from othello import Othello
+    from registros import REGISTRO, Escritor, carga, estados
+
+    juego = Othello()
+    azar = np.random.default_rng(semilla)
+    registros = np.zeros(posiciones, dtype=REGISTRO)
+    registros["fichas1"] = azar.integers(0, 2**63, posiciones, dtype=np.uint64)
+    registros["fichas2"] = ~registros["fichas1"] & azar.integers(
+        0, 2**63, posiciones, dtype=np.uint64
+    )
+    registros["turno"] = 1
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "othello.pos")
+        t0 = perf_counter()
+        with Escritor(archivo, juego) as escritor:
+            for k in range(0, posiciones, lote):
+                escritor.agrega_lote(registros[k : k + lote])
+        escritura = perf_counter() - t0
+        tamano = os.path.getsize(archivo)
+        t0 = perf_counter()
+        leidos = carga(archivo, juego)
+        total = 0
+        for k in range(0, posiciones, lote):
+            total += int(leidos[k : k + lote]["turno"].sum())
+        lectura = perf_counter() - t0
+        ejemplo = estados(juego, leidos[:lote])
+        t0 = perf_counter()
+        estados(juego, leidos[:lote])
+        conversion = (perf_counter() - t0) / lote
+        del leidos
+    t0 = perf_counter()
+    datos = pickle.dumps(ejemplo)
+    por_pickle = (perf_counter() - t0) / lote
+    print(f"Registros de Othello, {posiciones} posiciones")
+    print(
+        f"  binario {tamano / posiciones:6.1f} bytes/posición"
+        f"  escritura {posiciones / escritura:12.0f} pos/s"
+        f"  lectura por lotes {posiciones / lectura:12.0f} pos/s"
+    )
+    print(
+        f"  pickle  {len(datos) / lote:6.1f} bytes/posición"
+        f"  escritura {1 / por_pickle:12.0f} pos/s"
+    )
+    print(f"  a estados de Othello {1 / conversion:12.0f} pos/s")
+
+
+def mide_ajuste(partidas=(4000, 1000), semilla=0):
+    """
+    Velocidad de las características de `ajuste.py` y error de los pesos
+    iniciales y ajustados, con las posiciones de partidas al azar de
+    Conecta4 y Othello
+
+    """
+    import tempfile
+
+    from ajuste import ajusta
+    from conect4_bitboard import Conecta4Bitboard
+    from othello_bitboard import OthelloBitboard
+    from registros import Escritor, formato
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for juego, n in zip((Conecta4Bitboard(), OthelloBitboard()), partidas):
+            nombre = formato(juego).juego
+            archivo = os.path.join(directorio, nombre + ".pos")
+            azar = Random(semilla)
+            with Escritor(archivo, juego) as escritor:
+                for _ in range(n):
+                    s, j = juego.inicializa()
+                    historia = []
+                    while not juego.terminal(s):
+                        historia.append((s, j))
+                        a = azar.choice(list(juego.jugadas_legales(s, j)))
+                        s, j = juego.transicion(s, a, j), -j
+                    for t, k in historia:
+                        escritor.agrega(t, k, juego.ganancia(s))
+            for metodo in ("newton", "texel"):
+                _, resumen = ajusta(archivo, nombre, metodo)
+                segundos = resumen["segundos_caracteristicas"]
+                print(
+                    f"{nombre:9} {metodo:7} {resumen['posiciones']} posiciones"
+                    f"  {60 * resumen['posiciones'] / segundos:11.0f} por minuto"
+                    f"  ajuste {resumen['segundos_ajuste']:5.2f} s"
+                    f"  error {resumen['error_inicial']:.4f}"
+                    f" -> {resumen['error']:.4f}"
+                )
+
+
+def mide_libro(plies=4, d=6, tiempo=1, jugadas=200, semilla=0):
+    """
+    Tiempo de una jugada de libro (`aperturas.py`) contra el de buscarla
+    con `minimax_iterativo`, en posiciones del libro de Conecta4
+
+    """
+    import tempfile
+
+    from aperturas import Libro, escribe, genera_por_busqueda
+    from conect4 import ordena_centro
+    from conect4_bitboard import Conecta4Bitboard, evalua_3con_bits
+
+    juego = Conecta4Bitboard()
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "conecta4.aperturas")
+        t0 = perf_counter()
+        entradas = genera_por_busqueda(juego, plies, evalua_3con_bits, ordena_centro, d)
+        n = escribe(archivo, juego, entradas)
+        generacion = perf_counter() - t0
+        libro = Libro(archivo)
+        azar = Random(semilla)
+        s, j = juego.inicializa()
+        t0 = perf_counter()
+        for _ in range(jugadas):
+            libro.jugada(juego, s, j, azar)
+        consulta = (perf_counter() - t0) / jugadas
+        del libro
+    m = mide(
+        minimax_iterativo,
+        juego,
+        s,
+        j,
+        semilla,
+        tiempo=tiempo,
+        ordena=ordena_centro,
+        evalua=evalua_3con_bits,
+    )
+    print(f"Libro de Conecta4, {plies} plies a d={d}")
+    print(f"  {len(entradas)} posiciones, {n} jugadas, generado en {generacion:.1f} s")
+    print(
+        f"  jugada de libro {1e6 * consulta:.1f} us"
+        f"  búsqueda {m.segundos:.2f} s (tiempo={tiempo})"
+    )
+
+
+def compara_paralelo(d=6, jugadas=16, procesos=None, semilla=1):
+    """
+    Tiempo de `jugador_negamax` en un medio juego de Othello con uno y con
+    varios procesos en la raíz
+
+    """
+    from othello import ordena_jugadas
+    from othello_bitboard import OthelloBitboard, evalua_bits
+
+    procesos = procesos or os.cpu_count()
+    juego = OthelloBitboard()
+    s, j = apertura_aleatoria(juego, jugadas, semilla)
+    print(f"Othello, {len(juego.jugadas_legales(s, j))} jugadas en la raíz, d={d}")
+    tiempos = {}
+    for n in sorted({1, procesos}):
+        # Arranca el pool antes de medir
+        jugador_negamax(juego, s, j, ordena_jugadas, 1, evalua_bits, procesos=n)
+        m = mide(
+            jugador_negamax,
+            juego,
+            s,
+            j,
+            semilla,
+            cuenta=False,
+            ordena=ordena_jugadas,
+            d=d,
+            evalua=evalua_bits,
+            procesos=n,
+        )
+        tiempos[n] = m.segundos
+        aceleracion = tiempos[1] / tiempos[n]
+        print(
+            f"  {n:3d} procesos {tiempos[n]:7.2f} s  x{aceleracion:.2f}"
+            f"  jugada {m.resultado}"
+        )
+
+
+def compara_smp(tiempo=5, jugadas=16, workers=None, semilla=1):
+    """
+    Segundos que tarda `minimax_iterativo` con Lazy SMP en completar cada
+    profundidad en un medio juego de Othello, con uno y con varios
+    procesos
+
+    """
+    from othello import ordena_jugadas
+    from othello_bitboard import OthelloBitboard, evalua_bits
+
+    workers = workers or os.cpu_count()
+    juego = OthelloBitboard()
+    s, j = apertura_aleatoria(juego, jugadas, semilla)
+    print(f"Othello, Lazy SMP, {tiempo} s")
+    tiempos = {}
+    for n in sorted({1, workers}):
+        m = mide(
+            minimax_iterativo,
+            juego,
+            s,
+            j,
+            semilla,
+            cuenta=False,
+            tiempo=tiempo,
+            ordena=ordena_jugadas,
+            evalua=evalua_bits,
+            workers=n,
+        )
+        tiempos[n] = m.busqueda.tiempos
+        print(
+            f"  {n:3d} procesos  profundidad {m.busqueda.profundidad}"
+            f"  jugada {m.resultado}"
+        )
+    for d, t in sorted(tiempos[1].items()):
+        if d in tiempos[workers]:
+            aceleracion = t / tiempos[workers][d]
+            print(
+                f"    d={d:2d} {t:7.3f} s contra {tiempos[workers][d]:7.3f} s"
+                f"  x{aceleracion:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    compara_othello_bitboard()
+    compara_othello_vectorizado()
+    compara_tabla()
+    compara_persistencia()
+    mide_latencia()
+    compara_ordenamiento()
+    compara_pvs()
+    compara_lotes()
+    compara_incremental()
+    compara_hace_deshace()
+    muestra_estadisticas()
+    compara_final()
+    mide_solucion()
+    compara_simetrias()
+    compara_registros()
+    mide_ajuste()
+    mide_libro()
+    compara_paralelo()
+    compara_smp()
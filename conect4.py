@@ -26,12 +26,23 @@ empate.
 
 """
 
+import numpy as np
+
 from juegos_simplificado import ModeloJuegoZT2
 from juegos_simplificado import juega_dos_jugadores
+from minimax import Busqueda
 from minimax import jugador_negamax
 from minimax import minimax_iterativo
+from transposicion import SimetriasCasillas
+from transposicion import ZobristCasillas
+from transposicion import permutaciones_espejo
+
+ZOBRIST = ZobristCasillas(42, semilla="conecta4")
+SIMETRIAS = SimetriasCasillas(ZOBRIST, permutaciones_espejo(6, 7))
 
 class Conecta4(ModeloJuegoZT2):
+    hace_y_deshace = True
+
     def inicializa(self):
         return (tuple([0 for _ in range(6 * 7)]), 1)
         
@@ -78,6 +89,37 @@ class Conecta4(ModeloJuegoZT2):
         if 0 not in s:
             return True
         return self.ganancia(s) != 0
+
+    def clave(self, s):
+        return ZOBRIST.clave(s)
+
+    def clave_canonica(self, s):
+        return SIMETRIAS.clave(s)
+
+    def transforma_jugada(self, a, simetria):
+        return 6 - a if simetria else a
+
+    def jugada_original(self, a, simetria):
+        return 6 - a if simetria else a
+
+    def resuelve_final(self, s, j, limite=None):
+        from conect4_bitboard import de_tupla
+        from conect4_solucion import jugada_solucion
+
+        b = de_tupla(s)
+        return jugada_solucion(b.jugador1, b.jugador2, j, limite)
+
+    def estado_mutable(self, s):
+        return list(s)
+
+    def hace_jugada(self, s, a, j):
+        for i in range(5, -1, -1):
+            if s[a + 7 * i] == 0:
+                s[a + 7 * i] = j
+                return a + 7 * i
+
+    def deshace_jugada(self, s, registro):
+        s[registro] = 0
     
 def pprint_conecta4(s):
     a = [' X ' if x == 1 else ' O ' if x == -1 else '   ' 
@@ -146,6 +188,88 @@ def evalua_3con(s):
         print("ERROR, evaluación fuera de rango --> ", promedio)
     return promedio
 
+# Índices de las casillas de cada una de las ventanas de tres que revisa
+# evalua_3con, en el mismo orden: verticales, horizontales y diagonales
+VENTANAS_3 = np.array(
+    [(i + 7 * j, i + 7 * (j + 1), i + 7 * (j + 2))
+     for i in range(7) for j in range(4)]
+    + [(7 * i + j, 7 * i + j + 1, 7 * i + j + 2)
+       for i in range(6) for j in range(5)]
+    + [(i + 7 * j, i + 7 * j + 8, i + 7 * j + 16)
+       for i in range(5) for j in range(4)]
+    + [(i + 7 * j + 3, i + 7 * j + 9, i + 7 * j + 15)
+       for i in range(5) for j in range(4)]
+)
+
+def evalua_3con_lote(estados):
+    """
+    Evalua a la vez N estados para el jugador 1, igual que evalua_3con.
+    
+    estados: lista de N estados o arreglo de (N, 42)
+    devuelve: arreglo con las N evaluaciones
+    """
+    ventanas = np.asarray(estados)[:, VENTANAS_3].sum(axis=2)
+    conect3 = (ventanas == 3).sum(axis=1) - (ventanas == -3).sum(axis=1)
+    return conect3 / len(VENTANAS_3)
+
+# Para cada casilla, las otras dos casillas de cada ventana de VENTANAS_3
+# que la contiene
+VECINAS_3 = [
+    [tuple(int(k) for k in ventana if k != casilla)
+     for ventana in VENTANAS_3 if casilla in ventana]
+    for casilla in range(42)
+]
+
+class EstadoC4(tuple):
+    """
+    Estado de Conecta4: la misma tupla de 42 casillas, que además lleva
+    conect3, las ventanas de tres del jugador 1 menos las del jugador -1
+    (lo que cuenta evalua_3con)
+    """
+    def __new__(cls, casillas, conect3):
+        s = super().__new__(cls, casillas)
+        s.conect3 = conect3
+        return s
+
+    def __reduce__(self):
+        return (EstadoC4, (tuple(self), self.conect3))
+
+class Conecta4Incremental(Conecta4):
+    """
+    Conecta4 que actualiza conect3 en cada jugada revisando solo las
+    ventanas de la casilla donde cae la ficha: antes de la jugada ninguna
+    de ellas podía estar completa, así que la ficha completa las ventanas
+    cuyas otras dos casillas ya son del jugador.
+
+    Los estados son inmutables, así que no usa hace_jugada.
+    """
+    hace_y_deshace = False
+
+    def inicializa(self):
+        s, j = super().inicializa()
+        return (EstadoC4(s, 0), j)
+
+    def transicion(self, s, a, j):
+        casilla = next(a + 7 * i for i in range(5, -1, -1) if s[a + 7 * i] == 0)
+        nuevas = sum(1 for k, l in VECINAS_3[casilla] if s[k] == s[l] == j)
+        casillas = list(s)
+        casillas[casilla] = j
+        return EstadoC4(casillas, s.conect3 + j * nuevas)
+
+    def acumuladores(self, s):
+        return (s.conect3,)
+
+    def recalcula(self, s):
+        ventanas = np.asarray(s)[VENTANAS_3].sum(axis=1)
+        return (int((ventanas == 3).sum() - (ventanas == -3).sum()),)
+
+def evalua_3con_incremental(s):
+    """
+    evalua_3con en tiempo constante, para los estados de
+    Conecta4Incremental
+    """
+    return s.conect3 / len(VENTANAS_3)
+
 
     
 if __name__ == '__main__':
@@ -169,15 +293,17 @@ if __name__ == '__main__':
             d = None
             while type(d) != int or d < 1:
                 d = int(input("Profundidad: "))
-            jugs.append(lambda juego, s, j: jugador_negamax(
-                juego, s, j, ordena=ordena_centro, evalua=evalua_3con, d=d)
+            jugs.append(lambda juego, s, j, busqueda=Busqueda(): jugador_negamax(
+                juego, s, j, ordena=ordena_centro, evalua=evalua_3con, d=d,
+                busqueda=busqueda)
             )
         else:
             t = None
             while type(t) != int or t < 1:
                 t = int(input("Tiempo: "))
-            jugs.append(lambda juego, s, j: minimax_iterativo(
-                juego, s, j, ordena=ordena_centro, evalua=evalua_3con, tiempo=t)
+            jugs.append(lambda juego, s, j, busqueda=Busqueda(): minimax_iterativo(
+                juego, s, j, ordena=ordena_centro, evalua=evalua_3con, tiempo=t,
+                busqueda=busqueda)
             )
         
     g, s_final = juega_dos_jugadores(modelo, jugs[0], jugs[1])
@@ -0,0 +1,226 @@
+"""
+Juego de conecta 4 con tableros de bits
+
+El estado guarda un entero por jugador con sus fichas. Cada columna usa
+7 bits (6 filas más un bit centinela que siempre vale 0), contando las
+filas desde abajo:
+
+ 5 12 19 26 33 40 47
+ 4 11 18 25 32 39 46
+ 3 10 17 24 31 38 45
+ 2  9 16 23 30 37 44
+ 1  8 15 22 29 36 43
+ 0  7 14 21 28 35 42
+
+La altura de cada columna queda implícita en la máscara de casillas
+ocupadas: sumar el bit del fondo de una columna a esa máscara da, por
+acarreo, el bit de la primera casilla libre.
+
+Además el estado guarda su clave Zobrist y al ganador, que se calculan
+al hacer la jugada (el ganador revisando solo las cuatro direcciones con
+desplazamientos), de modo que `terminal`, `ganancia` y `clave` son O(1).
+
+Las acciones y las ganancias son las mismas que en `conect4.Conecta4`.
+
+"""
+
+from typing import NamedTuple
+
+from juegos_simplificado import ModeloJuegoZT2
+from transposicion import MASCARA_64, ZobristCasillas
+
+ZOBRIST = ZobristCasillas(49, semilla="conecta4_bitboard")
+
+FONDO = tuple(1 << (7 * c) for c in range(7))
+ARRIBA = tuple(1 << (7 * c + 5) for c in range(7))
+COLUMNA = tuple(0b111111 << (7 * c) for c in range(7))
+LLENO = sum(COLUMNA)
+
+# Vertical, horizontal y las dos diagonales
+DESPLAZAMIENTOS = (1, 7, 6, 8)
+
+# Multiplicador impar que reparte las claves canónicas en la tabla
+MEZCLA = 0x9E3779B97F4A7C15
+
+
+class TableroC4(NamedTuple):
+    jugador1: int
+    jugador2: int
+    ganador: int
+    clave: int
+
+    def tobytes(self) -> bytes:
+        return (
+            self.jugador1.to_bytes(8, "little")
+            + self.jugador2.to_bytes(8, "little")
+            + self.ganador.to_bytes(1, "little", signed=True)
+        )
+
+
+def conecta4(fichas: int) -> bool:
+    """
+    True si en el tablero de bits hay cuatro fichas en línea
+
+    """
+    for n in DESPLAZAMIENTOS:
+        m = fichas & (fichas >> n)
+        if m & (m >> (2 * n)):
+            return True
+    return False
+
+
+def espejo(x: int) -> int:
+    """
+    Refleja un tablero de bits (o una suma de tableros) de izquierda a
+    derecha
+
+    """
+    r = 0
+    for c in range(7):
+        r |= ((x >> (7 * c)) & 0x7F) << (7 * (6 - c))
+    return r
+
+
+class Conecta4Bitboard(ModeloJuegoZT2):
+    def inicializa(self):
+        return (TableroC4(0, 0, 0, 0), 1)
+
+    def jugadas_legales(self, s: TableroC4, j):
+        ocupadas = s.jugador1 | s.jugador2
+        return [columna for columna in range(7) if not ocupadas & ARRIBA[columna]]
+
+    def transicion(self, s: TableroC4, a, j):
+        uno, dos, _, clave = s
+        ficha = ((uno | dos) + FONDO[a]) & COLUMNA[a]
+        clave ^= ZOBRIST.ficha(ficha.bit_length() - 1, j)
+        if j == 1:
+            uno |= ficha
+            return TableroC4(uno, dos, 1 if conecta4(uno) else 0, clave)
+        dos |= ficha
+        return TableroC4(uno, dos, -1 if conecta4(dos) else 0, clave)
+
+    def terminal(self, s: TableroC4):
+        return s.ganador != 0 or (s.jugador1 | s.jugador2) == LLENO
+
+    def ganancia(self, s: TableroC4):
+        return s.ganador
+
+    def clave(self, s: TableroC4):
+        return s.clave
+
+    def clave_canonica(self, s: TableroC4):
+        """
+        Las fichas del jugador 1 más las casillas ocupadas identifican a
+        la posición; se toma la menor entre ella y su reflejo y se
+        multiplica por MEZCLA (una biyección en 64 bits), así que dos
+        posiciones no simétricas nunca comparten clave
+
+        """
+        posicion = s.jugador1 + (s.jugador1 | s.jugador2)
+        reflejo = espejo(posicion)
+        if reflejo < posicion:
+            return (reflejo * MEZCLA) & MASCARA_64, 1
+        return (posicion * MEZCLA) & MASCARA_64, 0
+
+    def transforma_jugada(self, a, simetria):
+        return 6 - a if simetria else a
+
+    def jugada_original(self, a, simetria):
+        return 6 - a if simetria else a
+
+    def resuelve_final(self, s: TableroC4, j, limite=None):
+        from conect4_solucion import jugada_solucion
+
+        return jugada_solucion(s.jugador1, s.jugador2, j, limite)
+
+
+def bit_de_casilla(i: int) -> int:
+    """
+    Bit que corresponde a la casilla i (0 a 41) de `conect4.Conecta4`
+
+    """
+    fila, columna = divmod(i, 7)
+    return 1 << (7 * columna + 5 - fila)
+
+
+def de_tupla(s: tuple) -> TableroC4:
+    """
+    Convierte un estado de `conect4.Conecta4` en un TableroC4
+
+    """
+    uno = sum(bit_de_casilla(i) for i, x in enumerate(s) if x == 1)
+    dos = sum(bit_de_casilla(i) for i, x in enumerate(s) if x == -1)
+    ganador = 1 if conecta4(uno) else -1 if conecta4(dos) else 0
+    return TableroC4(uno, dos, ganador, ZOBRIST.clave_bits(uno, dos))
+
+
+def a_tupla(s: TableroC4) -> tuple:
+    """
+    Convierte un TableroC4 en un estado de `conect4.Conecta4`
+
+    """
+    return tuple(
+        (
+            1
+            if s.jugador1 & bit_de_casilla(i)
+            else -1 if s.jugador2 & bit_de_casilla(i) else 0
+        )
+        for i in range(42)
+    )
+
+
+def evalua_3con_bits(s: TableroC4) -> float:
+    """
+    Evalua el estado s para el jugador 1 contando las líneas de tres
+    fichas, como `conect4.evalua_3con`.
+
+    Los bits centinela evitan que una línea dé la vuelta de una columna a
+    otra, así que aquí se cuentan solo las 98 líneas reales del tablero.
+
+    """
+    conect3 = 0
+    for n in DESPLAZAMIENTOS:
+        for fichas, signo in ((s.jugador1, 1), (s.jugador2, -1)):
+            conect3 += (
+                signo * (fichas & (fichas >> n) & (fichas >> (2 * n))).bit_count()
+            )
+    return conect3 / (7 * 4 + 6 * 5 + 5 * 4 + 5 * 4)
+
+
+def verifica_perft(d=6):
+    """
+    Compara el perft de `conect4.Conecta4` y `Conecta4Bitboard` con los
+    valores conocidos, de la profundidad 1 a la d, y que ambos modelos
+    lleguen a los mismos estados
+
+    Regresa
+    -------
+    list: conteos por profundidad
+
+    """
+    from conect4 import Conecta4
+    from perft import CONOCIDOS, verifica
+
+    tuplas, bits = Conecta4(), Conecta4Bitboard()
+    s, j = tuplas.inicializa()
+    b, _ = bits.inicializa()
+    verifica(tuplas, CONOCIDOS["conecta4"], d)
+    conteos = verifica(bits, CONOCIDOS["conecta4"], d)
+
+    def recorre(s, b, j, d):
+        if de_tupla(s) != b or tuplas.terminal(s) != bits.terminal(b):
+            raise AssertionError(f"Los estados difieren:\n{s}\n{b}")
+        if d == 0 or tuplas.terminal(s):
+            if tuplas.ganancia(s) != bits.ganancia(b):
+                raise AssertionError(f"ganancia difiere:\n{s}\n{b}")
+            return
+        for a in bits.jugadas_legales(b, j):
+            recorre(tuplas.transicion(s, a, j), bits.transicion(b, a, j), -j, d - 1)
+
+    recorre(s, b, j, min(d, 5))
+    return conteos
+
+
+if __name__ == "__main__":
+    for k, n in enumerate(verifica_perft(), 1):
+        print(f"perft({k}) = {n}")
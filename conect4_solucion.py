@@ -0,0 +1,458 @@
+"""
+Solución exacta de conecta 4
+
+Conecta 4 está resuelto: con juego perfecto gana el primer jugador. Este
+módulo calcula el valor exacto de una posición sobre los tableros de bits
+de `conect4_bitboard` (7 bits por columna, contando las filas desde
+abajo). La posición se da con las fichas del jugador en turno y la
+máscara de casillas ocupadas.
+
+El valor cuenta las jugadas que faltan para ganar: si el jugador en turno
+puede ganar con su k-ésima ficha a partir de ahora, vale 22 - k - n // 2
+(n fichas en el tablero), positivo; si pierde, negativo con la misma
+escala, y 0 si es empate. Así ganar pronto vale más que ganar tarde.
+
+    1- Negamax con poda alfa-beta que solo considera las jugadas que no
+       pierden de inmediato, ordenadas por el número de amenazas que crean
+       y luego del centro hacia las orillas
+    2- Búsqueda binaria del valor con ventanas nulas
+    3- Tabla de cotas de tamaño fijo (en megabytes) cuya clave es la
+       misma para una posición y su reflejo, así que cada posición
+       simétrica se resuelve una vez
+    4- Libro de aperturas opcional: un archivo con los valores de las
+       posiciones de las primeras jugadas, leído con np.memmap, de modo
+       que no se carga completo a memoria
+
+Los modelos de conecta 4 usan este módulo en su `resuelve_final`, que
+`minimax.minimax_iterativo` llama antes de buscar.
+
+El libro no viene con el código: resolver las primeras jugadas en Python
+toma horas. Sin él (si no existe ARCHIVO_LIBRO), `jugada_solucion` solo
+resuelve posiciones con FICHAS_SOLUCION fichas o más y se rinde después
+de NODOS_SOLUCION nodos, así que la apertura y el medio juego los decide
+la búsqueda normal. Para generarlo desde la posición de unas columnas ya
+jugadas, con la tabla de cotas del tamaño dado:
+
+    python conect4_solucion.py <plies> --jugadas <columnas> --mb <megabytes>
+
+"""
+
+import os
+from array import array
+from time import time
+
+import numpy as np
+
+from conect4_bitboard import ARRIBA, COLUMNA, FONDO, LLENO, espejo
+from minimax import TiempoAgotado
+
+# Libro que se carga si existe, junto a este módulo
+ARCHIVO_LIBRO = os.path.join(os.path.dirname(__file__), "conecta4.libro")
+
+# Registro del libro: clave simétrica y valor de la posición
+REGISTRO = np.dtype([("clave", "<u8"), ("valor", "i1")])
+
+# Orden de las columnas, del centro a las orillas
+ORDEN = (3, 2, 4, 1, 5, 0, 6)
+
+# Memoria por omisión de la tabla de cotas, en megabytes
+MB_COTAS = 16
+
+# Memoria por entrada de la tabla de cotas: clave (8) y las dos cotas (1 y 1)
+BYTES_POR_COTA = 10
+
+# Nodos entre cada revisión del reloj
+INTERVALO_RELOJ = 1024
+
+# Fichas en el tablero a partir de las cuales `jugada_solucion` resuelve
+# aunque la posición no esté en el libro
+FICHAS_SOLUCION = 16
+
+# Nodos que puede visitar `jugada_solucion` antes de rendirse; con 16
+# fichas o más casi todas las posiciones se resuelven con menos
+NODOS_SOLUCION = 100_000
+
+# Lo que pierde por cada jugada de demora una victoria (o lo que gana una
+# derrota) en la escala de la búsqueda, ver `valor_busqueda`
+DEMORA = 0.001
+
+TODO_FONDO = sum(FONDO)
+
+
+def ganadoras(propias: int, ocupadas: int) -> int:
+    """
+    Casillas vacías en las que el jugador con las fichas `propias`
+    completaría cuatro en línea
+
+    """
+    # Vertical
+    r = (propias << 1) & (propias << 2) & (propias << 3)
+    # Horizontal y diagonales: huecos en cualquiera de las cuatro posiciones
+    for n in (7, 6, 8):
+        p = (propias << n) & (propias << 2 * n)
+        r |= p & (propias << 3 * n)
+        r |= p & (propias >> n)
+        p = (propias >> n) & (propias >> 2 * n)
+        r |= p & (propias << n)
+        r |= p & (propias >> 3 * n)
+    return r & (LLENO ^ ocupadas)
+
+
+def clave_simetrica(propias: int, ocupadas: int) -> int:
+    """
+    Clave única de la posición, la misma que la de su reflejo
+
+    Como en cada columna las fichas propias más las ocupadas no pasan de
+    7 bits, la suma no se mezcla entre columnas.
+
+    """
+    clave = propias + ocupadas
+    return min(clave, espejo(clave))
+
+
+class Solucionador:
+    """
+    Resuelve posiciones de conecta 4 y guarda entre una búsqueda y otra
+    las cotas que encontró
+
+    Las cotas van en una tabla de tamaño fijo, en arreglos preasignados
+    como los de `transposicion.TablaTransposicion`: cada clave tiene un
+    solo lugar y la entrada nueva siempre reemplaza a la que estaba. Así
+    la memoria no crece aunque el solucionador viva todo el proceso.
+
+    Parametros
+    ----------
+    libro (str): Archivo del libro de aperturas. Si no existe, no se usa
+        libro.
+    mb (float): Memoria de la tabla de cotas, en megabytes
+
+    """
+
+    def __init__(self, libro=ARCHIVO_LIBRO, mb=MB_COTAS):
+        self.libro = None
+        self.nodos = 0
+        self.limite = None
+        self.tope = None
+        self.dimensiona(mb)
+        if libro is not None and os.path.exists(libro):
+            self.carga_libro(libro)
+
+    def dimensiona(self, mb):
+        """
+        Cambia la memoria de la tabla de cotas a `mb` megabytes y la
+        vacía
+
+        """
+        self.mb = mb
+        self.entradas = max(1, int(mb * 2**20) // BYTES_POR_COTA)
+        # Se guarda clave + 1, para que 0 sea un lugar vacío
+        self.claves = array("Q", bytes(8 * self.entradas))
+        self.inferiores = array("b", bytes(self.entradas))
+        self.superiores = array("b", bytes(self.entradas))
+
+    def carga_libro(self, archivo):
+        """
+        Usa el libro del archivo, sin leerlo completo
+
+        """
+        self.libro = np.memmap(archivo, dtype=REGISTRO, mode="r")
+
+    def busca_libro(self, propias, ocupadas):
+        """
+        Valor de la posición en el libro, o None
+
+        """
+        if self.libro is None or not len(self.libro):
+            return None
+        clave = clave_simetrica(propias, ocupadas)
+        i = int(np.searchsorted(self.libro["clave"], clave))
+        if i < len(self.libro) and self.libro["clave"][i] == clave:
+            return int(self.libro["valor"][i])
+        return None
+
+    def en_libro(self, propias, ocupadas):
+        """
+        True si el libro tiene a todas las posiciones que siguen a esta
+        (salvo las que ya ganó el jugador en turno)
+
+        """
+        if self.libro is None:
+            return False
+        for c in range(7):
+            if ocupadas & ARRIBA[c]:
+                continue
+            ficha = (ocupadas + FONDO[c]) & COLUMNA[c]
+            if ganadoras(propias, ocupadas) & ficha:
+                continue
+            if self.busca_libro(propias ^ ocupadas, ocupadas | ficha) is None:
+                return False
+        return True
+
+    def _negamax(self, propias, ocupadas, n, alpha, beta):
+        """
+        Valor de la posición dentro de la ventana (alpha, beta). El
+        jugador en turno no puede ganar en una jugada.
+
+        """
+        self.nodos += 1
+        if self.nodos % INTERVALO_RELOJ == 0 and (
+            (self.limite is not None and time() > self.limite)
+            or (self.tope is not None and self.nodos > self.tope)
+        ):
+            raise TiempoAgotado()
+        rival = propias ^ ocupadas
+        posibles = (ocupadas + TODO_FONDO) & LLENO
+        amenazas = ganadoras(rival, ocupadas)
+        forzadas = posibles & amenazas
+        if forzadas:
+            if forzadas & (forzadas - 1):
+                return -((42 - n) // 2)
+            posibles = forzadas
+        # No se juega debajo de una casilla donde ganaría el rival
+        posibles &= ~(amenazas >> 1)
+        if not posibles:
+            return -((42 - n) // 2)
+        if n >= 40:
+            return 0
+
+        inferior = -((40 - n) // 2)
+        superior = (41 - n) // 2
+        clave = clave_simetrica(propias, ocupadas)
+        i = clave % self.entradas
+        if self.claves[i] == clave + 1:
+            inferior = max(inferior, self.inferiores[i])
+            superior = min(superior, self.superiores[i])
+        alpha, beta = max(alpha, inferior), min(beta, superior)
+        if alpha >= beta:
+            return alpha
+
+        jugadas = []
+        for c in ORDEN:
+            ficha = posibles & COLUMNA[c]
+            if ficha:
+                nuevas = propias | ficha
+                jugadas.append((ganadoras(nuevas, ocupadas | ficha).bit_count(), ficha))
+        jugadas.sort(key=lambda x: -x[0])
+
+        alpha_original = alpha
+        mejor = -100
+        for _, ficha in jugadas:
+            v = -self._negamax(rival, ocupadas | ficha, n + 1, -beta, -alpha)
+            if v > mejor:
+                mejor = v
+                if v >= beta:
+                    break
+                if v > alpha:
+                    alpha = v
+        if mejor <= alpha_original:
+            superior = min(superior, mejor)
+        elif mejor >= beta:
+            inferior = max(inferior, mejor)
+        else:
+            inferior = superior = mejor
+        self.claves[i] = clave + 1
+        self.inferiores[i] = inferior
+        self.superiores[i] = superior
+        return mejor
+
+    def valor(self, propias, ocupadas, limite=None, tope=None):
+        """
+        Valor exacto de la posición para el jugador en turno, buscando con
+        ventanas nulas alrededor del punto medio del intervalo posible
+
+        limite: hora (de `time.time`) a la que se lanza TiempoAgotado
+        tope: valor de `self.nodos` a partir del cual se lanza
+            TiempoAgotado
+
+        """
+        n = ocupadas.bit_count()
+        if ganadoras(propias, ocupadas) & (ocupadas + TODO_FONDO):
+            return (43 - n) // 2
+        if n == 42:
+            return 0
+        libro = self.busca_libro(propias, ocupadas)
+        if libro is not None:
+            return libro
+        self.limite, self.tope = limite, tope
+        minimo, maximo = -((42 - n) // 2), (43 - n) // 2
+        while minimo < maximo:
+            medio = minimo + (maximo - minimo) // 2
+            if medio <= 0 and int(minimo / 2) < medio:
+                medio = int(minimo / 2)
+            elif medio >= 0 and int(maximo / 2) > medio:
+                medio = int(maximo / 2)
+            v = self._negamax(propias, ocupadas, n, medio, medio + 1)
+            if v <= medio:
+                maximo = v
+            else:
+                minimo = v
+        return minimo
+
+    def mejor_jugada(self, propias, ocupadas, limite=None, max_nodos=None):
+        """
+        Mejor columna para el jugador en turno y su valor. Si varias
+        empatan, la más cercana al centro.
+
+        Parametros
+        ----------
+        limite (float): Hora (de `time.time`) a la que se abandona
+        max_nodos (int): Si no es None, nodos que se pueden visitar antes
+            de abandonar
+
+        Regresa
+        -------
+        tuple: (columna, valor), o None si se llegó al límite
+
+        """
+        n = ocupadas.bit_count()
+        mejor = None
+        tope = None if max_nodos is None else self.nodos + max_nodos
+        try:
+            for c in ORDEN:
+                if ocupadas & ARRIBA[c]:
+                    continue
+                ficha = (ocupadas + FONDO[c]) & COLUMNA[c]
+                if ganadoras(propias, ocupadas) & ficha:
+                    return c, (43 - n) // 2
+                v = -self.valor(propias ^ ocupadas, ocupadas | ficha, limite, tope)
+                if mejor is None or v > mejor[1]:
+                    mejor = c, v
+        except TiempoAgotado:
+            return None
+        return mejor
+
+
+# Solucionador que usan los modelos, con el libro de ARCHIVO_LIBRO si existe
+# y MB_COTAS megabytes de cotas (se cambian con `SOLUCIONADOR.dimensiona`)
+SOLUCIONADOR = Solucionador()
+
+
+def posiciones(jugadas, plies):
+    """
+    Posiciones (propias, ocupadas) distintas, salvo reflejo, a las que se
+    llega desde la posición de `jugadas` (columnas desde el inicio) con
+    hasta `plies` jugadas más, sin contar las que ya terminaron
+
+    """
+    propias = ocupadas = 0
+    for c in jugadas:
+        ficha = (ocupadas + FONDO[c]) & COLUMNA[c]
+        propias, ocupadas = propias ^ ocupadas, ocupadas | ficha
+    nivel = {clave_simetrica(propias, ocupadas): (propias, ocupadas)}
+    vistas = dict(nivel)
+    for _ in range(plies):
+        siguiente = {}
+        for propias, ocupadas in nivel.values():
+            for c in range(7):
+                if ocupadas & ARRIBA[c]:
+                    continue
+                ficha = (ocupadas + FONDO[c]) & COLUMNA[c]
+                if ganadoras(propias, ocupadas) & ficha:
+                    continue
+                hijo = propias ^ ocupadas, ocupadas | ficha
+                if hijo[1] == LLENO:
+                    continue
+                clave = clave_simetrica(*hijo)
+                if clave not in vistas:
+                    siguiente[clave] = vistas[clave] = hijo
+        nivel = siguiente
+    return vistas
+
+
+def genera_libro(archivo, plies, jugadas=(), solucionador=None, mb=MB_COTAS):
+    """
+    Resuelve todas las posiciones de las primeras jugadas y guarda sus
+    valores en `archivo`, ordenados por clave para buscarlos con
+    búsqueda binaria
+
+    Es un proceso largo que se corre una vez, fuera del juego. Se empieza
+    por las posiciones más profundas para que las cotas que dejan en la
+    tabla sirvan a las de menos fichas.
+
+    Parametros
+    ----------
+    archivo (str): Archivo donde se escribe el libro
+    plies (int): Jugadas que cubre el libro a partir de `jugadas`
+    jugadas (list): Columnas jugadas desde el inicio hasta la posición
+        desde la que empieza el libro
+    mb (float): Memoria de la tabla de cotas si no se da solucionador
+
+    Regresa
+    -------
+    int: número de posiciones en el libro
+
+    """
+    if solucionador is None:
+        solucionador = Solucionador(libro=None, mb=mb)
+    todas = posiciones(jugadas, plies)
+    orden = sorted(todas.items(), key=lambda x: -x[1][1].bit_count())
+    libro = np.empty(len(orden), dtype=REGISTRO)
+    for k, (clave, (propias, ocupadas)) in enumerate(orden):
+        libro[k] = clave, solucionador.valor(propias, ocupadas)
+    libro.sort(order="clave")
+    libro.tofile(archivo)
+    return len(libro)
+
+
+def valor_busqueda(valor):
+    """
+    Convierte un valor del solucionador (jugadas para ganar) a la escala
+    de la búsqueda, la de `ganancia`: ±(1 - DEMORA k), donde k = 22 - |valor|
+    es el número de fichas que tendrá el ganador al terminar la partida.
+    Así queda entre -1 y 1 y ganar pronto sigue valiendo más que ganar
+    tarde.
+
+    """
+    if valor == 0:
+        return 0.0
+    signo = 1 if valor > 0 else -1
+    return signo * (1 - DEMORA * (22 - abs(valor)))
+
+
+def jugada_solucion(
+    uno, dos, j, limite=None, solucionador=None, max_nodos=NODOS_SOLUCION
+):
+    """
+    Mejor jugada de j en la posición con las fichas `uno` del jugador 1 y
+    `dos` del jugador -1, para el `resuelve_final` de los modelos
+
+    Solo se resuelve si hay al menos FICHAS_SOLUCION fichas o si el libro
+    tiene a las posiciones siguientes, y se abandona después de max_nodos
+    nodos; más allá la búsqueda exacta tarda demasiado y es mejor dejarle
+    el tiempo a la búsqueda normal.
+
+    Regresa
+    -------
+    tuple: (columna, valor), con el valor en la escala de la búsqueda
+        (ver `valor_busqueda`), o None si no se resolvió
+
+    """
+    if solucionador is None:
+        solucionador = SOLUCIONADOR
+    propias, ocupadas = (uno if j == 1 else dos), uno | dos
+    if ocupadas.bit_count() < FICHAS_SOLUCION and not solucionador.en_libro(
+        propias, ocupadas
+    ):
+        return None
+    resultado = solucionador.mejor_jugada(propias, ocupadas, limite, max_nodos)
+    if resultado is None:
+        return None
+    return resultado[0], valor_busqueda(resultado[1])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera el libro de aperturas")
+    parser.add_argument("plies", type=int)
+    parser.add_argument("--salida", default=ARCHIVO_LIBRO)
+    parser.add_argument(
+        "--jugadas", type=int, nargs="*", default=[], help="columnas iniciales"
+    )
+    parser.add_argument(
+        "--mb", type=float, default=MB_COTAS, help="memoria de la tabla de cotas"
+    )
+    args = parser.parse_args()
+    t0 = time()
+    n = genera_libro(args.salida, args.plies, args.jugadas, mb=args.mb)
+    print(f"{n} posiciones en {time() - t0:.1f} s, {args.salida}")
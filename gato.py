@@ -7,12 +7,20 @@ from juegos_simplificado import ModeloJuegoZT2
 from juegos_simplificado import juega_dos_jugadores
 from juegos_simplificado import minimax
 from minimax import jugador_negamax
+from transposicion import SimetriasCasillas
+from transposicion import ZobristCasillas
+from transposicion import permutaciones_diedrales
+
+ZOBRIST = ZobristCasillas(9, semilla="gato")
+SIMETRIAS = SimetriasCasillas(ZOBRIST, permutaciones_diedrales(3))
 
 class Gato(ModeloJuegoZT2):
     """
     El juego del gato 
 
     """
+    hace_y_deshace = True
+
     def inicializa(self):
         """
         Inicializa el juego del gato
@@ -71,6 +79,48 @@ class Gato(ModeloJuegoZT2):
             if s[i] == s[i + 3] == s[i + 6] != 0:
                 return s[i]
         return 0    
+
+    def clave(self, s):
+        """
+        Devuelve la clave Zobrist del estado s
+
+        """
+        return ZOBRIST.clave(s)
+
+    def clave_canonica(self, s):
+        """
+        La menor de las claves de las ocho simetrías del tablero
+
+        """
+        return SIMETRIAS.clave(s)
+
+    def transforma_jugada(self, a, simetria):
+        return SIMETRIAS.transforma(a, simetria)
+
+    def jugada_original(self, a, simetria):
+        return SIMETRIAS.original(a, simetria)
+
+    def estado_mutable(self, s):
+        """
+        El estado como lista
+
+        """
+        return list(s)
+
+    def hace_jugada(self, s, a, j):
+        """
+        Pone la ficha de j en la casilla a; el registro es la casilla
+
+        """
+        s[a] = j
+        return a
+
+    def deshace_jugada(self, s, registro):
+        """
+        Vacía la casilla del registro
+
+        """
+        s[registro] = 0
     
 def pprint_gato(s):
     """
@@ -5,7 +5,8 @@ Vamos a usar una orientación funcional en este modulo
 
 """
 
-from random import shuffle
+from hashlib import blake2b
+from random import Random, shuffle
 
 
 class ModeloJuegoZT2:
@@ -14,8 +15,29 @@ class ModeloJuegoZT2:
 
     Se asumen que los jugadores son 1 y -1
 
+    Si hace_y_deshace es True, el juego implementa además `estado_mutable`,
+    `hace_jugada` y `deshace_jugada`, y el negamax los usa en lugar de
+    `transicion` para no crear un estado nuevo en cada nodo.
+
+    Si en el juego un jugador puede quedarse sin jugadas sin que el juego
+    termine (como en Othello), `jugadas_legales` regresa en ese caso la
+    lista [pase], con `pase` la jugada que deja el estado igual y le da el
+    turno al rival, y `terminal` es True cuando ninguno de los dos puede
+    jugar. Así el negamax nunca ve un estado no terminal sin jugadas.
+
     """
 
+    hace_y_deshace = False
+
+    # Jugada de pase, o None si el juego no tiene pases
+    pase = None
+
+    # Ancho de las ventanas nulas de PVS (ver `minimax.negamax`): la menor
+    # diferencia entre dos valores de la evaluación que se quiere
+    # distinguir, en su escala (de -1 a 1). Un juego con evaluaciones más
+    # finas o en otra escala lo redefine.
+    ventana_nula = 1e-6
+
     def inicializa(self):
         """
         Inicializa el estado inicial del juego y el jugador
@@ -29,7 +51,8 @@ class ModeloJuegoZT2:
     def jugadas_legales(self, s, j):
         """
         Devuelve una lista con las jugadas legales para el jugador j
-        en el estado s
+        en el estado s. Si el estado no es terminal, la lista no está
+        vacía (ver `pase`)
 
         """
         raise NotImplementedError("Hay que desarrollar este método, pues")
@@ -56,6 +79,133 @@ class ModeloJuegoZT2:
         """
         raise NotImplementedError("Hay que desarrollar este método, pues")
 
+    def clave(self, s):
+        """
+        Devuelve un entero de 64 bits que identifica al estado s en las
+        tablas de transposición.
+
+        Por omisión es un blake2b de 8 bytes sobre `s.tobytes()`
+        (o sobre `repr(s)` si s no lo tiene), que a diferencia del hash de
+        Python no cambia con PYTHONHASHSEED de un proceso a otro, así que
+        vale en tablas compartidas o guardadas. Conviene redefinirlo con
+        claves Zobrist (ver el módulo `transposicion`) y, si el estado lo
+        permite, actualizarlas de forma incremental en `transicion`.
+
+        """
+        datos = s.tobytes() if hasattr(s, "tobytes") else repr(s).encode()
+        return int.from_bytes(blake2b(datos, digest_size=8).digest(), "little")
+
+    def clave_canonica(self, s):
+        """
+        Devuelve (clave, simetria): la clave del representante canónico
+        de s (la misma para todos los estados simétricos a s) y la
+        simetría que lleva a s a ese representante.
+
+        La usa el negamax en lugar de `clave` cuando la búsqueda se hace
+        con simetrías (ver `minimax.Busqueda`); las mejores jugadas se
+        guardan entonces en la tabla tal como quedan en el representante,
+        con `transforma_jugada`, y se recuperan con `jugada_original`.
+
+        Por omisión el juego no tiene simetrías: (clave(s), 0).
+
+        """
+        return self.clave(s), 0
+
+    def transforma_jugada(self, a, simetria):
+        """
+        La jugada a de un estado, vista en el estado transformado por la
+        simetría
+
+        """
+        return a
+
+    def jugada_original(self, a, simetria):
+        """
+        Inverso de `transforma_jugada`
+
+        """
+        return a
+
+    def codifica_jugada(self, a):
+        """
+        Devuelve un entero no negativo que representa a la jugada a, para
+        guardarla en tablas compartidas entre procesos.
+
+        Por omisión se supone que las jugadas ya son enteros.
+
+        """
+        return a
+
+    def decodifica_jugada(self, n):
+        """
+        La jugada que representa el entero n (inverso de codifica_jugada)
+
+        """
+        return n
+
+    def estado_mutable(self, s):
+        """
+        Devuelve una copia de s que se puede modificar con `hace_jugada`.
+        Los demás métodos del juego y la evaluación deben aceptarla igual
+        que a los estados que regresa `transicion`.
+
+        """
+        raise NotImplementedError("El juego no implementa hace_jugada")
+
+    def hace_jugada(self, s, a, j):
+        """
+        Realiza la jugada a del jugador j modificando el estado mutable s
+
+        devuelve: un registro con lo necesario para deshacer la jugada
+
+        """
+        raise NotImplementedError("El juego no implementa hace_jugada")
+
+    def deshace_jugada(self, s, registro):
+        """
+        Deshace en s la jugada que regresó el registro, de modo que s
+        vuelve a quedar como estaba antes de `hace_jugada`
+
+        """
+        raise NotImplementedError("El juego no implementa hace_jugada")
+
+    def resuelve_final(self, s, j, limite=None):
+        """
+        Si el juego sabe resolver s de forma exacta y rápida (por ejemplo,
+        un final con pocas casillas vacías), devuelve (jugada, valor) con
+        la mejor jugada de j y su valor para j, en la escala de `ganancia`
+        (entre -1 y 1) para que se pueda comparar con los de la búsqueda.
+        Devuelve None si no sabe o si no terminó antes de `limite` (hora
+        de `time.time`); solo debe intentarlo cuando lo más probable sea
+        que termine, porque el tiempo que gaste se le quita a la búsqueda.
+
+        `minimax.minimax_iterativo` lo llama antes de buscar. Por omisión
+        regresa None.
+
+        """
+        return None
+
+    def acumuladores(self, s):
+        """
+        Acumuladores de evaluación que lleva el estado s (una tupla), o
+        None si el juego no los lleva.
+
+        Un juego puede llevar en el estado cuentas que sirven para evaluar
+        (líneas, fichas, sumas por casilla), actualizarlas en `transicion`
+        solo con lo que cambia la jugada y leerlas en la evaluación en
+        tiempo constante. En ese caso redefine este método y `recalcula`,
+        y `verifica_incremental` revisa que coincidan.
+
+        """
+        return None
+
+    def recalcula(self, s):
+        """
+        Los acumuladores del estado s calculados desde cero
+
+        """
+        return None
+
 
 def juega_dos_jugadores(juego, jugador1, jugador2):
     """
@@ -65,15 +215,60 @@ def juega_dos_jugadores(juego, jugador1, jugador2):
     jugador1: función que recibe el estado y devuelve la jugada
     jugador2: función que recibe el estado y devuelve la jugada
 
+    Cuando la única jugada es el pase se juega sin consultar al jugador.
+
     """
     s, j = juego.inicializa()
     while not juego.terminal(s):
-        a = jugador1(juego, s, j) if j == 1 else jugador2(juego, s, j)
+        if juego.pase is not None and juego.jugadas_legales(s, j) == [juego.pase]:
+            a = juego.pase
+        else:
+            a = jugador1(juego, s, j) if j == 1 else jugador2(juego, s, j)
         s = juego.transicion(s, a, j)
         j = -j
     return juego.ganancia(s), s
 
 
+def verifica_incremental(juego, evaluaciones=(), partidas=100, semilla=0):
+    """
+    Juega partidas aleatorias y en cada estado compara los acumuladores
+    que lleva el estado con los recalculados desde cero. También compara
+    cada par (evaluación incremental, evaluación completa) de
+    `evaluaciones`.
+
+    Una partida termina cuando el estado es terminal o cuando el jugador
+    en turno no tiene jugadas.
+
+    Regresa
+    -------
+    int: número de posiciones comparadas
+
+    """
+    azar = Random(semilla)
+    posiciones = 0
+    for _ in range(partidas):
+        s, j = juego.inicializa()
+        while True:
+            posiciones += 1
+            if juego.acumuladores(s) != juego.recalcula(s):
+                raise AssertionError(
+                    f"Acumuladores {juego.acumuladores(s)} contra "
+                    f"{juego.recalcula(s)} en la posición {posiciones}"
+                )
+            for incremental, completa in evaluaciones:
+                if incremental(s) != completa(s):
+                    raise AssertionError(
+                        f"{incremental.__name__} difiere de {completa.__name__} "
+                        f"en la posición {posiciones}"
+                    )
+            jugadas = [] if juego.terminal(s) else list(juego.jugadas_legales(s, j))
+            if not jugadas:
+                break
+            s = juego.transicion(s, azar.choice(jugadas), j)
+            j = -j
+    return posiciones
+
+
 def minimax(juego, estado, jugador):
     """
     Devuelve la mejor jugada para el jugador en el estado
@@ -7,10 +7,321 @@ Modulo con el minimax con algunos los poderes
     4- Busqueda iterativa
     5- Tablas de transposicion
     6- Trazabilidad
+    7- Jugadas asesinas e historia
+    8- Búsqueda de variante principal (PVS) y ventanas de aspiración
+    9- Búsqueda en paralelo de las jugadas de la raíz
+    10- Lazy SMP: varios procesos con una tabla de transposición compartida
+    11- Evaluación por lotes de las hojas
+    12- Jugadas que se hacen y deshacen sobre un mismo estado
+    13- Estadísticas de la búsqueda
+    14- Finales resueltos por el juego (`resuelve_final`)
+    15- Claves canónicas para que los estados simétricos compartan entrada
+    16- Libros de aperturas (ver `aperturas.py`)
 """
 
-from random import shuffle
+import itertools
+import multiprocessing
+import os
+import queue
+import random
+from concurrent.futures import ProcessPoolExecutor
 from time import time
+from typing import NamedTuple
+
+from transposicion import (
+    EXACTO,
+    INFERIOR,
+    PROFUNDIDAD_TOTAL,
+    SUPERIOR,
+    TURNO,
+    TablaCompartida,
+    TablaTransposicion,
+)
+
+# Cada cuántos nodos se revisa el reloj
+INTERVALO_RELOJ = 4
+
+# Fracción del tiempo que se reserva para terminar de abortar y responder
+MARGEN_TIEMPO = 0.02
+
+# Fracción del tiempo que puede usar `resuelve_final` del juego; si no
+# termina, el resto es para la búsqueda normal. Los juegos además solo
+# intentan resolver cuando es probable que terminen (ver `resuelve_final`)
+FRACCION_FINAL = 0.25
+
+# Jugadas asesinas que se guardan por nivel
+ASESINAS_POR_NIVEL = 2
+
+# Identificadores de los contextos de búsqueda de este proceso
+_IDENTIFICADORES = itertools.count()
+
+
+class TiempoAgotado(Exception):
+    """
+    Se lanza dentro del negamax cuando se pasa el límite de tiempo
+
+    """
+
+
+class Busqueda:
+    """
+    Contexto de búsqueda que se conserva entre las iteraciones de
+    `minimax_iterativo` y entre los turnos de una partida.
+
+    Es dueño de la tabla de transposición, que guarda los valores y las
+    mejores jugadas ya calculados, y de la última variante principal
+    encontrada (`traza`, a `profundidad`, con `valor` para el jugador en
+    turno). Cada llamada a `nueva_busqueda` envejece la tabla, de modo
+    que las entradas de turnos anteriores se reemplazan primero.
+
+    Para conservarlo entre turnos se crea uno por jugador y se pasa en
+    cada llamada, por ejemplo
+
+        busqueda = Busqueda()
+        jugador = lambda juego, s, j: minimax_iterativo(
+            juego, s, j, ordena=ordena, evalua=evalua, busqueda=busqueda
+        )
+
+    También lleva el límite de tiempo de la búsqueda en curso: cuando el
+    contador de nodos llega a `siguiente_revision` el negamax revisa el
+    reloj, la mueve INTERVALO_RELOJ nodos más adelante y, si ya pasó el
+    límite, aborta con `TiempoAgotado`. Con un umbral, y no con el
+    residuo del contador, el reloj se revisa aunque el contador avance
+    de varios nodos a la vez (como en `_evalua_frontera`).
+
+    Y los datos para ordenar las jugadas durante la búsqueda: las jugadas
+    asesinas (las últimas que provocaron un corte beta en cada nivel) y la
+    historia (cuántas veces y a qué profundidad cada jugada de cada
+    jugador provocó un corte). En cada nodo se prueba primero la jugada de
+    la tabla de transposición, luego la de la variante principal anterior,
+    luego las asesinas y luego el resto por historia; la función `ordena`
+    o el orden aleatorio solo desempatan.
+
+    Parametros
+    ----------
+    mb (float): Memoria para la tabla de transposición, en megabytes
+    transp (TablaTransposicion): Tabla a usar en lugar de una nueva
+    semilla: Semilla para el orden aleatorio de las jugadas. Si None, se
+        usa el generador global del módulo `random`
+    dinamico (bool): Si False, no se usan asesinas ni historia
+    simetrias (bool): Si True, la tabla de transposición usa la clave
+        canónica del juego (`clave_canonica`), así que los estados
+        simétricos comparten entrada
+
+    """
+
+    def __init__(
+        self, mb=16, transp=None, semilla=None, dinamico=True, simetrias=False
+    ):
+        self.mb = mb
+        self.ident = os.getpid(), next(_IDENTIFICADORES)
+        self.transp = TablaTransposicion(mb) if transp is None else transp
+        self.azar = random if semilla is None else random.Random(semilla)
+        self.dinamico = dinamico
+        self.simetrias = simetrias
+        self.pvs = False
+        self.evalua_lote = None
+        self.estadisticas = None
+        self.asesinas = []
+        self.historia = {1: {}, -1: {}}
+        self.traza = []
+        self.profundidad = 0
+        self.valor = None
+        self.limite = None
+        self.reinicia_contadores()
+
+    def reinicia_contadores(self):
+        """
+        Pone en 0 los contadores de nodos, evaluaciones y cortes por la
+        tabla, y la siguiente revisión del reloj a INTERVALO_RELOJ nodos
+
+        """
+        self.nodos = 0
+        self.evaluaciones = 0
+        self.cortes_tt = 0
+        self.siguiente_revision = INTERVALO_RELOJ
+
+    def nueva_busqueda(self):
+        """
+        Prepara el contexto para buscar desde una nueva posición
+
+        """
+        self.transp.envejece()
+        self.traza = []
+        self.profundidad = 0
+        self.valor = None
+        self.limite = None
+        self.asesinas = []
+        for historia in self.historia.values():
+            for a in historia:
+                historia[a] //= 2
+
+    def ordena(self, jugadas, jugador, nivel):
+        """
+        Ordena las jugadas por asesinas y luego por historia, conservando
+        el orden previo entre jugadas empatadas
+
+        """
+        if not self.dinamico:
+            return jugadas
+        historia = self.historia[jugador]
+        asesinas = self.asesinas[nivel] if nivel < len(self.asesinas) else []
+
+        def puntaje(a):
+            if a in asesinas:
+                return (1, -asesinas.index(a))
+            return (0, historia.get(a, 0))
+
+        return sorted(jugadas, key=puntaje, reverse=True)
+
+    def registra_corte(self, a, jugador, nivel, d):
+        """
+        Registra que la jugada a provocó un corte beta
+
+        """
+        if not self.dinamico:
+            return
+        while len(self.asesinas) <= nivel:
+            self.asesinas.append([])
+        asesinas = self.asesinas[nivel]
+        if a not in asesinas:
+            asesinas.insert(0, a)
+            del asesinas[ASESINAS_POR_NIVEL:]
+        historia = self.historia[jugador]
+        d = PROFUNDIDAD_TOTAL if d is None else d
+        historia[a] = historia.get(a, 0) + d * d
+
+
+class Iteracion(NamedTuple):
+    """
+    Datos de una profundidad completada por la búsqueda
+
+    """
+
+    profundidad: int
+    nodos: int
+    evaluaciones: int
+    segundos: float
+    ramificacion: float
+
+
+class Estadisticas:
+    """
+    Lo que hizo una búsqueda, para revisar el ordenamiento y la tabla de
+    transposición. Se llena solo si `busqueda.estadisticas` no es None
+    (ver `minimax_iterativo` y `jugador_negamax` con estadisticas=True);
+    si es None, el negamax no cuenta nada más que lo que ya necesita.
+
+    Atributos
+    ---------
+    nodos, evaluaciones: Nodos visitados y hojas evaluadas, incluyendo
+        las iteraciones que se abortaron por tiempo
+    terminales: Nodos terminales encontrados
+    cortes_beta: Cortes beta; cortes_por_indice[k] son los que provocó la
+        k-ésima jugada buscada del nodo (con buen ordenamiento, casi todos
+        en la 0)
+    sondeos_tt, aciertos_tt: Búsquedas en la tabla de transposición y
+        cuántas encontraron la posición
+    cortes_tt: Nodos que se resolvieron con la tabla sin buscar
+    guardados_tt, reemplazos_tt: Entradas guardadas y cuántas de ellas
+        sacaron de la tabla a otra posición
+    iteraciones: Una `Iteracion` por profundidad completada
+
+    Con Lazy SMP los procesos trabajadores no envían sus cuentas, así que
+    solo se llenan iteraciones y nodos.
+
+    """
+
+    def __init__(self):
+        self.nodos = 0
+        self.evaluaciones = 0
+        self.terminales = 0
+        self.cortes_beta = 0
+        self.cortes_por_indice = []
+        self.sondeos_tt = 0
+        self.aciertos_tt = 0
+        self.cortes_tt = 0
+        self.guardados_tt = 0
+        self.reemplazos_tt = 0
+        self.iteraciones = []
+
+    def registra_corte(self, k):
+        """
+        Registra un corte beta provocado por la k-ésima jugada del nodo
+
+        """
+        self.cortes_beta += 1
+        while len(self.cortes_por_indice) <= k:
+            self.cortes_por_indice.append(0)
+        self.cortes_por_indice[k] += 1
+
+    def acumula(self, busqueda):
+        """
+        Suma los contadores que la búsqueda lleva siempre
+
+        """
+        self.nodos += busqueda.nodos
+        self.evaluaciones += busqueda.evaluaciones
+        self.cortes_tt += busqueda.cortes_tt
+
+    def suma(self, otra):
+        """
+        Suma las cuentas de otra Estadisticas (de otro proceso)
+
+        """
+        for nombre in (
+            "terminales",
+            "cortes_beta",
+            "sondeos_tt",
+            "aciertos_tt",
+            "guardados_tt",
+            "reemplazos_tt",
+        ):
+            setattr(self, nombre, getattr(self, nombre) + getattr(otra, nombre))
+        while len(self.cortes_por_indice) < len(otra.cortes_por_indice):
+            self.cortes_por_indice.append(0)
+        for k, cortes in enumerate(otra.cortes_por_indice):
+            self.cortes_por_indice[k] += cortes
+
+    @property
+    def tasa_aciertos_tt(self):
+        return self.aciertos_tt / self.sondeos_tt if self.sondeos_tt else 0.0
+
+    @property
+    def cortes_primera(self):
+        """
+        Fracción de los cortes beta que provocó la primera jugada
+
+        """
+        if not self.cortes_beta:
+            return 0.0
+        return self.cortes_por_indice[0] / self.cortes_beta
+
+    @property
+    def ramificacion(self):
+        """
+        Factor de ramificación efectivo de la última profundidad completa
+
+        """
+        return self.iteraciones[-1].ramificacion if self.iteraciones else 0.0
+
+    def __str__(self):
+        lineas = [
+            f"nodos {self.nodos}, evaluaciones {self.evaluaciones}, "
+            f"terminales {self.terminales}",
+            f"cortes beta {self.cortes_beta} "
+            f"({100 * self.cortes_primera:.1f}% en la primera jugada)",
+            f"tabla: {self.sondeos_tt} sondeos, "
+            f"{100 * self.tasa_aciertos_tt:.1f}% aciertos, "
+            f"{self.cortes_tt} cortes, {self.guardados_tt} guardados, "
+            f"{self.reemplazos_tt} reemplazos",
+        ]
+        for it in self.iteraciones:
+            lineas.append(
+                f"  d={it.profundidad:2d} {it.nodos:9d} nodos "
+                f"{it.segundos:8.3f} s  ramificación {it.ramificacion:.2f}"
+            )
+        return "\n".join(lineas)
 
 
 def negamax(
@@ -22,8 +333,11 @@ def negamax(
     ordena=None,
     d=None,
     evalua=None,
-    transp={},
+    transp=None,
     traza=[],
+    busqueda=None,
+    pvs=False,
+    evalua_lote=None,
 ):
     """
     Devuelve la mejor jugada para el jugador en el estado
@@ -40,9 +354,23 @@ def negamax(
     d (int): Profundidad.
         Si None, busca hasta el final
     evalua: function de evaluación
-        Siempre evalua para el jugador 1
-    transp (dict): Tabla de transposición
+        Siempre evalua para el jugador 1. Como ordena, puede ser
+        cualquier objeto que se pueda llamar (por ejemplo una
+        `ajuste.Evaluacion`)
+    transp (TablaTransposicion o TablaCompartida): Tabla de transposición
+        Si None, se usa una tabla nueva
     traza (list): Trazabilidad
+    busqueda (Busqueda): Contexto de búsqueda, con su tabla de
+        transposición y su límite de tiempo. Excluye a transp.
+    pvs (bool): Si True, busca con PVS: solo la primera jugada de cada
+        nodo se busca con la ventana completa, las demás con una ventana
+        nula (de ancho `juego.ventana_nula`) y se vuelven a buscar solo si
+        superan a alpha
+    evalua_lote: Si no es None, función que recibe una lista de N estados
+        (o un arreglo con los N estados apilados) y devuelve un arreglo
+        con sus N evaluaciones, las mismas que daría evalua. Se usa en los
+        nodos a profundidad 1, que evalúan a todos sus hijos en una
+        sola llamada.
 
     Regresa
     -------
@@ -51,98 +379,633 @@ def negamax(
     """
     if d is not None and evalua is None:
         raise ValueError("Se necesita evalua si d no es None")
-    if type(ordena) is not type(None) and type(ordena) is not type(lambda x: x):
+    if ordena is not None and not callable(ordena):
         raise ValueError("ordena debe ser una función")
-    if type(evalua) is not type(None) and type(evalua) is not type(lambda x: x):
+    if evalua is not None and not callable(evalua):
         raise ValueError("evalua debe ser una función")
-    if type(transp) is not dict:
-        raise ValueError("transp debe ser un diccionario")
+    if transp is not None and type(transp) not in (
+        TablaTransposicion,
+        TablaCompartida,
+    ):
+        raise ValueError("transp debe ser una TablaTransposicion o TablaCompartida")
+    if transp is not None and busqueda is not None:
+        raise ValueError("transp y busqueda no se pueden usar juntos")
     if type(traza) is not list:
         raise ValueError("traza debe ser una lista")
+    if busqueda is None:
+        busqueda = Busqueda(transp=transp)
+    busqueda.pvs = pvs
+    busqueda.evalua_lote = evalua_lote
+
+    return _negamax(
+        juego,
+        _estado_de_trabajo(juego, estado),
+        jugador,
+        alpha,
+        beta,
+        ordena,
+        d,
+        evalua,
+        busqueda,
+        traza[:],
+        0,
+    )
+
+
+def _estado_de_trabajo(juego, estado):
+    """
+    El estado sobre el que busca el negamax: una copia mutable si el juego
+    implementa `hace_jugada` (y entonces cada nodo hace y deshace sus
+    jugadas sobre ella), o el mismo estado si no
+
+    """
+    return juego.estado_mutable(estado) if juego.hace_y_deshace else estado
+
 
-    hash_estado = estado.tobytes()
+def _negamax(
+    juego, estado, jugador, alpha, beta, ordena, d, evalua, busqueda, traza, nivel
+):
+    """
+    El negamax recursivo, sin validar los parámetros
 
+    """
+    busqueda.nodos += 1
+    if busqueda.limite is not None and busqueda.nodos >= busqueda.siguiente_revision:
+        busqueda.siguiente_revision = busqueda.nodos + INTERVALO_RELOJ
+        if time() > busqueda.limite:
+            raise TiempoAgotado()
+    estadisticas = busqueda.estadisticas
     if juego.terminal(estado):
+        if estadisticas is not None:
+            estadisticas.terminales += 1
         return [], jugador * juego.ganancia(estado)
     if d == 0:
+        busqueda.evaluaciones += 1
         return [], jugador * evalua(estado)
-    if d is not None and hash_estado in transp and transp[hash_estado][1] >= d:
-        return [], transp[hash_estado][0]
 
+    profundidad = PROFUNDIDAD_TOTAL if d is None else d
+    if busqueda.simetrias:
+        clave, simetria = juego.clave_canonica(estado)
+    else:
+        clave, simetria = juego.clave(estado), 0
+    clave ^= TURNO if jugador == -1 else 0
+    transp = busqueda.transp
+    jugada_tt = None
+    entrada = transp.entrada(clave)
+    if estadisticas is not None:
+        estadisticas.sondeos_tt += 1
+        estadisticas.aciertos_tt += entrada is not None
+    if entrada is not None:
+        valor, profundidad_tt, tipo, jugada_tt = entrada
+        if simetria and jugada_tt is not None:
+            jugada_tt = juego.jugada_original(jugada_tt, simetria)
+        if profundidad_tt >= profundidad:
+            if tipo == INFERIOR:
+                alpha = max(alpha, valor)
+            elif tipo == SUPERIOR:
+                beta = min(beta, valor)
+            if tipo == EXACTO or alpha >= beta:
+                busqueda.cortes_tt += 1
+                return ([] if jugada_tt is None else [jugada_tt]), valor
+
+    alpha_original = alpha
     v = -1e10
+    jugadas = _ordena_jugadas(
+        juego, estado, jugador, ordena, busqueda, traza, nivel, jugada_tt
+    )
+    d_hijo = d if d is None else d - 1
+    if d_hijo == 0 and busqueda.evalua_lote is not None:
+        v, mejor = _evalua_frontera(juego, estado, jugador, jugadas, busqueda)
+        mejores = []
+        if v >= beta:
+            busqueda.registra_corte(mejor, jugador, nivel, d)
+            if estadisticas is not None:
+                estadisticas.registra_corte(jugadas.index(mejor))
+    else:
+        mutable = juego.hace_y_deshace
+        for k, a in enumerate(jugadas):
+            if mutable:
+                registro = juego.hace_jugada(estado, a, jugador)
+                hijo = estado
+            else:
+                hijo = juego.transicion(estado, a, jugador)
+            if busqueda.pvs and k > 0 and alpha > -1e10:
+                # Ventana nula: solo se averigua si la jugada supera a alpha.
+                # Sin cota (alpha infinito) no hay nada que averiguar.
+                traza_actual, v2 = _negamax(
+                    juego,
+                    hijo,
+                    -jugador,
+                    -alpha - juego.ventana_nula,
+                    -alpha,
+                    ordena,
+                    d_hijo,
+                    evalua,
+                    busqueda,
+                    traza,
+                    nivel + 1,
+                )
+                v2 = -v2
+                buscar = alpha < v2 < beta
+            else:
+                buscar = True
+            if buscar:
+                traza_actual, v2 = _negamax(
+                    juego,
+                    hijo,
+                    -jugador,
+                    -beta,
+                    -alpha,
+                    ordena,
+                    d_hijo,
+                    evalua,
+                    busqueda,
+                    traza,
+                    nivel + 1,
+                )
+                v2 = -v2
+            if mutable:
+                juego.deshace_jugada(estado, registro)
+            if v2 > v:
+                v = v2
+                mejor = a
+                mejores = traza_actual[:]
+            if v >= beta:
+                busqueda.registra_corte(a, jugador, nivel, d)
+                if estadisticas is not None:
+                    estadisticas.registra_corte(k)
+                break
+            if v > alpha:
+                alpha = v
+    if v <= alpha_original:
+        tipo = SUPERIOR
+    elif v >= beta:
+        tipo = INFERIOR
+    else:
+        tipo = EXACTO
+    jugada_tt = juego.transforma_jugada(mejor, simetria) if simetria else mejor
+    reemplazo = transp.guarda(clave, v, profundidad, tipo, jugada_tt)
+    if estadisticas is not None:
+        estadisticas.guardados_tt += 1
+        estadisticas.reemplazos_tt += reemplazo
+    return [mejor] + mejores, v
+
+
+def _evalua_frontera(juego, estado, jugador, jugadas, busqueda):
+    """
+    Valor de un nodo a profundidad 1: genera a todos los hijos y evalúa
+    los que no son terminales con una sola llamada a `evalua_lote`. No hay
+    cortes entre hermanos, pero se evita una llamada a evalua por hoja.
+
+    Regresa
+    -------
+    tuple: (valor, mejor jugada). Si varias empatan, la primera en el
+        orden de jugadas.
+
+    """
+    hijos = [juego.transicion(estado, a, jugador) for a in jugadas]
+    busqueda.nodos += len(hijos)
+    valores = [None] * len(hijos)
+    pendientes = []
+    for k, hijo in enumerate(hijos):
+        if juego.terminal(hijo):
+            if busqueda.estadisticas is not None:
+                busqueda.estadisticas.terminales += 1
+            valores[k] = jugador * juego.ganancia(hijo)
+        else:
+            pendientes.append(k)
+    if pendientes:
+        busqueda.evaluaciones += len(pendientes)
+        evaluaciones = busqueda.evalua_lote([hijos[k] for k in pendientes])
+        for k, valor in zip(pendientes, evaluaciones.tolist()):
+            valores[k] = jugador * valor
+    mejor = max(range(len(jugadas)), key=lambda k: (valores[k], -k))
+    return valores[mejor], jugadas[mejor]
+
+
+def _ordena_jugadas(juego, estado, jugador, ordena, busqueda, traza, nivel, jugada_tt):
+    """
+    Jugadas legales en el orden en que se van a buscar: la de la tabla de
+    transposición, la de la variante principal (que se consume de traza)
+    y el resto según `Busqueda.ordena`
+
+    """
     jugadas = list(juego.jugadas_legales(estado, jugador))
     if ordena is not None:
         jugadas = ordena(jugadas, jugador)
     else:
-        shuffle(jugadas)
+        busqueda.azar.shuffle(jugadas)
+    jugadas = busqueda.ordena(jugadas, jugador, nivel)
     if traza:
         a_pref = traza.pop(0)
         if a_pref in jugadas:
             jugadas = [a_pref] + [a for a in jugadas if a != a_pref]
-    for a in jugadas:
-        traza_actual, v2 = negamax(
+    if jugada_tt is not None and jugada_tt in jugadas:
+        jugadas = [jugada_tt] + [a for a in jugadas if a != jugada_tt]
+    return jugadas
+
+
+# Cota alpha de la raíz compartida por los procesos de una alberca. Cada
+# proceso trabajador la recibe al crearse.
+_ALPHA_RAIZ = None
+
+# Albercas de procesos ya creadas, por número de procesos
+_ALBERCAS = {}
+
+# Contexto de búsqueda de un proceso trabajador y (dueño, edad) de la
+# búsqueda para la que se usó por última vez (ver `_busqueda_trabajador`)
+_BUSQUEDA = None
+_TURNO = None
+
+
+def _inicia_trabajador(alpha_raiz):
+    global _ALPHA_RAIZ, _BUSQUEDA, _TURNO
+    _ALPHA_RAIZ = alpha_raiz
+    _BUSQUEDA = _TURNO = None
+
+
+def _busqueda_trabajador(dueno, edad, mb, simetrias):
+    """
+    El contexto de búsqueda del proceso trabajador, que se conserva entre
+    las jugadas de la raíz, las iteraciones y los turnos de un mismo
+    contexto dueño (el `Busqueda.ident` del proceso principal)
+
+    Se crea la primera vez y de nuevo si cambia el dueño, la memoria o el
+    uso de simetrías (las claves serían otras). Cuando cambia la edad de
+    la tabla del dueño (otra posición), se envejece con `nueva_busqueda`.
+
+    """
+    global _BUSQUEDA, _TURNO
+    if (
+        _BUSQUEDA is None
+        or _TURNO[0] != dueno
+        or _BUSQUEDA.mb != mb
+        or _BUSQUEDA.simetrias != simetrias
+    ):
+        _BUSQUEDA = Busqueda(mb=mb, simetrias=simetrias)
+    elif _TURNO[1] != edad:
+        _BUSQUEDA.nueva_busqueda()
+    _TURNO = dueno, edad
+    return _BUSQUEDA
+
+
+def _alberca(procesos):
+    """
+    Devuelve (alberca, alpha compartida) con `procesos` procesos. Las
+    albercas se crean una vez y se reutilizan entre búsquedas.
+
+    """
+    if procesos not in _ALBERCAS:
+        alpha_raiz = multiprocessing.Value("d", -1e10)
+        alberca = ProcessPoolExecutor(
+            procesos, initializer=_inicia_trabajador, initargs=(alpha_raiz,)
+        )
+        _ALBERCAS[procesos] = alberca, alpha_raiz
+    return _ALBERCAS[procesos]
+
+
+def _busca_jugada_raiz(
+    juego,
+    estado,
+    jugador,
+    a,
+    ordena,
+    d,
+    evalua,
+    beta,
+    traza,
+    pvs,
+    evalua_lote,
+    simetrias,
+    estadisticas,
+    semilla,
+    limite,
+    dueno,
+    edad,
+    mb,
+):
+    """
+    Busca, en un proceso trabajador, el valor de la jugada a de la raíz.
+
+    La búsqueda usa como alpha la mejor cota de la raíz encontrada hasta
+    ese momento por cualquier proceso (menos la `ventana_nula` del juego,
+    para que las jugadas que empatan con la mejor tengan valor exacto) y
+    al terminar la actualiza.
+
+    Cada trabajador conserva su propio contexto (`_busqueda_trabajador`),
+    con su tabla de transposición de `mb` megabytes, sus asesinas y su
+    historia, así que reutiliza lo que encontró en las jugadas,
+    iteraciones y turnos anteriores del mismo dueño. Las tablas no se
+    comparten entre trabajadores. El orden aleatorio se reinicia con la
+    semilla de la jugada.
+
+    Regresa
+    -------
+    tuple: (traza, valor, exacto, nodos, evaluaciones, cortes_tt,
+        estadisticas), donde exacto es False si el valor es solo una cota
+        superior y estadisticas es None si no se pidieron. None si se
+        agotó el tiempo.
+
+    """
+    alpha = _ALPHA_RAIZ.value
+    if alpha > -1e10:
+        alpha -= juego.ventana_nula
+    busqueda = _busqueda_trabajador(dueno, edad, mb, simetrias)
+    busqueda.azar = random.Random(semilla)
+    busqueda.pvs, busqueda.evalua_lote, busqueda.limite = pvs, evalua_lote, limite
+    busqueda.reinicia_contadores()
+    busqueda.estadisticas = Estadisticas() if estadisticas else None
+    try:
+        traza, v = _negamax(
             juego,
-            juego.transicion(estado, a, jugador),
+            _estado_de_trabajo(juego, juego.transicion(estado, a, jugador)),
             -jugador,
             -beta,
             -alpha,
             ordena,
             d if d is None else d - 1,
             evalua,
-            transp,
+            busqueda,
             traza,
+            1,
         )
-        v2 = -v2
-        if v2 > v:
-            v = v2
-            mejor = a
-            mejores = traza_actual[:]
-        if v >= beta:
+    except TiempoAgotado:
+        return None
+    v = -v
+    with _ALPHA_RAIZ.get_lock():
+        if v > _ALPHA_RAIZ.value:
+            _ALPHA_RAIZ.value = v
+    return (
+        [a] + traza,
+        v,
+        v > alpha,
+        busqueda.nodos,
+        busqueda.evaluaciones,
+        busqueda.cortes_tt,
+        busqueda.estadisticas,
+    )
+
+
+def _negamax_paralelo(
+    juego, estado, jugador, alpha, beta, ordena, d, evalua, busqueda, traza, procesos
+):
+    """
+    El negamax en la raíz con las jugadas repartidas entre `procesos`
+    procesos.
+
+    Primero se busca la jugada que se espera mejor (el hermano mayor) y,
+    ya con su valor como alpha, las demás en paralelo. Entre las jugadas
+    con valor exacto se elige la de mayor valor y, si empatan, la primera
+    en el orden de búsqueda, así que el resultado no depende de qué
+    proceso termina primero. Como cada trabajador reutiliza su tabla de
+    transposición (ver `_busca_jugada_raiz`), lo que ya tenía guardado
+    puede cambiar un poco los valores, como pasa con la tabla en la
+    búsqueda en un solo proceso.
+
+    El juego, el estado, ordena y evalua se envían a otros procesos, así
+    que deben poder serializarse con pickle (ordena y evalua deben ser
+    funciones de módulo, no lambdas).
+
+    Regresa
+    -------
+    tuple: (lista mejores jugadas, valor)
+
+    """
+    jugadas = _ordena_jugadas(juego, estado, jugador, ordena, busqueda, traza, 0, None)
+    alberca, alpha_raiz = _alberca(procesos)
+    alpha_raiz.value = alpha
+
+    def envia(k, a):
+        return alberca.submit(
+            _busca_jugada_raiz,
+            juego,
+            estado,
+            jugador,
+            a,
+            ordena,
+            d,
+            evalua,
+            beta,
+            traza if k == 0 else [],
+            busqueda.pvs,
+            busqueda.evalua_lote,
+            busqueda.simetrias,
+            busqueda.estadisticas is not None,
+            k,
+            busqueda.limite,
+            busqueda.ident,
+            busqueda.transp.edad,
+            busqueda.mb,
+        )
+
+    resultados = [envia(0, jugadas[0]).result()]
+    futuros = [envia(k, a) for k, a in enumerate(jugadas[1:], 1)]
+    resultados += [futuro.result() for futuro in futuros]
+    if None in resultados:
+        raise TiempoAgotado()
+    for _, _, _, nodos, evaluaciones, cortes_tt, estadisticas in resultados:
+        busqueda.nodos += nodos
+        busqueda.evaluaciones += evaluaciones
+        busqueda.cortes_tt += cortes_tt
+        if estadisticas is not None:
+            busqueda.estadisticas.suma(estadisticas)
+    exactos = [r for r in resultados if r[2]] or resultados
+    mejor = max(range(len(exactos)), key=lambda k: (exactos[k][1], -k))
+    return exactos[mejor][0], exactos[mejor][1]
+
+
+def _trabajador_smp(
+    juego,
+    estado,
+    jugador,
+    ordena,
+    d,
+    evalua,
+    transp,
+    k,
+    limite,
+    pvs,
+    evalua_lote,
+    simetrias,
+    cola,
+):
+    """
+    Profundización iterativa de un proceso de Lazy SMP. Manda a la cola
+    (k, profundidad, traza, valor, nodos, segundos) al completar cada
+    profundidad y None al terminar.
+
+    Los procesos se diferencian en la semilla de su orden aleatorio y en
+    la profundidad inicial (los impares empiezan en 2), de modo que no
+    recorren el árbol en el mismo orden y se aprovechan de lo que los
+    demás ya guardaron en la tabla.
+
+    """
+    t0 = time()
+    busqueda = Busqueda(transp=transp, semilla=k, simetrias=simetrias)
+    busqueda.pvs, busqueda.evalua_lote, busqueda.limite = pvs, evalua_lote, limite
+    profundidad = 1 + k % 2
+    estado = _estado_de_trabajo(juego, estado)
+    while d is None or profundidad <= d:
+        busqueda.reinicia_contadores()
+        try:
+            traza, valor = _negamax(
+                juego,
+                estado,
+                jugador,
+                -1e10,
+                1e10,
+                ordena,
+                profundidad,
+                evalua,
+                busqueda,
+                busqueda.traza[:],
+                0,
+            )
+        except TiempoAgotado:
             break
-        if v > alpha:
-            alpha = v
-    transp[hash_estado] = (v, d)
-    return [mejor] + mejores, v
+        busqueda.traza = traza
+        cola.put((k, profundidad, traza, valor, busqueda.nodos, time() - t0))
+        if busqueda.evaluaciones == 0 and busqueda.cortes_tt == 0:
+            break
+        profundidad += 1
+    cola.put(None)
 
 
-def jugador_negamax(juego, estado, jugador, ordena=None, d=None, evalua=None):
+def _minimax_smp(juego, estado, jugador, ordena, d, evalua, busqueda, workers):
     """
-    Funcion burrito para el negamax
+    Lazy SMP: `workers` procesos hacen la misma profundización iterativa
+    sobre el estado compartiendo una TablaCompartida, hasta el límite de
+    tiempo de busqueda o hasta la profundidad d. Se queda con el resultado
+    de la mayor profundidad completada por cualquiera de ellos.
+
+    En `busqueda.tiempos` deja, para cada profundidad, los segundos que
+    tardó en completarse por primera vez. Al llegar al límite no espera a
+    que los procesos noten el tiempo agotado: recoge lo que ya esté en la
+    cola y termina a los que sigan vivos. La tabla no usa candados, así
+    que terminarlos a mitad de una escritura no la deja bloqueada.
 
     """
-    traza, _ = negamax(
-        juego=juego,
-        estado=estado,
-        jugador=jugador,
-        alpha=-1e10,
-        beta=1e10,
-        ordena=ordena,
-        d=d,
-        evalua=evalua,
-        transp={},
-        traza=[],
-    )
-    return traza[0]
+    if type(busqueda.transp) is not TablaCompartida:
+        busqueda.transp = TablaCompartida(juego, busqueda.mb)
+    cola = multiprocessing.Queue()
+    procesos = [
+        multiprocessing.Process(
+            target=_trabajador_smp,
+            args=(
+                juego,
+                estado,
+                jugador,
+                ordena,
+                d,
+                evalua,
+                busqueda.transp,
+                k,
+                busqueda.limite,
+                busqueda.pvs,
+                busqueda.evalua_lote,
+                busqueda.simetrias,
+                cola,
+            ),
+            daemon=True,
+        )
+        for k in range(workers)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    busqueda.tiempos = {}
+    terminados = 0
+    while terminados < workers:
+        try:
+            restante = busqueda.limite - time()
+            if restante > 0:
+                mensaje = cola.get(timeout=restante)
+            else:
+                mensaje = cola.get_nowait()
+        except queue.Empty:
+            break
+        if mensaje is None:
+            terminados += 1
+            continue
+        _, profundidad, traza, valor, nodos, segundos = mensaje
+        busqueda.nodos += nodos
+        if profundidad not in busqueda.tiempos:
+            busqueda.tiempos[profundidad] = segundos
+            if busqueda.estadisticas is not None:
+                busqueda.estadisticas.iteraciones.append(
+                    Iteracion(
+                        profundidad, nodos, 0, segundos, nodos ** (1 / profundidad)
+                    )
+                )
+        if profundidad > busqueda.profundidad:
+            busqueda.traza, busqueda.profundidad = traza, profundidad
+            busqueda.valor = valor
+    for proceso in procesos:
+        if proceso.is_alive():
+            proceso.terminate()
+    for proceso in procesos:
+        proceso.join()
 
 
-def minimax_iterativo(
+def jugador_negamax(
     juego,
     estado,
     jugador,
-    tiempo=10,
     ordena=None,
     d=None,
     evalua=None,
+    busqueda=None,
+    pvs=False,
+    procesos=None,
+    evalua_lote=None,
+    estadisticas=False,
+    libro=None,
 ):
     """
-    Devuelve la mejor jugada para el jugador en el estado
-    acotando a un periodo de tiempo
+    Funcion burrito para el negamax
+
+    Si se da `busqueda` (Busqueda), se usa su tabla de transposición, que
+    se conserva para el siguiente turno. Con pvs=True se busca con PVS
+    (ver `negamax`).
+
+    Con procesos=n las jugadas de la raíz se reparten entre n procesos
+    (ver `_negamax_paralelo`). Con evalua_lote se evalúan las hojas por
+    lotes (ver `negamax`).
+
+    Con estadisticas=True regresa (jugada, Estadisticas).
+
+    Si se da `libro` (aperturas.Libro) y la posición está en él, se
+    regresa una de sus jugadas sin buscar (ver `minimax_iterativo`).
 
     """
-    t0 = time()
-    d, traza = 2, []
-    while time() - t0 < tiempo / 2:
-        traza, v = negamax(
+    if busqueda is None:
+        busqueda = Busqueda()
+    busqueda.nueva_busqueda()
+    busqueda.reinicia_contadores()
+    if libro is not None:
+        a = _jugada_libro(juego, estado, jugador, libro, busqueda)
+        if a is not None:
+            return (a, Estadisticas()) if estadisticas else a
+    busqueda.estadisticas = Estadisticas() if estadisticas else None
+    inicio = time()
+    if procesos is not None:
+        if d is not None and evalua is None:
+            raise ValueError("Se necesita evalua si d no es None")
+        busqueda.pvs, busqueda.evalua_lote = pvs, evalua_lote
+        traza, valor = _negamax_paralelo(
+            juego,
+            estado,
+            jugador,
+            -1e10,
+            1e10,
+            ordena,
+            d,
+            evalua,
+            busqueda,
+            [],
+            procesos,
+        )
+    else:
+        traza, valor = negamax(
             juego=juego,
             estado=estado,
             jugador=jugador,
@@ -151,8 +1014,212 @@ def minimax_iterativo(
             ordena=ordena,
             d=d,
             evalua=evalua,
-            transp={},
-            traza=traza,
+            traza=[],
+            busqueda=busqueda,
+            pvs=pvs,
+            evalua_lote=evalua_lote,
         )
-        d += 1
-    return traza[0]
+    busqueda.traza, busqueda.profundidad, busqueda.valor = traza, d, valor
+    if not estadisticas:
+        return traza[0]
+    return traza[0], _termina_estadisticas(busqueda, d, inicio)
+
+
+def _jugada_libro(juego, estado, jugador, libro, busqueda):
+    """
+    Una jugada del libro para el estado, elegida con el generador
+    aleatorio de la búsqueda, o None si el estado no está en el libro. Si
+    la hay, queda como traza de la búsqueda, con profundidad 0 y sin
+    valor.
+
+    """
+    a = libro.jugada(juego, estado, jugador, busqueda.azar)
+    if a is not None:
+        busqueda.traza, busqueda.profundidad, busqueda.valor = [a], 0, None
+    return a
+
+
+def _termina_estadisticas(busqueda, d, inicio):
+    """
+    Cierra las estadísticas de una búsqueda a profundidad d que empezó en
+    `inicio` y las quita del contexto
+
+    """
+    estadisticas, busqueda.estadisticas = busqueda.estadisticas, None
+    estadisticas.acumula(busqueda)
+    estadisticas.iteraciones.append(_iteracion(busqueda, d, inicio))
+    return estadisticas
+
+
+def _iteracion(busqueda, d, inicio):
+    """
+    La Iteracion de la búsqueda a profundidad d que empezó en `inicio`.
+    El factor de ramificación efectivo es b tal que b ** d es el número de
+    nodos visitados (0 si d es None).
+
+    """
+    return Iteracion(
+        d,
+        busqueda.nodos,
+        busqueda.evaluaciones,
+        time() - inicio,
+        busqueda.nodos ** (1 / d) if d else 0.0,
+    )
+
+
+def minimax_iterativo(
+    juego,
+    estado,
+    jugador,
+    tiempo=10,
+    ordena=None,
+    d=None,
+    evalua=None,
+    busqueda=None,
+    pvs=False,
+    aspiracion=None,
+    procesos=None,
+    workers=None,
+    evalua_lote=None,
+    estadisticas=False,
+    libro=None,
+):
+    """
+    Devuelve la mejor jugada para el jugador en el estado
+    acotando a un periodo de tiempo
+
+    Profundiza de uno en uno. Antes de empezar una iteración estima lo que
+    va a tardar con el factor de ramificación efectivo de la última (b tal
+    que b ** d es el número de nodos visitados a profundidad d) y no la
+    empieza si no va a terminar a tiempo. El tiempo es además un límite
+    duro: si una iteración no termina, el negamax se aborta y se regresa
+    la mejor jugada de la última profundidad completa.
+
+    La tabla de transposición se comparte entre las iteraciones; si se da
+    `busqueda` (Busqueda), también se conserva para el siguiente turno.
+
+    Si se da `libro` (aperturas.Libro) y la posición está en él, se
+    regresa una de sus jugadas, elegida al azar según sus pesos con el
+    generador de `busqueda`, sin buscar; las estadísticas quedan vacías.
+
+    Si no hay profundidad máxima, antes de buscar se le pide al juego que
+    resuelva la posición con `resuelve_final`, con FRACCION_FINAL del
+    tiempo. Si lo logra, se regresa esa jugada, `busqueda.profundidad`
+    queda en PROFUNDIDAD_TOTAL, `busqueda.valor` es el valor exacto en la
+    escala de `ganancia` y las estadísticas no tienen iteraciones.
+
+    Parametros
+    ----------
+    tiempo (float): Segundos para decidir la jugada
+    d (int): Profundidad máxima. Si None, no hay máxima
+    pvs (bool): Si True, cada iteración busca con PVS (ver `negamax`)
+    aspiracion (float): Si no es None, cada iteración empieza con la
+        ventana (v - aspiracion, v + aspiracion) alrededor del valor v de
+        la iteración anterior. Si el valor cae fuera, se vuelve a buscar
+        abriendo la ventana de ese lado.
+    procesos (int): Si no es None, en cada iteración las jugadas de la
+        raíz se reparten entre ese número de procesos (ver
+        `_negamax_paralelo`)
+    workers (int): Si no es None, se busca con Lazy SMP con ese número de
+        procesos y una tabla de transposición compartida (ver
+        `_minimax_smp`). Excluye a procesos y aspiracion.
+    evalua_lote: Evaluación por lotes de las hojas (ver `negamax`)
+    estadisticas (bool): Si True, regresa (jugada, Estadisticas), con
+        una `Iteracion` por profundidad completada
+
+    """
+    t0 = time()
+    if evalua is None:
+        raise ValueError("Se necesita evalua")
+    if busqueda is None:
+        busqueda = Busqueda()
+    busqueda.nueva_busqueda()
+    if libro is not None:
+        a = _jugada_libro(juego, estado, jugador, libro, busqueda)
+        if a is not None:
+            return (a, Estadisticas()) if estadisticas else a
+    busqueda.pvs, busqueda.evalua_lote = pvs, evalua_lote
+    busqueda.limite = t0 + tiempo * (1 - MARGEN_TIEMPO)
+    busqueda.estadisticas = Estadisticas() if estadisticas else None
+    profundidad, valor = 1, None
+    final = None
+    if d is None:
+        final = juego.resuelve_final(estado, jugador, t0 + tiempo * FRACCION_FINAL)
+    if final is not None:
+        busqueda.traza, busqueda.profundidad = [final[0]], PROFUNDIDAD_TOTAL
+        busqueda.valor = final[1]
+    elif workers is not None:
+        busqueda.reinicia_contadores()
+        _minimax_smp(juego, estado, jugador, ordena, d, evalua, busqueda, workers)
+    trabajo = _estado_de_trabajo(juego, estado)
+    while final is None and workers is None and (d is None or profundidad <= d):
+        inicio = time()
+        busqueda.reinicia_contadores()
+        alpha, beta = -1e10, 1e10
+        if aspiracion is not None and valor is not None:
+            alpha, beta = valor - aspiracion, valor + aspiracion
+        try:
+            while True:
+                if procesos is None:
+                    traza, valor = _negamax(
+                        juego,
+                        trabajo,
+                        jugador,
+                        alpha,
+                        beta,
+                        ordena,
+                        profundidad,
+                        evalua,
+                        busqueda,
+                        busqueda.traza[:],
+                        0,
+                    )
+                else:
+                    traza, valor = _negamax_paralelo(
+                        juego,
+                        trabajo,
+                        jugador,
+                        alpha,
+                        beta,
+                        ordena,
+                        profundidad,
+                        evalua,
+                        busqueda,
+                        busqueda.traza[:],
+                        procesos,
+                    )
+                if valor <= alpha and alpha > -1e10:
+                    alpha = -1e10
+                elif valor >= beta and beta < 1e10:
+                    beta = 1e10
+                else:
+                    break
+        except TiempoAgotado:
+            if estadisticas:
+                busqueda.estadisticas.acumula(busqueda)
+            break
+        busqueda.traza, busqueda.profundidad = traza, profundidad
+        busqueda.valor = valor
+        iteracion = _iteracion(busqueda, profundidad, inicio)
+        if estadisticas:
+            busqueda.estadisticas.acumula(busqueda)
+            busqueda.estadisticas.iteraciones.append(iteracion)
+        if busqueda.evaluaciones == 0 and busqueda.cortes_tt == 0:
+            # Todas las ramas llegaron a estados terminales
+            break
+        ahora = time()
+        if ahora + iteracion.segundos * iteracion.ramificacion > busqueda.limite:
+            break
+        profundidad += 1
+    busqueda.limite = None
+    if busqueda.traza:
+        jugada = busqueda.traza[0]
+    else:
+        jugadas = list(juego.jugadas_legales(estado, jugador))
+        jugada = ordena(jugadas, jugador)[0] if ordena is not None else jugadas[0]
+    if not estadisticas:
+        return jugada
+    if workers is not None:
+        busqueda.estadisticas.acumula(busqueda)
+    estadisticas, busqueda.estadisticas = busqueda.estadisticas, None
+    return jugada, estadisticas
@@ -10,12 +10,30 @@ Espacio vacio = 0
 Jugador 1 = negro
 Jugador 2 = blanco
 
+Si el jugador en turno no puede poner ficha, su única jugada es PASA, que
+deja el tablero igual. El juego termina cuando ninguno de los dos puede
+jugar (lo que incluye el tablero lleno y el tablero con fichas de un solo
+color).
+
 """
 
+from functools import lru_cache
+
 import numpy as np
 from juegos_simplificado import ModeloJuegoZT2, juega_dos_jugadores
 from enum import IntEnum, Enum
-from minimax import minimax_iterativo, jugador_negamax
+from minimax import Busqueda, minimax_iterativo, jugador_negamax
+from transposicion import SimetriasCasillas, ZobristCasillas, permutaciones_diedrales
+
+ZOBRIST = ZobristCasillas(64, semilla="othello")
+SIMETRIAS = SimetriasCasillas(ZOBRIST, permutaciones_diedrales(8))
+
+# Jugada del jugador que no tiene dónde poner ficha
+PASA = (-1, -1)
+
+# Con estas casillas vacías o menos, `resuelve_final` busca hasta el final
+# (ver los tiempos medidos en `othello_final`)
+VACIAS_FINAL = 12
 
 
 class Ficha(IntEnum):
@@ -36,6 +54,10 @@ class Direccion(Enum):
 
 
 class Othello(ModeloJuegoZT2):
+    hace_y_deshace = True
+    pase = PASA
+    vacias_final = VACIAS_FINAL
+
     def inicializa(self):
         s0: np.ndarray = np.zeros((8, 8), dtype=np.int8)
         s0[3][4] = Ficha.NEGRA
@@ -45,49 +67,29 @@ class Othello(ModeloJuegoZT2):
         return (s0, 1)
 
     def jugadas_legales(self, s: np.ndarray, j):
-        fichas_oponentes = buscar_fichas(s, j * -1)
-        posibles_jugadas_legales = set()
-        jugadas_legales = []
-        for ficha in fichas_oponentes:
-            posibles_jugadas = buscar_fichas_vecinas(s, ficha, Ficha.VACIA)
-            for posible_jugada in posibles_jugadas:
-                posibles_jugadas_legales.add(posible_jugada)
-        for p in posibles_jugadas_legales:
-            if es_legal(s, j, p):
-                jugadas_legales.append(p)
-        return jugadas_legales
+        tablero = s.tobytes()
+        jugadas = jugadas_en_cache(tablero, int(j))
+        if jugadas:
+            return list(jugadas)
+        return [PASA] if jugadas_en_cache(tablero, -int(j)) else []
 
     def transicion(self, s, a, j):
-        nuevo_estado = s.copy()
-        direcciones = [
-            calcular_direccion(a, v) for v in buscar_fichas_vecinas(s, a, j * -1)
-        ]
-        for d in direcciones:
-            ficha_propia = buscar_ficha_en_dir(s, a, d, j)
-            if ficha_propia is not None:
-                voltear_fichas_en_rango(nuevo_estado, a, ficha_propia, d)
-        if nuevo_estado[a[0]][a[1]] == Ficha.VACIA:
-            nuevo_estado[a[0]][a[1]] = j
-        return nuevo_estado
+        if a == PASA:
+            return s
+        return voltea_fichas(s, a, j)
 
     """
-    Checa si hay casillas vacias, si hay una casilla vacia
-    el juego no ha acabado.
+    El juego termina cuando ninguno de los dos jugadores puede poner
+    ficha. Las jugadas de cada jugador se toman de `jugadas_en_cache`, así
+    que `jugadas_legales` del mismo tablero ya no las vuelve a calcular.
     """
 
     def terminal(self, s):
-        iter = s.flat
-        hay_casillas_vacias = False
-        hay_fichas_blancas = False
-        hay_fichas_negras = False
-        for x in iter:
-            if x == Ficha.VACIA:
-                hay_casillas_vacias = True
-            elif x == Ficha.BLANCA:
-                hay_fichas_blancas = True
-            else:
-                hay_fichas_negras = True
-        return not (hay_fichas_blancas and hay_fichas_negras and hay_casillas_vacias)
+        tablero = s.tobytes()
+        return not (
+            jugadas_en_cache(tablero, Ficha.NEGRA.value)
+            or jugadas_en_cache(tablero, Ficha.BLANCA.value)
+        )
 
     def ganancia(self, s):
         iter = s.flat
@@ -105,6 +107,165 @@ class Othello(ModeloJuegoZT2):
         else:
             return Ficha.VACIA.value
 
+    def clave(self, s):
+        return ZOBRIST.clave_arreglo(s)
+
+    def resuelve_final(self, s, j, limite=None):
+        if np.count_nonzero(s == Ficha.VACIA) > self.vacias_final:
+            return None
+        from othello_bitboard import de_arreglo
+        from othello_final import jugada_final
+
+        b = de_arreglo(s)
+        return jugada_final(b.negras, b.blancas, j, limite)
+
+    def codifica_jugada(self, a):
+        return 64 if a == PASA else 8 * a[0] + a[1]
+
+    def decodifica_jugada(self, n):
+        return PASA if n == 64 else divmod(n, 8)
+
+    def clave_canonica(self, s):
+        return SIMETRIAS.clave_arreglo(s)
+
+    def transforma_jugada(self, a, simetria):
+        if a == PASA:
+            return a
+        return divmod(SIMETRIAS.transforma(8 * a[0] + a[1], simetria), 8)
+
+    def jugada_original(self, a, simetria):
+        if a == PASA:
+            return a
+        return divmod(SIMETRIAS.original(8 * a[0] + a[1], simetria), 8)
+
+    def estado_mutable(self, s):
+        return np.array(s)
+
+    def hace_jugada(self, s, a, j):
+        if a == PASA:
+            return None
+        casilla = 8 * a[0] + a[1]
+        plano = s.reshape(64)
+        rayos = RAYOS_CERRADOS[casilla]
+        fichas = plano[rayos]
+        rivales = (fichas != -j).argmax(axis=1)
+        rivales[fichas[_PASOS, rivales] != j] = 0
+        volteadas = rayos[_PASOS < rivales[:, None]]
+        plano[volteadas] = j
+        plano[casilla] = j
+        return casilla, volteadas
+
+    def deshace_jugada(self, s, registro):
+        if registro is None:
+            return
+        casilla, volteadas = registro
+        plano = s.reshape(64)
+        plano[volteadas] *= -1
+        plano[casilla] = Ficha.VACIA
+
+
+class TableroContado(np.ndarray):
+    """
+    Tablero de Othello (el mismo arreglo de 8x8) que además lleva el
+    número de fichas negras y blancas
+
+    """
+
+    def __new__(cls, tablero, negras, blancas):
+        s = np.asarray(tablero).view(cls)
+        s.negras, s.blancas = negras, blancas
+        return s
+
+    def __array_finalize__(self, obj):
+        self.negras = getattr(obj, "negras", None)
+        self.blancas = getattr(obj, "blancas", None)
+
+    def __reduce__(self):
+        return (TableroContado, (np.asarray(self), self.negras, self.blancas))
+
+
+class OthelloIncremental(Othello):
+    """
+    Othello que actualiza la cuenta de fichas en cada jugada con el
+    número de fichas volteadas, así que `ganancia` y `evalua_incremental`
+    son O(1), y `terminal` solo busca jugadas cuando quedan fichas de los
+    dos colores y casillas vacías
+
+    No usa hace_jugada, que no actualiza la cuenta.
+
+    """
+
+    hace_y_deshace = False
+
+    def inicializa(self):
+        s, j = super().inicializa()
+        return (TableroContado(s, 2, 2), j)
+
+    def transicion(self, s, a, j):
+        if a == PASA:
+            return s
+        tablero, volteadas = _juega(s, a, j)
+        if j == Ficha.NEGRA:
+            negras, blancas = s.negras + volteadas + 1, s.blancas - volteadas
+        else:
+            negras, blancas = s.negras - volteadas, s.blancas + volteadas + 1
+        return TableroContado(tablero, negras, blancas)
+
+    def terminal(self, s):
+        if not (s.negras and s.blancas and s.negras + s.blancas < 64):
+            return True
+        return super().terminal(s)
+
+    def ganancia(self, s):
+        return (s.negras > s.blancas) - (s.negras < s.blancas)
+
+    def acumuladores(self, s):
+        return (s.negras, s.blancas)
+
+    def recalcula(self, s):
+        return (
+            int(np.count_nonzero(s == Ficha.NEGRA)),
+            int(np.count_nonzero(s == Ficha.BLANCA)),
+        )
+
+
+def jugadas_legales_por_casilla(s: np.ndarray, j):
+    """
+    Jugadas legales recorriendo el tablero casilla por casilla. Es la
+    implementación original, que se conserva como referencia para
+    `mascara_jugadas`.
+
+    """
+    fichas_oponentes = buscar_fichas(s, j * -1)
+    posibles_jugadas_legales = set()
+    jugadas_legales = []
+    for ficha in fichas_oponentes:
+        posibles_jugadas = buscar_fichas_vecinas(s, ficha, Ficha.VACIA)
+        for posible_jugada in posibles_jugadas:
+            posibles_jugadas_legales.add(posible_jugada)
+    for p in posibles_jugadas_legales:
+        if es_legal(s, j, p):
+            jugadas_legales.append(p)
+    return jugadas_legales
+
+
+def transicion_por_casilla(s, a, j):
+    """
+    Transición casilla por casilla, referencia para `voltea_fichas`
+
+    """
+    nuevo_estado = s.copy()
+    direcciones = [
+        calcular_direccion(a, v) for v in buscar_fichas_vecinas(s, a, j * -1)
+    ]
+    for d in direcciones:
+        ficha_propia = buscar_ficha_en_dir(s, a, d, j)
+        if ficha_propia is not None:
+            voltear_fichas_en_rango(nuevo_estado, a, ficha_propia, d)
+    if nuevo_estado[a[0]][a[1]] == Ficha.VACIA:
+        nuevo_estado[a[0]][a[1]] = j
+    return nuevo_estado
+
 
 def buscar_fichas(s, tipo_ficha: int):
     fichas = []
@@ -204,6 +365,91 @@ def esta_en_rango(ficha: tuple[int, int]) -> bool:
         return True
 
 
+def _calcula_rayos() -> np.ndarray:
+    """
+    Índices (sobre el tablero aplanado) de las casillas que se recorren
+    desde cada casilla en cada dirección: rayos[casilla, direccion, paso].
+    Al salir del tablero se usa el índice 64, que corresponde a una casilla
+    vacía que se agrega al final del tablero aplanado, de modo que todo
+    rayo termina en una casilla vacía.
+
+    """
+    rayos = np.full((64, 8, 8), 64)
+    for casilla in range(64):
+        for d, direccion in enumerate(Direccion):
+            i, j = divmod(casilla, 8)
+            for paso in range(8):
+                i, j = avanzar_direccion((i, j), direccion)
+                if not esta_en_rango((i, j)):
+                    break
+                rayos[casilla, d, paso] = 8 * i + j
+    return rayos
+
+
+def mascara_jugadas(s: np.ndarray, j: int) -> np.ndarray:
+    """
+    Devuelve un arreglo booleano con las 64 casillas (tablero aplanado)
+    donde puede jugar j. Se revisan a la vez los ocho rayos de todas las
+    casillas: una casilla vacía es jugada si en alguno de sus rayos hay
+    fichas rivales seguidas y después una ficha de j.
+
+    """
+    plano = np.append(s, np.int8(Ficha.VACIA))
+    fichas = plano[RAYOS]
+    # Fichas rivales seguidas al inicio de cada rayo
+    rivales = (fichas != -j).argmax(axis=2)
+    cierre = np.take_along_axis(fichas, rivales[..., None], axis=2)[..., 0] == j
+    return (plano[:64] == Ficha.VACIA) & ((rivales > 0) & cierre).any(axis=1)
+
+
+@lru_cache(maxsize=2**16)
+def jugadas_en_cache(tablero: bytes, j: int) -> tuple[tuple[int, int], ...]:
+    """
+    Jugadas de j (sin el pase) en el tablero dado por sus bytes. Se
+    guardan las últimas 2**16 consultas, porque en la búsqueda el mismo
+    tablero se consulta para `terminal` y para `jugadas_legales`, y de
+    nuevo en cada transposición.
+
+    """
+    s = np.frombuffer(tablero, dtype=np.int8)
+    return tuple(divmod(c, 8) for c in np.flatnonzero(mascara_jugadas(s, j)).tolist())
+
+
+def voltea_fichas(s: np.ndarray, a: tuple[int, int], j: int) -> np.ndarray:
+    """
+    Devuelve una copia de s en la que j juega en a, revisando los ocho
+    rayos de a a la vez
+
+    """
+    return _juega(s, a, j)[0]
+
+
+def _juega(s: np.ndarray, a: tuple[int, int], j: int) -> tuple[np.ndarray, int]:
+    """
+    voltea_fichas, que además regresa el número de fichas volteadas
+
+    """
+    casilla = 8 * a[0] + a[1]
+    plano = np.append(s, np.int8(Ficha.VACIA))
+    rayos = RAYOS[casilla]
+    fichas = plano[rayos]
+    rivales = (fichas != -j).argmax(axis=1)
+    rivales[fichas[_PASOS, rivales] != j] = 0
+    plano[rayos[_PASOS < rivales[:, None]]] = j
+    plano[casilla] = j
+    return plano[:64].reshape(8, 8), int(rivales.sum())
+
+
+RAYOS = _calcula_rayos()
+_PASOS = np.arange(8)
+
+# Los mismos rayos, pero al salir del tablero apuntan a la casilla de
+# origen, que está vacía mientras se calcula una jugada sobre ella. Así
+# `Othello.hace_jugada` trabaja sobre el propio tablero, sin agregarle la
+# casilla 64.
+RAYOS_CERRADOS = np.where(RAYOS == 64, np.arange(64)[:, None, None], RAYOS)
+
+
 def evalua(s: np.ndarray) -> float:
     fichas = s.flat
     sum_negras = 0
@@ -227,6 +473,36 @@ def evalua(s: np.ndarray) -> float:
         return (sum_negras - sum_blancas) / total_fichas
 
 
+def evalua_incremental(s: TableroContado) -> float:
+    """
+    La misma evaluación que `evalua` en O(1), para los estados de
+    OthelloIncremental
+
+    """
+    total_fichas = s.negras + s.blancas
+    if total_fichas == 64:
+        return (s.negras > s.blancas) - (s.negras < s.blancas)
+    return (s.negras - s.blancas) / total_fichas
+
+
+def evalua_lote(estados) -> np.ndarray:
+    """
+    La misma evaluación que `evalua` sobre N estados a la vez
+
+    estados: lista de N estados o arreglo de (N, 8, 8)
+    devuelve: arreglo con las N evaluaciones
+
+    """
+    planos = np.asarray(estados).reshape(-1, 64)
+    diferencia = planos.sum(axis=1, dtype=np.int64)
+    total_fichas = np.count_nonzero(planos, axis=1)
+    return np.where(
+        total_fichas == 64,
+        np.sign(diferencia),
+        diferencia / total_fichas,
+    )
+
+
 def cambiar_coordenadas(coord: tuple[int, int]) -> tuple[int, int]:
     x, y = coord
     nueva_x = 4 - x if x <= 3 else 3 - x
@@ -329,6 +605,9 @@ def jugador_manual_othello(
     print(f"Turno de jugador {Ficha(j).name}")
     jugadas = juego.jugadas_legales(s, j)
     # print("Jugadas legales: ", jugadas)
+    if jugadas == [PASA]:
+        print("No hay jugadas, pasa")
+        return PASA
     jugada = None
     while jugada not in jugadas:
         fila = int(input("Fila: "))
@@ -340,10 +619,16 @@ def jugador_manual_othello(
 def juega_dos_jugadores_especial(juego, jugador1, jugador2):
     s, j = juego.inicializa()
     while not juego.terminal(s):
-        a = jugador1(juego, s, j) if j == 1 else jugador2(juego, s, j)
+        if juego.jugadas_legales(s, j) == [PASA]:
+            a = PASA
+        else:
+            a = jugador1(juego, s, j) if j == 1 else jugador2(juego, s, j)
         s = juego.transicion(s, a, j)
         j = -j
         char_jugador = "X" if -j == 1 else "O"
+        if a == PASA:
+            print(f"Jugador {char_jugador} no tiene jugadas y pasa")
+            continue
         print(f"Jugador {char_jugador} hizo {a} y el tablero quedo asi:")
         pretty_print_othello(s)
     return juego.ganancia(s), s
@@ -370,8 +655,14 @@ if __name__ == "__main__":
             while type(d) is not int or d < 1:
                 d = int(input("Profundidad: "))
             jugs.append(
-                lambda juego, s, j: jugador_negamax(
-                    juego, s, j, ordena=ordena_jugadas, evalua=evalua, d=d
+                lambda juego, s, j, busqueda=Busqueda(): jugador_negamax(
+                    juego,
+                    s,
+                    j,
+                    ordena=ordena_jugadas,
+                    evalua=evalua,
+                    d=d,
+                    busqueda=busqueda,
                 )
             )
         else:
@@ -380,8 +671,14 @@ if __name__ == "__main__":
                 t = int(input("Tiempo: "))
             tn = int(t)
             jugs.append(
-                lambda juego, s, j: minimax_iterativo(
-                    juego, s, j, ordena=ordena_jugadas, evalua=evalua, tiempo=tn
+                lambda juego, s, j, busqueda=Busqueda(): minimax_iterativo(
+                    juego,
+                    s,
+                    j,
+                    ordena=ordena_jugadas,
+                    evalua=evalua,
+                    tiempo=tn,
+                    busqueda=busqueda,
                 )
             )
 
@@ -0,0 +1,384 @@
+"""
+Juego de Othello con tableros de bits
+
+El estado se representa con dos enteros de 64 bits, uno con las fichas
+negras y otro con las fichas blancas. La casilla (i, j) corresponde al
+bit 8 * i + j:
+
+ 0  1  2  3  4  5  6  7
+ 8  9 10 11 12 13 14 15
+...
+56 57 58 59 60 61 62 63
+
+El estado también lleva su clave Zobrist, que `transicion` actualiza
+con las fichas que cambian, sin recorrer el tablero.
+
+Las jugadas y las reglas son las mismas que en `othello.Othello`: las
+acciones son tuplas (fila, columna), el jugador 1 es negro y el -1 es
+blanco. Las jugadas legales y las fichas a voltear se calculan con
+desplazamientos y máscaras en las ocho direcciones, sin recorrer el
+tablero casilla por casilla. El pase (`othello.PASA`) y el fin del juego
+también son los mismos.
+
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from juegos_simplificado import ModeloJuegoZT2
+from othello import PASA, VACIAS_FINAL, Ficha
+from transposicion import ZobristCasillas
+
+ZOBRIST = ZobristCasillas(64, semilla="othello")
+
+TODO = (1 << 64) - 1
+SIN_COL_0 = 0xFEFEFEFEFEFEFEFE
+SIN_COL_7 = 0x7F7F7F7F7F7F7F7F
+
+# Multiplicadores impares (biyecciones en 64 bits) de `clave_tableros`
+MEZCLA = 0x9E3779B97F4A7C15
+MEZCLA_FINAL = 0xBF58476D1CE4E5B9
+
+# (desplazamiento, máscara) para cada dirección. Un desplazamiento positivo
+# es un corrimiento a la izquierda (hacia el sur o el este) y la máscara
+# elimina las fichas que dieron la vuelta de una orilla del tablero a otra.
+DIRECCIONES = (
+    (8, TODO),  # S
+    (-8, TODO),  # N
+    (1, SIN_COL_0),  # E
+    (-1, SIN_COL_7),  # O
+    (9, SIN_COL_0),  # SE
+    (7, SIN_COL_7),  # SO
+    (-7, SIN_COL_0),  # NE
+    (-9, SIN_COL_7),  # NO
+)
+
+
+class TableroBits(NamedTuple):
+    negras: int
+    blancas: int
+    clave: int
+
+    def tobytes(self) -> bytes:
+        return self.negras.to_bytes(8, "little") + self.blancas.to_bytes(8, "little")
+
+
+def desplaza(b: int, n: int, mascara: int) -> int:
+    return ((b << n) if n > 0 else (b >> -n)) & mascara
+
+
+def mascara_jugadas(propias: int, rivales: int) -> int:
+    """
+    Devuelve el tablero de bits con las casillas donde puede jugar
+    el jugador con las fichas `propias`
+
+    """
+    vacias = ~(propias | rivales) & TODO
+    jugadas = 0
+    for n, mascara in DIRECCIONES:
+        x = desplaza(propias, n, mascara) & rivales
+        for _ in range(5):
+            x |= desplaza(x, n, mascara) & rivales
+        jugadas |= desplaza(x, n, mascara)
+    return jugadas & vacias
+
+
+@lru_cache(maxsize=2**16)
+def jugadas_en_cache(propias: int, rivales: int) -> tuple[tuple[int, int], ...]:
+    """
+    Casillas donde puede jugar el jugador con las fichas `propias`. Se
+    guardan las últimas consultas para que `terminal` y `jugadas_legales`
+    no calculen dos veces las jugadas del mismo tablero.
+
+    """
+    return tuple(casillas(mascara_jugadas(propias, rivales)))
+
+
+def voltea_vertical(b: int) -> int:
+    """
+    Refleja el tablero de arriba a abajo (la fila i pasa a la 7 - i)
+
+    """
+    return int.from_bytes(b.to_bytes(8, "little"), "big")
+
+
+def refleja_horizontal(b: int) -> int:
+    """
+    Refleja el tablero de izquierda a derecha (la columna j pasa a la 7 - j)
+
+    """
+    b = ((b >> 1) & 0x5555555555555555) | ((b & 0x5555555555555555) << 1)
+    b = ((b >> 2) & 0x3333333333333333) | ((b & 0x3333333333333333) << 2)
+    return ((b >> 4) & 0x0F0F0F0F0F0F0F0F) | ((b & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def transpone(b: int) -> int:
+    """
+    Refleja el tablero en la diagonal principal (la casilla (i, j) pasa
+    a la (j, i))
+
+    """
+    t = 0x0F0F0F0F00000000 & (b ^ (b << 28))
+    b ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (b ^ (b << 14))
+    b ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (b ^ (b << 7))
+    return (b ^ t ^ (t >> 7)) & TODO
+
+
+def clave_tableros(negras: int, blancas: int) -> int:
+    """
+    Clave de 64 bits de un par de tableros de bits. Cada paso (multiplicar
+    por un impar, xor con un corrimiento a la derecha) es una biyección en
+    64 bits, así que con las negras fijas dos tableros de blancas nunca
+    comparten clave, y en general dos pares la comparten con probabilidad
+    de 2**-64, como con Zobrist.
+
+    """
+    h = (negras * MEZCLA) & TODO
+    h ^= h >> 31
+    h = ((h ^ blancas) * MEZCLA) & TODO
+    h ^= h >> 29
+    h = (h * MEZCLA_FINAL) & TODO
+    return h ^ (h >> 32)
+
+
+def simetricos(b: int) -> tuple[int, ...]:
+    """
+    Las ocho transformaciones del tablero, en el orden identidad,
+    vertical, horizontal, las dos, y las mismas seguidas de `transpone`
+
+    """
+    v = voltea_vertical(b)
+    reflejos = (b, v, refleja_horizontal(b), refleja_horizontal(v))
+    return reflejos + tuple(transpone(x) for x in reflejos)
+
+
+# Casilla a la que cada simetría lleva a cada casilla, y la inversa
+SIMETRIAS = tuple(
+    zip(*((x.bit_length() - 1 for x in simetricos(1 << c)) for c in range(64)))
+)
+INVERSAS = tuple(
+    tuple(sorted(range(64), key=simetria.__getitem__)) for simetria in SIMETRIAS
+)
+
+
+def mascara_volteadas(propias: int, rivales: int, casilla: int) -> int:
+    """
+    Devuelve el tablero de bits con las fichas rivales que se voltean
+    al jugar en `casilla`
+
+    """
+    bit = 1 << casilla
+    volteadas = 0
+    for n, mascara in DIRECCIONES:
+        rayo = 0
+        b = desplaza(bit, n, mascara)
+        while b & rivales:
+            rayo |= b
+            b = desplaza(b, n, mascara)
+        if b & propias:
+            volteadas |= rayo
+    return volteadas
+
+
+def casillas(mascara: int) -> list[tuple[int, int]]:
+    """
+    Convierte un tablero de bits en la lista de casillas (fila, columna)
+
+    """
+    lista = []
+    while mascara:
+        b = mascara & -mascara
+        lista.append(divmod(b.bit_length() - 1, 8))
+        mascara ^= b
+    return lista
+
+
+class OthelloBitboard(ModeloJuegoZT2):
+    pase = PASA
+    vacias_final = VACIAS_FINAL
+
+    def inicializa(self):
+        negras = (1 << (8 * 3 + 4)) | (1 << (8 * 4 + 3))
+        blancas = (1 << (8 * 3 + 3)) | (1 << (8 * 4 + 4))
+        return (TableroBits(negras, blancas, ZOBRIST.clave_bits(negras, blancas)), 1)
+
+    def jugadas_legales(self, s: TableroBits, j):
+        if j == Ficha.NEGRA:
+            propias, rivales = s.negras, s.blancas
+        else:
+            propias, rivales = s.blancas, s.negras
+        jugadas = jugadas_en_cache(propias, rivales)
+        if jugadas:
+            return list(jugadas)
+        return [PASA] if jugadas_en_cache(rivales, propias) else []
+
+    def transicion(self, s: TableroBits, a, j):
+        if a == PASA:
+            return s
+        casilla = 8 * a[0] + a[1]
+        negras, blancas, clave = s
+        if j == Ficha.NEGRA:
+            propias, rivales = negras, blancas
+        else:
+            propias, rivales = blancas, negras
+        volteadas = mascara_volteadas(propias, rivales, casilla)
+        propias |= volteadas | (1 << casilla)
+        rivales ^= volteadas
+        clave ^= ZOBRIST.ficha(casilla, j)
+        while volteadas:
+            b = volteadas & -volteadas
+            clave ^= ZOBRIST.cambio[b.bit_length() - 1]
+            volteadas ^= b
+        if j == Ficha.NEGRA:
+            return TableroBits(propias, rivales, clave)
+        return TableroBits(rivales, propias, clave)
+
+    def terminal(self, s: TableroBits):
+        negras, blancas, _ = s
+        if not (negras and blancas and (negras | blancas) != TODO):
+            return True
+        return not (
+            jugadas_en_cache(negras, blancas) or jugadas_en_cache(blancas, negras)
+        )
+
+    def ganancia(self, s: TableroBits):
+        diferencia = s.negras.bit_count() - s.blancas.bit_count()
+        return (diferencia > 0) - (diferencia < 0)
+
+    def clave(self, s: TableroBits):
+        return s.clave
+
+    def resuelve_final(self, s: TableroBits, j, limite=None):
+        if 64 - (s.negras | s.blancas).bit_count() > self.vacias_final:
+            return None
+        from othello_final import jugada_final
+
+        return jugada_final(s.negras, s.blancas, j, limite)
+
+    def clave_canonica(self, s: TableroBits):
+        """
+        La menor de las ocho transformaciones de los dos tableros, con
+        `clave_tableros` como clave
+
+        """
+        variantes = list(zip(simetricos(s.negras), simetricos(s.blancas)))
+        menor = min(variantes)
+        return clave_tableros(*menor), variantes.index(menor)
+
+    def transforma_jugada(self, a, simetria):
+        if a == PASA:
+            return a
+        return divmod(SIMETRIAS[simetria][8 * a[0] + a[1]], 8)
+
+    def jugada_original(self, a, simetria):
+        if a == PASA:
+            return a
+        return divmod(INVERSAS[simetria][8 * a[0] + a[1]], 8)
+
+    def codifica_jugada(self, a):
+        return 64 if a == PASA else 8 * a[0] + a[1]
+
+    def decodifica_jugada(self, n):
+        return PASA if n == 64 else divmod(n, 8)
+
+
+def de_arreglo(s: np.ndarray) -> TableroBits:
+    """
+    Convierte un estado de `othello.Othello` en un TableroBits
+
+    """
+    plano = s.ravel()
+    negras = sum(1 << int(k) for k in np.flatnonzero(plano == Ficha.NEGRA))
+    blancas = sum(1 << int(k) for k in np.flatnonzero(plano == Ficha.BLANCA))
+    return TableroBits(negras, blancas, ZOBRIST.clave_bits(negras, blancas))
+
+
+def a_arreglo(s: TableroBits) -> np.ndarray:
+    """
+    Convierte un TableroBits en un estado de `othello.Othello`
+
+    """
+    arreglo = np.zeros((8, 8), dtype=np.int8)
+    for i, j in casillas(s.negras):
+        arreglo[i][j] = Ficha.NEGRA
+    for i, j in casillas(s.blancas):
+        arreglo[i][j] = Ficha.BLANCA
+    return arreglo
+
+
+def evalua_bits(s: TableroBits) -> float:
+    """
+    La misma evaluación que `othello.evalua` sobre un TableroBits
+
+    """
+    negras, blancas = s.negras.bit_count(), s.blancas.bit_count()
+    total_fichas = negras + blancas
+    if total_fichas == 64:
+        return (negras > blancas) - (negras < blancas)
+    return (negras - blancas) / total_fichas
+
+
+def verifica_paridad(partidas=100, semilla=0):
+    """
+    Juega partidas aleatorias con `othello.Othello` y `OthelloBitboard`
+    a la par y verifica que ambos modelos coincidan en jugadas legales,
+    transiciones, estados terminales y ganancias, y que dos posiciones
+    con distinto representante canónico no compartan clave canónica.
+
+    Regresa
+    -------
+    int: número de posiciones comparadas
+
+    """
+    from random import Random
+
+    from othello import Othello
+
+    azar = Random(semilla)
+    lento, rapido = Othello(), OthelloBitboard()
+    posiciones = 0
+    # Clave canónica -> representante canónico
+    canonicas = {}
+    for _ in range(partidas):
+        s, j = lento.inicializa()
+        b, _ = rapido.inicializa()
+        while True:
+            posiciones += 1
+            if de_arreglo(s) != b:
+                raise AssertionError(
+                    f"Los estados difieren en la posición {posiciones}"
+                )
+            clave, simetria = rapido.clave_canonica(b)
+            representante = (
+                simetricos(b.negras)[simetria],
+                simetricos(b.blancas)[simetria],
+            )
+            if canonicas.setdefault(clave, representante) != representante:
+                raise AssertionError(
+                    f"Dos posiciones comparten la clave canónica {clave:#x}"
+                )
+            if lento.terminal(s) != rapido.terminal(b):
+                raise AssertionError(f"terminal difiere en la posición {posiciones}")
+            if lento.terminal(s):
+                if lento.ganancia(s) != rapido.ganancia(b):
+                    raise AssertionError(
+                        f"ganancia difiere en la posición {posiciones}"
+                    )
+                break
+            jugadas = sorted(lento.jugadas_legales(s, j))
+            if jugadas != sorted(rapido.jugadas_legales(b, j)):
+                raise AssertionError(
+                    f"Las jugadas difieren en la posición {posiciones}"
+                )
+            a = azar.choice(jugadas)
+            s, b = lento.transicion(s, a, j), rapido.transicion(b, a, j)
+            j = -j
+    return posiciones
+
+
+if __name__ == "__main__":
+    print("Posiciones verificadas:", verifica_paridad())
@@ -0,0 +1,292 @@
+"""
+Solución exacta de los finales de Othello
+
+Cuando quedan pocas casillas vacías se puede buscar hasta el final del
+juego. El valor de una posición es la diferencia de fichas al final
+(las casillas que queden vacías se suman al ganador), así que la mejor
+jugada además de ganar gana por lo más posible.
+
+La búsqueda es un alfa-beta sobre tableros de bits (fichas del jugador en
+turno y del rival) que lleva la lista de casillas vacías, en lugar de
+generar las jugadas con máscaras: una casilla vacía es jugada si voltea
+alguna ficha. Las jugadas se ordenan
+
+    1- Con muchas vacías, primero las que le dejan al rival menos
+       jugadas (fastest-first)
+    2- Siempre, primero las casillas de los cuadrantes con un número
+       impar de vacías (paridad), porque en cada región quien juega la
+       última casilla suele quedarse con ella
+
+Los modelos de Othello usan este módulo en su `resuelve_final`, que
+`minimax.minimax_iterativo` llama antes de buscar, con VACIAS_FINAL
+(en `othello`) vacías o menos. Ahí el valor se pasa a la escala de la
+búsqueda con `valor_busqueda`, para que no se mezclen diferencias de
+fichas con evaluaciones entre -1 y 1 (por ejemplo en los registros de
+`torneo.py`).
+
+Segundos de `resuelve` por número de vacías, en las posiciones al azar
+de `benchmark.compara_final(range(10, 15), posiciones=8)` (un núcleo):
+
+    vacías   mediana   máximo
+      10      0.04      0.08
+      11      0.06      0.10
+      12      0.23      0.52
+      13      0.56      0.78
+      14      0.70      1.11
+
+Con 14 vacías la solución se lleva más de un segundo, todo el presupuesto
+de una jugada rápida, así que VACIAS_FINAL es 12.
+
+"""
+
+from time import time
+
+from minimax import TiempoAgotado
+from othello import PASA, Direccion, avanzar_direccion, esta_en_rango
+from othello_bitboard import mascara_jugadas
+
+# Con más vacías que esto las jugadas se ordenan por movilidad del rival
+VACIAS_MOVILIDAD = 6
+
+# Nodos entre cada revisión del reloj
+INTERVALO_RELOJ = 1024
+
+# Lo que pierde una victoria en la escala de la búsqueda por cada ficha de
+# diferencia que le falta para 64, ver `valor_busqueda`
+PASO_FICHA = 0.001
+
+
+def _calcula_rayos():
+    """
+    Para cada casilla, los rayos (tuplas de bits, de la casilla hacia
+    afuera) de al menos dos casillas en las ocho direcciones
+
+    """
+    rayos = []
+    for casilla in range(64):
+        rayos_casilla = []
+        for direccion in Direccion:
+            rayo = []
+            x, y = avanzar_direccion(divmod(casilla, 8), direccion)
+            while esta_en_rango((x, y)):
+                rayo.append(1 << (8 * x + y))
+                x, y = avanzar_direccion((x, y), direccion)
+            if len(rayo) >= 2:
+                rayos_casilla.append(tuple(rayo))
+        rayos.append(tuple(rayos_casilla))
+    return tuple(rayos)
+
+
+RAYOS = _calcula_rayos()
+
+# Bit del cuadrante (4x4) de cada casilla, para la paridad
+CUADRANTE = tuple(1 << (2 * (i // 4) + (j // 4)) for i in range(8) for j in range(8))
+
+
+def volteadas(propias, rivales, casilla):
+    """
+    Tablero de bits con las fichas rivales que se voltean al jugar en
+    `casilla` (0 si la jugada no es legal)
+
+    """
+    total = 0
+    for rayo in RAYOS[casilla]:
+        linea = 0
+        for b in rayo:
+            if b & rivales:
+                linea |= b
+            else:
+                if b & propias:
+                    total |= linea
+                break
+    return total
+
+
+def _final(propias, rivales, vacias):
+    diferencia = propias.bit_count() - rivales.bit_count()
+    if diferencia > 0:
+        return diferencia + vacias
+    if diferencia < 0:
+        return diferencia - vacias
+    return 0
+
+
+class _Contexto:
+    def __init__(self, limite):
+        self.limite = limite
+        self.nodos = 0
+        # (propias, rivales) -> (cota inferior, cota superior)
+        self.cotas = {}
+
+
+def _ordena(propias, rivales, vacias):
+    """
+    Lista de (casilla, volteadas) de las jugadas legales, en el orden en
+    que se van a buscar
+
+    """
+    paridad = 0
+    for casilla in vacias:
+        paridad ^= CUADRANTE[casilla]
+    jugadas = []
+    for casilla in vacias:
+        f = volteadas(propias, rivales, casilla)
+        if f:
+            jugadas.append((casilla, f))
+    if len(vacias) > VACIAS_MOVILIDAD:
+
+        def movilidad(jugada):
+            casilla, f = jugada
+            rival = mascara_jugadas(rivales ^ f, propias | f | 1 << casilla)
+            return rival.bit_count(), not CUADRANTE[casilla] & paridad
+
+        jugadas.sort(key=movilidad)
+    else:
+        jugadas.sort(key=lambda jugada: not CUADRANTE[jugada[0]] & paridad)
+    return jugadas
+
+
+def _resuelve(propias, rivales, vacias, alpha, beta, paso, contexto):
+    """
+    Valor exacto (diferencia de fichas para el jugador en turno) con
+    poda alfa-beta. `paso` es True si el rival acaba de pasar.
+
+    """
+    contexto.nodos += 1
+    if (
+        contexto.limite is not None
+        and contexto.nodos % INTERVALO_RELOJ == 0
+        and time() > contexto.limite
+    ):
+        raise TiempoAgotado()
+    if len(vacias) == 1:
+        return _ultima(propias, rivales, vacias[0])
+    guarda = len(vacias) > VACIAS_MOVILIDAD
+    if guarda:
+        inferior, superior = contexto.cotas.get((propias, rivales), (-65, 65))
+        if inferior >= beta or inferior == superior:
+            return inferior
+        if superior <= alpha:
+            return superior
+        alpha, beta = max(alpha, inferior), min(beta, superior)
+    alpha_original = alpha
+    mejor = -65
+    jugadas = _ordena(propias, rivales, vacias)
+    for k, (casilla, f) in enumerate(jugadas):
+        hijo = rivales ^ f, propias | f | 1 << casilla
+        resto = [x for x in vacias if x != casilla]
+        if guarda and k > 0:
+            # Ventana nula: los valores son enteros
+            v = -_resuelve(*hijo, resto, -alpha - 1, -alpha, False, contexto)
+            if alpha < v < beta:
+                v = -_resuelve(*hijo, resto, -beta, -v, False, contexto)
+        else:
+            v = -_resuelve(*hijo, resto, -beta, -alpha, False, contexto)
+        if v > mejor:
+            mejor = v
+            if v >= beta:
+                break
+            if v > alpha:
+                alpha = v
+    if not jugadas:
+        if paso:
+            return _final(propias, rivales, len(vacias))
+        mejor = -_resuelve(rivales, propias, vacias, -beta, -alpha, True, contexto)
+    if guarda:
+        if mejor <= alpha_original:
+            superior = mejor
+        elif mejor >= beta:
+            inferior = mejor
+        else:
+            inferior = superior = mejor
+        contexto.cotas[propias, rivales] = inferior, superior
+    return mejor
+
+
+def _ultima(propias, rivales, casilla):
+    """
+    Valor con una sola casilla vacía, sin generar más nodos
+
+    """
+    f = volteadas(propias, rivales, casilla)
+    if f:
+        return _final(propias | f | 1 << casilla, rivales ^ f, 0)
+    f = volteadas(rivales, propias, casilla)
+    if f:
+        return -_final(rivales | f | 1 << casilla, propias ^ f, 0)
+    return _final(propias, rivales, 1)
+
+
+def valor_busqueda(diferencia):
+    """
+    Convierte una diferencia de fichas final a la escala de la búsqueda,
+    la de `ganancia`: ±(1 - PASO_FICHA (64 - |diferencia|)). Así queda
+    entre -1 y 1, con el signo del ganador, y ganar por más sigue valiendo
+    más.
+
+    """
+    if diferencia == 0:
+        return 0.0
+    signo = 1 if diferencia > 0 else -1
+    return signo * (1 - PASO_FICHA * (64 - abs(diferencia)))
+
+
+def jugada_final(negras, blancas, j, limite=None):
+    """
+    `resuelve` con la jugada como tupla (fila, columna) o PASA, para el
+    `resuelve_final` de los modelos
+
+    Regresa
+    -------
+    tuple: (jugada, valor), con el valor en la escala de la búsqueda (ver
+        `valor_busqueda`), o None si se llegó al límite
+
+    """
+    resultado = resuelve(negras, blancas, j, limite)
+    if resultado is None:
+        return None
+    casilla, diferencia, _ = resultado
+    return (PASA if casilla is None else divmod(casilla, 8)), valor_busqueda(diferencia)
+
+
+def resuelve(negras, blancas, j, limite=None):
+    """
+    Resuelve de forma exacta la posición dada por dos tableros de bits
+
+    Parametros
+    ----------
+    negras, blancas (int): Tableros de bits de cada color
+    j (int): Jugador en turno (1 negras, -1 blancas)
+    limite (float): Si no es None, hora (de `time.time`) a la que se
+        abandona la búsqueda
+
+    Regresa
+    -------
+    tuple: (casilla, valor, nodos), con la mejor casilla (0 a 63, o None
+        si j tiene que pasar) y la diferencia de fichas final para j con
+        juego perfecto de los dos. None si se llegó al límite.
+
+    """
+    propias, rivales = (negras, blancas) if j == 1 else (blancas, negras)
+    ocupadas = negras | blancas
+    vacias = [c for c in range(64) if not ocupadas >> c & 1]
+    contexto = _Contexto(limite)
+    try:
+        jugadas = _ordena(propias, rivales, vacias)
+        if not jugadas:
+            v = -_resuelve(rivales, propias, vacias, -65, 65, True, contexto)
+            return None, v, contexto.nodos
+        mejor, alpha = None, -65
+        for casilla, f in jugadas:
+            hijo = rivales ^ f, propias | f | 1 << casilla
+            resto = [x for x in vacias if x != casilla]
+            if mejor is not None:
+                v = -_resuelve(*hijo, resto, -alpha - 1, -alpha, False, contexto)
+                if v <= alpha:
+                    continue
+            v = -_resuelve(*hijo, resto, -65, -alpha, False, contexto)
+            if v > alpha:
+                mejor, alpha = casilla, v
+    except TiempoAgotado:
+        return None
+    return mejor, alpha, contexto.nodos
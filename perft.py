@@ -0,0 +1,185 @@
+"""
+Perft: conteo de posiciones a profundidad fija para validar modelos
+
+`perft(juego, s, j, d)` cuenta las posiciones a las que se llega desde s
+después de exactamente d jugadas, usando solo `jugadas_legales`,
+`transicion` y `terminal`, así que sirve para cualquier
+`ModeloJuegoZT2`. Las posiciones terminales antes de llegar a d no se
+cuentan. El pase de Othello es una jugada como cualquier otra (ver
+`ModeloJuegoZT2.pase`). Si un modelo regresa una lista vacía sin que el
+estado sea terminal, el jugador en turno pasa y el pase cuenta como una
+jugada; si el rival tampoco tiene jugadas el juego termina ahí.
+
+Un modelo nuevo (por ejemplo, con tableros de bits) debe dar los mismos
+conteos que el original y que los valores conocidos en CONOCIDOS:
+
+    python perft.py gato 9
+    python perft.py othello 6 --divide
+    python perft.py conecta4 8 --procesos 4
+
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+# Conteos conocidos desde la posición inicial, de la profundidad 1 en adelante
+CONOCIDOS = {
+    "gato": (9, 72, 504, 3024, 15120, 54720, 148176, 200448, 127872),
+    "conecta4": (7, 49, 343, 2401, 16807, 117649, 823536, 5673234),
+    "othello": (4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288),
+}
+
+
+def perft(juego, s, j, d):
+    """
+    Número de posiciones a profundidad d desde s
+
+    Parametros
+    ----------
+    juego (ModeloJuegoZT2): Modelo del juego
+    s: Estado desde el que se cuenta
+    j (int): Jugador en turno (1 o -1)
+    d (int): Número de jugadas
+
+    Regresa
+    -------
+    int: posiciones a exactamente d jugadas de s
+
+    """
+    if d == 0:
+        return 1
+    if juego.terminal(s):
+        return 0
+    jugadas = list(juego.jugadas_legales(s, j))
+    if not jugadas:
+        if not list(juego.jugadas_legales(s, -j)):
+            return 0
+        return perft(juego, s, -j, d - 1)
+    if d == 1:
+        return len(jugadas)
+    return sum(perft(juego, juego.transicion(s, a, j), -j, d - 1) for a in jugadas)
+
+
+def _hijos(juego, s, j):
+    """
+    Lista de (jugada, estado) de las jugadas de s, con la jugada de pase
+    del juego (`pase`, None si no tiene) y el mismo estado cuando j tiene
+    que pasar sin que el modelo lo dé como jugada
+
+    """
+    if juego.terminal(s):
+        return []
+    jugadas = list(juego.jugadas_legales(s, j))
+    if jugadas:
+        return [(a, juego.transicion(s, a, j)) for a in jugadas]
+    if list(juego.jugadas_legales(s, -j)):
+        return [(getattr(juego, "pase", None), s)]
+    return []
+
+
+def divide(juego, s, j, d, procesos=1):
+    """
+    Perft separado por jugada de la raíz
+
+    Con procesos > 1 el conteo de cada jugada de la raíz se hace en un
+    proceso aparte.
+
+    Regresa
+    -------
+    dict: {jugada: posiciones a profundidad d}, con el `pase` del juego
+        (o None) para un pase. Vacío si d es 0 o s es terminal.
+
+    """
+    if d == 0:
+        return {}
+    hijos = _hijos(juego, s, j)
+    argumentos = [(juego, hijo, -j, d - 1) for _, hijo in hijos]
+    if procesos > 1 and len(hijos) > 1:
+        with ProcessPoolExecutor(procesos) as alberca:
+            conteos = list(alberca.map(perft, *zip(*argumentos)))
+    else:
+        conteos = [perft(*x) for x in argumentos]
+    return {a: n for (a, _), n in zip(hijos, conteos)}
+
+
+def mide(juego, s, j, d, procesos=1):
+    """
+    Corre perft y mide su velocidad
+
+    Regresa
+    -------
+    tuple: (posiciones, segundos, posiciones por segundo)
+
+    """
+    t0 = perf_counter()
+    if procesos > 1:
+        n = sum(divide(juego, s, j, d, procesos).values())
+    else:
+        n = perft(juego, s, j, d)
+    segundos = perf_counter() - t0
+    return n, segundos, n / segundos if segundos else 0.0
+
+
+def verifica(juego, conocidos, d=None):
+    """
+    Compara el perft de la posición inicial del juego con los conteos
+    conocidos, de la profundidad 1 a la d
+
+    Regresa
+    -------
+    list: conteos por profundidad
+
+    """
+    s, j = juego.inicializa()
+    conteos = []
+    for k, esperado in enumerate(conocidos[:d], 1):
+        n = perft(juego, s, j, k)
+        if n != esperado:
+            raise AssertionError(f"perft({k}) = {n}, se esperaba {esperado}")
+        conteos.append(n)
+    return conteos
+
+
+def _modelos():
+    from conect4 import Conecta4
+    from conect4_bitboard import Conecta4Bitboard
+    from gato import Gato
+    from othello import Othello
+    from othello_bitboard import OthelloBitboard
+
+    return {
+        "gato": Gato,
+        "conecta4": Conecta4,
+        "conecta4_bitboard": Conecta4Bitboard,
+        "othello": Othello,
+        "othello_bitboard": OthelloBitboard,
+    }
+
+
+if __name__ == "__main__":
+    modelos = _modelos()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("juego", choices=sorted(modelos))
+    parser.add_argument("profundidad", type=int)
+    parser.add_argument("--divide", action="store_true")
+    parser.add_argument("--procesos", type=int, default=1)
+    args = parser.parse_args()
+
+    juego = modelos[args.juego]()
+    s, j = juego.inicializa()
+    t0 = perf_counter()
+    if args.divide:
+        conteos = divide(juego, s, j, args.profundidad, args.procesos)
+        pase = getattr(juego, "pase", None)
+        for a, n in conteos.items():
+            print(f"{'pasa' if a is None or a == pase else a}: {n}")
+        n = sum(conteos.values())
+    else:
+        n = mide(juego, s, j, args.profundidad, args.procesos)[0]
+    segundos = perf_counter() - t0
+    print(f"perft({args.profundidad}) = {n}  {segundos:.2f} s  {n / segundos:.0f} nps")
+    conocidos = CONOCIDOS.get(args.juego.split("_")[0], ())
+    if args.profundidad <= len(conocidos):
+        esperado = conocidos[args.profundidad - 1]
+        print("correcto" if n == esperado else f"INCORRECTO, se esperaba {esperado}")
@@ -0,0 +1,381 @@
+"""
+Registros binarios de posiciones, de tamaño fijo
+
+Para entrenar y para las pruebas de regresión se necesitan millones de
+posiciones de partidas (ver `torneo.py`). Cada posición se guarda como un
+registro de REGISTRO.itemsize (22) bytes:
+
+    fichas1 (uint64): Tablero de bits de las fichas del jugador 1
+    fichas2 (uint64): Tablero de bits de las fichas del jugador -1
+    turno (int8): Jugador en turno
+    resultado (int8): Resultado final de la partida para el jugador 1
+        (1, 0 o -1)
+    valor (float32): Valor de la búsqueda para el jugador en turno, NaN
+        si no se conoce
+
+Los tableros de bits son los de los modelos con bits: en Conecta4 los de
+`conect4_bitboard` (7 bits por columna) y en Othello el bit 8i + j es la
+casilla (i, j). Así, el modelo con tuplas o arreglos y el de bits de un
+mismo juego comparten archivos.
+
+El archivo empieza con una cabecera de CABECERA.size bytes (la marca
+MARCA, la versión y el juego) y después los registros uno tras otro, así
+que se puede leer con `numpy.memmap` sin copiar nada:
+
+    with Escritor("c4.pos", Conecta4()) as escritor:
+        escritor.agrega(s, j, resultado, valor)
+    registros = carga("c4.pos")
+    lote = registros[1000:2000]                   # sin copiar
+    estados_lote = estados(Conecta4(), lote)      # de vuelta a estados
+
+"""
+
+import argparse
+import json
+import os
+import struct
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from conect4 import Conecta4
+from conect4_bitboard import (
+    ZOBRIST as ZOBRIST_C4,
+    Conecta4Bitboard,
+    TableroC4,
+    bit_de_casilla,
+    conecta4,
+)
+from othello import Othello
+from othello_bitboard import ZOBRIST as ZOBRIST_OTHELLO
+from othello_bitboard import OthelloBitboard, TableroBits
+
+REGISTRO = np.dtype(
+    [
+        ("fichas1", "<u8"),
+        ("fichas2", "<u8"),
+        ("turno", "i1"),
+        ("resultado", "i1"),
+        ("valor", "<f4"),
+    ]
+)
+
+# Marca, versión y juego
+CABECERA = struct.Struct("<6sB9s")
+MARCA = b"ZT2POS"
+VERSION = 1
+
+# Registros que el escritor junta antes de escribir
+CAPACIDAD = 1 << 14
+
+# Bit de cada casilla de `conect4.Conecta4`
+BITS_C4 = tuple(bit_de_casilla(i) for i in range(42))
+_INDICES_C4 = np.array([b.bit_length() - 1 for b in BITS_C4])
+
+
+def casillas(fichas):
+    """
+    Desempaca un arreglo de n tableros de bits en un arreglo (n, 64) de
+    0 y 1 (uint8), donde la columna k es el bit k
+
+    """
+    fichas = np.ascontiguousarray(fichas, dtype="<u8")
+    return np.unpackbits(
+        fichas.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little"
+    )
+
+
+def _bits_arreglo(plano):
+    return int(np.packbits(plano.ravel(), bitorder="little").view("<u8")[0])
+
+
+def _bits_c4(s):
+    uno = sum(b for b, x in zip(BITS_C4, s) if x == 1)
+    dos = sum(b for b, x in zip(BITS_C4, s) if x == -1)
+    return uno, dos
+
+
+def _bits_othello(s):
+    return _bits_arreglo(s == 1), _bits_arreglo(s == -1)
+
+
+def _lote_c4(fichas1, fichas2):
+    tableros = casillas(fichas1).astype(np.int8) - casillas(fichas2)
+    return [tuple(t) for t in tableros[:, _INDICES_C4].tolist()]
+
+
+def _lote_c4_bits(fichas1, fichas2):
+    lote = []
+    for uno, dos in zip(fichas1.tolist(), fichas2.tolist()):
+        ganador = 1 if conecta4(uno) else -1 if conecta4(dos) else 0
+        lote.append(TableroC4(uno, dos, ganador, ZOBRIST_C4.clave_bits(uno, dos)))
+    return lote
+
+
+def _lote_othello(fichas1, fichas2):
+    tableros = casillas(fichas1).astype(np.int8) - casillas(fichas2)
+    return list(tableros.reshape(-1, 8, 8))
+
+
+def _lote_othello_bits(fichas1, fichas2):
+    return [
+        TableroBits(negras, blancas, ZOBRIST_OTHELLO.clave_bits(negras, blancas))
+        for negras, blancas in zip(fichas1.tolist(), fichas2.tolist())
+    ]
+
+
+class Formato(NamedTuple):
+    """
+    Cómo pasar los estados de un modelo a registros y de regreso
+
+    """
+
+    juego: str
+    # estado -> (fichas1, fichas2)
+    a_bits: Callable
+    # (arreglo de fichas1, arreglo de fichas2) -> lista de estados
+    de_bits: Callable
+
+
+FORMATOS = {
+    Conecta4: Formato("conecta4", _bits_c4, _lote_c4),
+    Conecta4Bitboard: Formato(
+        "conecta4", lambda s: (s.jugador1, s.jugador2), _lote_c4_bits
+    ),
+    Othello: Formato("othello", _bits_othello, _lote_othello),
+    OthelloBitboard: Formato(
+        "othello", lambda s: (s.negras, s.blancas), _lote_othello_bits
+    ),
+}
+
+
+def formato(juego):
+    """
+    El Formato del modelo de juego (una instancia)
+
+    """
+    try:
+        return FORMATOS[type(juego)]
+    except KeyError:
+        raise ValueError(f"No hay formato de registros para {type(juego).__name__}")
+
+
+def lee_cabecera(archivo):
+    """
+    Regresa el juego del archivo de registros
+
+    """
+    with open(archivo, "rb") as f:
+        datos = f.read(CABECERA.size)
+    if len(datos) < CABECERA.size:
+        raise ValueError(f"{archivo} no tiene cabecera")
+    marca, version, juego = CABECERA.unpack(datos)
+    if marca != MARCA or version != VERSION:
+        raise ValueError(f"{archivo} no es un archivo de registros (versión {VERSION})")
+    return juego.rstrip(b"\0").decode()
+
+
+def carga(archivo, juego=None):
+    """
+    Abre un archivo de registros con `numpy.memmap`, de solo lectura
+
+    Parametros
+    ----------
+    juego (ModeloJuegoZT2): Si no es None, se revisa que el archivo sea de
+        ese juego
+
+    Regresa
+    -------
+    numpy.memmap: arreglo de REGISTRO; sus rebanadas no copian datos
+
+    """
+    nombre = lee_cabecera(archivo)
+    if juego is not None and formato(juego).juego != nombre:
+        raise ValueError(f"{archivo} tiene posiciones de {nombre}")
+    tamano = os.path.getsize(archivo) - CABECERA.size
+    if tamano % REGISTRO.itemsize:
+        raise ValueError(f"{archivo} tiene un registro incompleto")
+    if not tamano:
+        return np.zeros(0, dtype=REGISTRO)
+    return np.memmap(archivo, dtype=REGISTRO, mode="r", offset=CABECERA.size)
+
+
+def estados(juego, registros):
+    """
+    Convierte un arreglo de registros en una lista de (estado, jugador)
+    del modelo juego
+
+    """
+    lote = formato(juego).de_bits(registros["fichas1"], registros["fichas2"])
+    return list(zip(lote, registros["turno"].tolist()))
+
+
+class Escritor:
+    """
+    Agrega registros al final de un archivo
+
+    Junta CAPACIDAD registros en un arreglo y los escribe de una vez. Si
+    el archivo no existe se crea con su cabecera; si existe, debe ser del
+    mismo juego. Se usa con `with` o llamando a `cierra` al terminar.
+
+    """
+
+    def __init__(self, archivo, juego, capacidad=CAPACIDAD):
+        self.formato = formato(juego)
+        nuevo = not os.path.exists(archivo) or os.path.getsize(archivo) == 0
+        if not nuevo:
+            carga(archivo, juego)
+        self._archivo = open(archivo, "ab")
+        if nuevo:
+            nombre = self.formato.juego.encode()
+            self._archivo.write(CABECERA.pack(MARCA, VERSION, nombre))
+        self._buffer = np.zeros(capacidad, dtype=REGISTRO)
+        self._n = 0
+        self.escritos = 0
+
+    def agrega_bits(self, fichas1, fichas2, turno, resultado=0, valor=np.nan):
+        """
+        Agrega un registro dado con sus campos
+
+        """
+        self._buffer[self._n] = (fichas1, fichas2, turno, resultado, valor)
+        self._n += 1
+        if self._n == len(self._buffer):
+            self.vacia()
+
+    def agrega(self, s, j, resultado=0, valor=np.nan):
+        """
+        Agrega el estado s con el jugador en turno j
+
+        Parametros
+        ----------
+        resultado (int): Resultado de la partida para el jugador 1
+        valor (float): Valor de la búsqueda para j, NaN si no se conoce
+
+        """
+        if valor is None:
+            valor = np.nan
+        self.agrega_bits(*self.formato.a_bits(s), j, resultado, valor)
+
+    def agrega_lote(self, registros):
+        """
+        Agrega un arreglo de REGISTRO
+
+        """
+        self.vacia()
+        self._archivo.write(np.ascontiguousarray(registros, dtype=REGISTRO).tobytes())
+        self.escritos += len(registros)
+
+    def vacia(self):
+        """
+        Escribe los registros pendientes
+
+        """
+        if self._n:
+            self._archivo.write(self._buffer[: self._n].tobytes())
+            self.escritos += self._n
+            self._n = 0
+        self._archivo.flush()
+
+    def cierra(self):
+        self.vacia()
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cierra()
+
+
+def de_torneo(partidas, juego, escritor):
+    """
+    Agrega al escritor las posiciones de las partidas de un torneo (un
+    archivo JSON lines de `torneo.torneo`): cada posición después de la
+    apertura, con el resultado de la partida y el valor de la búsqueda
+    de la jugada que se hizo ahí
+
+    Regresa
+    -------
+    int: número de posiciones agregadas
+
+    """
+    n = 0
+    with open(partidas) as f:
+        for linea in f:
+            registro = json.loads(linea)
+            resultado = (registro["ganancia"] > 0) - (registro["ganancia"] < 0)
+            s, j = juego.inicializa()
+            for a in registro["apertura"]:
+                s, j = juego.transicion(s, _jugada(a), j), -j
+            for jugada in registro["jugadas"]:
+                escritor.agrega(s, j, resultado, jugada["valor"])
+                s, j = juego.transicion(s, _jugada(jugada["jugada"]), j), -j
+                n += 1
+    return n
+
+
+def _jugada(a):
+    # JSON convierte las tuplas en listas
+    return tuple(a) if isinstance(a, list) else a
+
+
+def verifica(juego, partidas=20, semilla=0):
+    """
+    Escribe las posiciones de partidas al azar en un archivo temporal, las
+    lee con `carga` y revisa que regresen los mismos estados
+
+    Regresa
+    -------
+    int: número de posiciones comparadas
+
+    """
+    import tempfile
+    from random import Random
+
+    azar = Random(semilla)
+    originales = []
+    for _ in range(partidas):
+        s, j = juego.inicializa()
+        while not juego.terminal(s):
+            originales.append((s, j))
+            s, j = (
+                juego.transicion(s, azar.choice(list(juego.jugadas_legales(s, j))), j),
+                -j,
+            )
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "posiciones.pos")
+        with Escritor(archivo, juego, capacidad=64) as escritor:
+            for s, j in originales:
+                escritor.agrega(s, j)
+        registros = carga(archivo, juego)
+        leidos = estados(juego, registros)
+        del registros
+    if len(leidos) != len(originales):
+        raise AssertionError(f"{len(leidos)} registros, se esperaban {len(originales)}")
+    a_bits = formato(juego).a_bits
+    for (s, j), (t, k) in zip(originales, leidos):
+        if j != k or a_bits(s) != a_bits(t) or juego.clave(s) != juego.clave(t):
+            raise AssertionError(f"El estado {s} no regresa igual")
+    return len(originales)
+
+
+if __name__ == "__main__":
+    modelos = {
+        "conecta4": Conecta4,
+        "conecta4_bitboard": Conecta4Bitboard,
+        "othello": Othello,
+        "othello_bitboard": OthelloBitboard,
+    }
+    parser = argparse.ArgumentParser(
+        description="Convierte partidas de torneo.py en registros binarios"
+    )
+    parser.add_argument("juego", choices=sorted(modelos))
+    parser.add_argument("partidas", help="archivo JSON lines de torneo.py")
+    parser.add_argument("salida", help="archivo de registros (se agrega al final)")
+    args = parser.parse_args()
+
+    juego = modelos[args.juego]()
+    with Escritor(args.salida, juego) as escritor:
+        n = de_torneo(args.partidas, juego, escritor)
+    print(f"{n} posiciones agregadas, {len(carga(args.salida))} en total")
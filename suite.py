@@ -0,0 +1,266 @@
+"""
+Suite de posiciones fijas para medir el rendimiento del negamax
+
+Cada posición se da como la lista de jugadas desde la posición inicial y
+se busca con `minimax_iterativo` hasta una profundidad fija, sin límite
+de tiempo y con una semilla fija para el orden aleatorio, así que los
+nodos y la jugada elegida son siempre los mismos para el mismo código.
+De cada posición se registran los nodos, los nodos por segundo, el
+tiempo para llegar a cada profundidad y la jugada elegida.
+
+Los resultados se guardan en JSON para comparar dos versiones:
+
+    python suite.py --salida antes.json
+    (cambios)
+    python suite.py --salida despues.json --base antes.json --umbral 0.1
+
+Con --base, el programa termina con código 1 si alguna posición necesita
+más de (1 + umbral) veces los nodos de la base, o si sus nodos por
+segundo caen a menos de (1 - umbral) veces los de la base.
+
+"""
+
+import argparse
+import json
+import platform
+import sys
+from time import perf_counter
+
+from conect4 import Conecta4, evalua_3con, ordena_centro
+from gato import Gato
+from minimax import Busqueda, minimax_iterativo
+from othello import Othello, evalua, ordena_jugadas
+
+
+def evalua_gato(s):
+    return 0
+
+
+# (juego, modelo, evalua, ordena, [(posición, fase, profundidad, jugadas)])
+POSICIONES = (
+    (
+        "Gato",
+        Gato,
+        evalua_gato,
+        None,
+        (
+            ("inicial", "apertura", 9, []),
+            ("medio", "medio juego", 6, [6, 7, 0]),
+            ("final", "final", 4, [6, 7, 0, 3, 8]),
+        ),
+    ),
+    (
+        "Conecta4",
+        Conecta4,
+        evalua_3con,
+        ordena_centro,
+        (
+            ("inicial", "apertura", 8, []),
+            ("medio", "medio juego", 9, [6, 3, 6, 3, 0, 2, 4, 3, 3, 6, 6, 2]),
+            (
+                "final",
+                "final",
+                10,
+                [1, 4, 6, 6, 6, 0, 2, 0, 3, 6, 3, 3, 5, 3]
+                + [6, 1, 0, 3, 0, 6, 3, 4, 5, 0, 4, 2],
+            ),
+        ),
+    ),
+    (
+        "Othello",
+        Othello,
+        evalua,
+        ordena_jugadas,
+        (
+            ("inicial", "apertura", 5, []),
+            (
+                "medio",
+                "medio juego",
+                4,
+                [(5, 4), (5, 3), (2, 2), (3, 5), (6, 3), (4, 2), (3, 6), (2, 6)]
+                + [(3, 2), (4, 6), (4, 1), (6, 2), (4, 5), (4, 0), (5, 0), (7, 3)]
+                + [(3, 0), (6, 5), (5, 5), (2, 3)],
+            ),
+            (
+                "final",
+                "final",
+                5,
+                [(5, 4), (5, 3), (2, 2), (3, 5), (6, 3), (4, 2), (3, 6), (2, 6)]
+                + [(3, 2), (4, 6), (4, 1), (6, 2), (4, 5), (4, 0), (5, 0), (7, 3)]
+                + [(3, 0), (6, 5), (5, 5), (2, 3), (3, 7), (1, 2), (6, 4), (2, 4)]
+                + [(5, 6), (7, 5), (3, 1), (2, 1), (1, 4), (4, 7), (5, 1), (2, 5)]
+                + [(5, 7), (6, 6), (5, 2), (6, 0), (1, 3), (0, 3), (0, 2), (0, 1)]
+                + [(7, 2), (1, 1), (6, 7), (7, 7), (1, 7), (2, 0), (2, 7), (0, 7)],
+            ),
+        ),
+    ),
+)
+
+
+def posicion(juego, jugadas):
+    """
+    Devuelve (estado, jugador) después de hacer las jugadas desde la
+    posición inicial
+
+    """
+    s, j = juego.inicializa()
+    for a in jugadas:
+        s, j = juego.transicion(s, a, j), -j
+    return s, j
+
+
+def corre_suite(semilla=0, juegos=None, repeticiones=3):
+    """
+    Busca cada posición de la suite a su profundidad
+
+    Cada búsqueda se repite y se toma la más rápida, para que el ruido
+    del sistema afecte menos a los nodos por segundo. Las repeticiones
+    deben visitar los mismos nodos y elegir la misma jugada.
+
+    Parametros
+    ----------
+    semilla (int): Semilla del orden aleatorio de las jugadas
+    juegos (list): Nombres de los juegos a correr. Si None, todos
+    repeticiones (int): Veces que se busca cada posición
+
+    Regresa
+    -------
+    list: un diccionario por posición, con juego, posicion, fase,
+        profundidad, jugada, nodos, segundos, nps y tiempos (segundos
+        para completar cada profundidad)
+
+    """
+    resultados = []
+    for nombre, modelo, ev, ordena, posiciones in POSICIONES:
+        if juegos is not None and nombre not in juegos:
+            continue
+        juego = modelo()
+        for etiqueta, fase, d, jugadas in posiciones:
+            s, j = posicion(juego, jugadas)
+            corridas = []
+            for _ in range(repeticiones):
+                t0 = perf_counter()
+                a, estadisticas = minimax_iterativo(
+                    juego,
+                    s,
+                    j,
+                    tiempo=1e9,
+                    ordena=ordena,
+                    d=d,
+                    evalua=ev,
+                    busqueda=Busqueda(semilla=semilla),
+                    estadisticas=True,
+                )
+                corridas.append((perf_counter() - t0, a, estadisticas))
+            if len({(c[1], c[2].nodos) for c in corridas}) != 1:
+                raise AssertionError(f"{nombre} {etiqueta} no es reproducible")
+            segundos, a, estadisticas = min(corridas, key=lambda c: c[0])
+            resultados.append(
+                {
+                    "juego": nombre,
+                    "posicion": etiqueta,
+                    "fase": fase,
+                    "profundidad": d,
+                    "jugada": a,
+                    "nodos": estadisticas.nodos,
+                    "segundos": segundos,
+                    "nps": estadisticas.nodos / segundos,
+                    "tiempos": [it.segundos for it in estadisticas.iteraciones],
+                }
+            )
+    return resultados
+
+
+def guarda(resultados, archivo):
+    """
+    Guarda los resultados de la suite en un archivo JSON
+
+    """
+    with open(archivo, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "maquina": platform.machine(),
+                "resultados": resultados,
+            },
+            f,
+            indent=2,
+        )
+
+
+def carga(archivo):
+    """
+    Lee los resultados de la suite de un archivo JSON
+
+    """
+    with open(archivo) as f:
+        return json.load(f)["resultados"]
+
+
+def compara(base, actual, umbral=0.1):
+    """
+    Compara los resultados `actual` contra `base` posición por posición
+
+    Regresa
+    -------
+    tuple: (lineas, regresiones), las líneas del reporte y el número de
+        posiciones con más nodos o menos nodos por segundo que la base,
+        fuera del umbral
+
+    """
+    anteriores = {(r["juego"], r["posicion"]): r for r in base}
+    lineas, regresiones = [], 0
+    for r in actual:
+        b = anteriores.get((r["juego"], r["posicion"]))
+        nombre = f"{r['juego']:9} {r['posicion']:8}"
+        if b is None or b["profundidad"] != r["profundidad"]:
+            lineas.append(f"{nombre} sin base comparable")
+            continue
+        nodos, nps = r["nodos"] / b["nodos"], r["nps"] / b["nps"]
+        marcas = []
+        if nodos > 1 + umbral:
+            marcas.append("MÁS NODOS")
+        if nps < 1 - umbral:
+            marcas.append("MÁS LENTO")
+        regresiones += bool(marcas)
+        if json.loads(json.dumps(r["jugada"])) != b["jugada"]:
+            marcas.append(f"jugada {b['jugada']} -> {r['jugada']}")
+        lineas.append(
+            f"{nombre} nodos x{nodos:.3f}  nps x{nps:.3f}  " + " ".join(marcas)
+        )
+    return lineas, regresiones
+
+
+def reporte(resultados):
+    """
+    Líneas con los resultados de la suite
+
+    """
+    return [
+        f"{r['juego']:9} {r['posicion']:8} d={r['profundidad']:2d} "
+        f"{r['nodos']:8d} nodos {r['segundos']:7.2f} s {r['nps']:9.0f} nps"
+        f"  jugada {r['jugada']}"
+        for r in resultados
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--salida", help="archivo JSON para los resultados")
+    parser.add_argument("--base", help="archivo JSON con resultados a comparar")
+    parser.add_argument("--umbral", type=float, default=0.1)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--juegos", nargs="*", help="Gato, Conecta4, Othello")
+    args = parser.parse_args()
+
+    resultados = corre_suite(args.semilla, args.juegos, args.repeticiones)
+    print("\n".join(reporte(resultados)))
+    if args.salida:
+        guarda(resultados, args.salida)
+    if args.base:
+        lineas, regresiones = compara(carga(args.base), resultados, args.umbral)
+        print("\n".join(lineas))
+        if regresiones:
+            print(f"{regresiones} posiciones con regresión")
+            sys.exit(1)
@@ -0,0 +1,212 @@
+"""
+Pruebas de equivalencia de las variantes de la búsqueda y de los modelos
+
+Cada optimización tiene que encontrar lo mismo que la versión sencilla:
+la tabla de transposición, PVS, las claves canónicas, la evaluación por
+lotes, los modelos incrementales y los de hacer y deshacer dan el mismo
+valor en la raíz que el negamax sin ellas; los modelos de tableros de
+bits, los mismos conteos de perft y las mismas partidas que los
+originales. Los tiempos y los nodos están en `benchmark.py`.
+
+    python -m pytest -q test_equivalencias.py
+
+"""
+
+from random import Random
+
+from benchmark import ContadorNodos, apertura_aleatoria, casos_bitboard, final_aleatorio
+from minimax import Busqueda, minimax_iterativo, negamax
+from transposicion import TablaTransposicion
+
+
+def valor_negamax(juego, s, j, semilla=0, **opciones):
+    """
+    Valor en la raíz del negamax con una Busqueda de semilla fija
+
+    """
+    if opciones.get("busqueda") is None:
+        opciones["busqueda"] = Busqueda(semilla=semilla)
+    _, v = negamax(juego, s, j, **opciones)
+    return v
+
+
+def test_tabla():
+    for _, juego, d, ev, ordena in casos_bitboard(6, 4):
+        s, j = juego.inicializa()
+        sin_tabla = Busqueda(transp=TablaTransposicion(0), semilla=0)
+        assert valor_negamax(
+            juego, s, j, ordena=ordena, d=d, evalua=ev, busqueda=sin_tabla
+        ) == valor_negamax(juego, s, j, ordena=ordena, d=d, evalua=ev)
+
+
+def test_pvs():
+    from othello import ordena_jugadas
+    from othello_bitboard import OthelloBitboard, evalua_bits
+
+    juego = OthelloBitboard()
+    s, j = apertura_aleatoria(juego, 20, 1)
+    opciones = dict(ordena=ordena_jugadas, d=4, evalua=evalua_bits)
+    valor = valor_negamax(juego, s, j, **opciones)
+    assert valor_negamax(juego, s, j, pvs=True, **opciones) == valor
+    for aspiracion in (None, 0.05):
+        busqueda = Busqueda(semilla=0)
+        minimax_iterativo(
+            juego,
+            s,
+            j,
+            tiempo=1e6,
+            busqueda=busqueda,
+            pvs=True,
+            aspiracion=aspiracion,
+            **opciones,
+        )
+        assert busqueda.valor == valor
+
+
+def test_simetrias():
+    from gato import Gato
+    from othello import Othello, evalua, ordena_jugadas
+
+    for juego, d, ev, ordena in (
+        (Gato(), None, None, None),
+        (Othello(), 3, evalua, ordena_jugadas),
+    ) + tuple(caso[1:] for caso in casos_bitboard(6, 3)):
+        s, j = juego.inicializa()
+        opciones = dict(ordena=ordena, d=d, evalua=ev)
+        canonicas = Busqueda(semilla=0, simetrias=True)
+        assert valor_negamax(
+            juego, s, j, busqueda=canonicas, **opciones
+        ) == valor_negamax(juego, s, j, **opciones)
+
+
+def test_lotes():
+    from conect4 import Conecta4, evalua_3con, evalua_3con_lote, ordena_centro
+    from othello import Othello, evalua, evalua_lote, ordena_jugadas
+
+    for juego, d, ev, lote, ordena in (
+        (Conecta4(), 5, evalua_3con, evalua_3con_lote, ordena_centro),
+        (Othello(), 3, evalua, evalua_lote, ordena_jugadas),
+    ):
+        s, j = apertura_aleatoria(juego, 4, 1)
+        opciones = dict(ordena=ordena, d=d, evalua=ev)
+        assert valor_negamax(
+            juego, s, j, evalua_lote=lote, **opciones
+        ) == valor_negamax(juego, s, j, **opciones)
+
+
+def test_incremental():
+    from conect4 import (
+        Conecta4,
+        Conecta4Incremental,
+        evalua_3con,
+        evalua_3con_incremental,
+        ordena_centro,
+    )
+    from juegos_simplificado import verifica_incremental
+    from othello import (
+        Othello,
+        OthelloIncremental,
+        evalua,
+        evalua_incremental,
+        ordena_jugadas,
+    )
+
+    for completo, incremental, ev, ev_incremental, ordena, d in (
+        (
+            Conecta4(),
+            Conecta4Incremental(),
+            evalua_3con,
+            evalua_3con_incremental,
+            ordena_centro,
+            5,
+        ),
+        (
+            Othello(),
+            OthelloIncremental(),
+            evalua,
+            evalua_incremental,
+            ordena_jugadas,
+            3,
+        ),
+    ):
+        verifica_incremental(incremental, ((ev_incremental, ev),), partidas=10)
+        s, j = apertura_aleatoria(completo, 4, 1)
+        t, _ = apertura_aleatoria(incremental, 4, 1)
+        assert valor_negamax(
+            completo, s, j, ordena=ordena, d=d, evalua=ev
+        ) == valor_negamax(incremental, t, j, ordena=ordena, d=d, evalua=ev_incremental)
+
+
+def test_hace_deshace():
+    from conect4 import Conecta4, evalua_3con, ordena_centro
+    from gato import Gato
+    from othello import Othello, evalua, ordena_jugadas
+
+    for juego, d, ev, ordena, jugadas in (
+        (Gato(), 7, lambda s: 0, None, 0),
+        (Conecta4(), 5, evalua_3con, ordena_centro, 4),
+        (Othello(), 3, evalua, ordena_jugadas, 4),
+    ):
+        s, j = apertura_aleatoria(juego, jugadas, 1)
+        valores = set()
+        for mutable in (False, True):
+            modelo = ContadorNodos(juego)
+            modelo.hace_y_deshace = mutable
+            valores.add(valor_negamax(modelo, s, j, ordena=ordena, d=d, evalua=ev))
+        assert len(valores) == 1
+
+
+def test_final():
+    from othello_bitboard import OthelloBitboard
+    from othello_final import resuelve
+
+    juego = OthelloBitboard()
+    azar = Random(0)
+    for _ in range(3):
+        s, j = final_aleatorio(juego, 8, azar)
+        _, diferencia, _ = resuelve(s.negras, s.blancas, j)
+        v = valor_negamax(juego, s, j)
+        assert v == (diferencia > 0) - (diferencia < 0)
+
+
+def test_perft():
+    from conect4_bitboard import verifica_perft
+    from gato import Gato
+    from othello import Othello
+    from othello_bitboard import OthelloBitboard
+    from perft import CONOCIDOS, verifica
+
+    verifica(Gato(), CONOCIDOS["gato"])
+    for juego in (Othello(), OthelloBitboard()):
+        verifica(juego, CONOCIDOS["othello"], 4)
+    verifica_perft(5)
+
+
+def test_paridad_othello_bitboard():
+    from othello_bitboard import verifica_paridad
+
+    verifica_paridad(partidas=10)
+
+
+def test_registros():
+    from conect4_bitboard import Conecta4Bitboard
+    from othello_bitboard import OthelloBitboard
+    from registros import verifica
+
+    for juego in (Conecta4Bitboard(), OthelloBitboard()):
+        verifica(juego, partidas=5)
+
+
+def test_ajuste():
+    from ajuste import verifica
+    from conect4_bitboard import Conecta4Bitboard
+    from othello_bitboard import OthelloBitboard
+
+    for juego in (Conecta4Bitboard(), OthelloBitboard()):
+        verifica(juego, partidas=2)
+
+
+def test_sprt():
+    from torneo import verifica_sprt
+
+    verifica_sprt()
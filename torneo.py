@@ -0,0 +1,515 @@
+"""
+Torneos entre configuraciones del motor, sin jugadores manuales
+
+Dos motores (profundidad o tiempo, `ordena`, `evalua`, ...) juegan
+muchas partidas entre sí. Cada partida empieza con unas jugadas al azar
+(la apertura) y cada apertura se juega dos veces, una con cada motor
+como jugador 1, para que la ventaja de salida se cancele. Las partidas
+se reparten entre varios procesos y cada una se escribe como una línea
+JSON en cuanto termina, con sus jugadas, el resultado y el tiempo, los
+nodos, la profundidad y el valor de cada jugada. Con
+`registros.de_torneo` las partidas se convierten en posiciones.
+
+El marcador (Elo y SPRT) se actualiza con cada partida, así que el
+torneo se puede detener en cuanto el SPRT decide:
+
+    python torneo.py conecta4 --profundidades 4 5 --partidas 1000 \\
+        --procesos 4 --sprt 0 50 --salida partidas.jsonl
+
+"""
+
+import argparse
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import Random
+from time import perf_counter
+from typing import Callable, NamedTuple, Optional
+
+from conect4 import Conecta4, evalua_3con, ordena_centro
+from gato import Gato
+from minimax import Busqueda, minimax_iterativo
+from othello import Othello, evalua, ordena_jugadas
+from suite import evalua_gato
+
+# Cuantil de la normal para los márgenes de 95% del Elo
+Z_95 = 1.959964
+
+# Partidas ficticias (un tercio victoria, un tercio empate y un tercio
+# derrota) que se suman a los resultados en el SPRT, para que la varianza
+# no sea 0 cuando todas las partidas terminan igual
+PSEUDOPARTIDAS = 1
+
+
+class Motor(NamedTuple):
+    """
+    Configuración de un jugador negamax para el torneo
+
+    `evalua` y `ordena` deben ser funciones de módulo para que se puedan
+    mandar a otros procesos. Con d se busca a esa profundidad (con
+    `tiempo` como límite duro); sin d, con profundización iterativa
+    durante `tiempo` segundos por jugada. Con `libro` (aperturas.Libro)
+    las posiciones del libro se juegan sin buscar.
+
+    """
+
+    nombre: str
+    evalua: Callable
+    ordena: Optional[Callable] = None
+    d: Optional[int] = None
+    tiempo: float = 1.0
+    pvs: bool = False
+    simetrias: bool = False
+    libro: Optional[object] = None
+
+
+def apertura(juego, plies, azar):
+    """
+    Lista de `plies` jugadas al azar desde la posición inicial que no
+    terminan la partida
+
+    """
+    while True:
+        s, j = juego.inicializa()
+        jugadas = []
+        for _ in range(plies):
+            if juego.terminal(s):
+                break
+            a = azar.choice(list(juego.jugadas_legales(s, j)))
+            s, j = juego.transicion(s, a, j), -j
+            jugadas.append(a)
+        if not juego.terminal(s):
+            return jugadas
+
+
+def juega_partida(modelo, motor1, motor2, inicio=(), semilla=0):
+    """
+    Juega una partida entre dos motores
+
+    Parametros
+    ----------
+    modelo: Clase del juego (ModeloJuegoZT2); se instancia en el proceso
+        que juega
+    motor1, motor2 (Motor): Motores del jugador 1 y del jugador -1
+    inicio (list): Jugadas de la apertura
+    semilla (int): Semilla del orden aleatorio de las búsquedas
+
+    Regresa
+    -------
+    dict: jugador1, jugador2 (nombres), apertura, jugadas (una por
+        jugada después de la apertura, con jugada, segundos, nodos,
+        profundidad y valor para quien juega) y ganancia (para el
+        jugador 1)
+
+    """
+    juego = modelo()
+    s, j = juego.inicializa()
+    for a in inicio:
+        s, j = juego.transicion(s, a, j), -j
+    motores = {1: motor1, -1: motor2}
+    busquedas = {
+        jugador: Busqueda(semilla=semilla + (jugador < 0), simetrias=m.simetrias)
+        for jugador, m in motores.items()
+    }
+    jugadas = []
+    while not juego.terminal(s):
+        t0 = perf_counter()
+        if juego.pase is not None and juego.jugadas_legales(s, j) == [juego.pase]:
+            a, nodos, profundidad, valor = juego.pase, 0, 0, None
+        else:
+            motor = motores[j]
+            a, estadisticas = minimax_iterativo(
+                juego,
+                s,
+                j,
+                tiempo=motor.tiempo,
+                ordena=motor.ordena,
+                d=motor.d,
+                evalua=motor.evalua,
+                busqueda=busquedas[j],
+                pvs=motor.pvs,
+                estadisticas=True,
+                libro=motor.libro,
+            )
+            nodos, valor = estadisticas.nodos, busquedas[j].valor
+            profundidad = busquedas[j].profundidad
+        jugadas.append(
+            {
+                "jugada": a,
+                "segundos": perf_counter() - t0,
+                "nodos": nodos,
+                "profundidad": profundidad,
+                "valor": valor,
+            }
+        )
+        s, j = juego.transicion(s, a, j), -j
+    return {
+        "jugador1": motor1.nombre,
+        "jugador2": motor2.nombre,
+        "apertura": list(inicio),
+        "jugadas": jugadas,
+        "ganancia": juego.ganancia(s),
+    }
+
+
+def puntos(ganancia):
+    """
+    Puntos del jugador 1 con la ganancia dada: 1, 1/2 o 0
+
+    """
+    return 1.0 if ganancia > 0 else 0.5 if ganancia == 0 else 0.0
+
+
+def puntaje_esperado(elo):
+    """
+    Puntaje esperado por partida con esa diferencia de Elo (modelo logístico)
+
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def diferencia_elo(puntaje):
+    """
+    Diferencia de Elo que corresponde a un puntaje medio por partida
+
+    """
+    if puntaje <= 0:
+        return -math.inf
+    if puntaje >= 1:
+        return math.inf
+    return -400 * math.log10(1 / puntaje - 1)
+
+
+class Marcador:
+    """
+    Resultados de un motor contra otro, que se actualizan partida por
+    partida
+
+    El SPRT compara la hipótesis H0 (la diferencia de Elo es elo0) contra
+    H1 (es elo1) con la aproximación normal del cociente de
+    verosimilitudes (GSPRT) sobre el modelo logístico; se acepta una
+    hipótesis cuando el logaritmo del cociente (`llr`) sale de los
+    límites de Wald para los errores alfa y beta. La varianza del LLR se
+    calcula con PSEUDOPARTIDAS partidas ficticias de más, así que una
+    racha de resultados iguales (todas victorias o todos empates, común
+    con motores deterministas) también llega a uno de los límites.
+
+    Parametros
+    ----------
+    elo0, elo1 (float): Diferencias de Elo de las hipótesis del SPRT. Si
+        elo0 es None, no se hace SPRT
+    alfa, beta (float): Probabilidades de aceptar H1 siendo cierta H0 y
+        de aceptar H0 siendo cierta H1
+
+    """
+
+    def __init__(self, elo0=None, elo1=None, alfa=0.05, beta=0.05):
+        self.victorias = 0
+        self.empates = 0
+        self.derrotas = 0
+        self.elo0, self.elo1 = elo0, elo1
+        self.inferior = math.log(beta / (1 - alfa))
+        self.superior = math.log((1 - beta) / alfa)
+
+    def registra(self, puntos):
+        """
+        Agrega una partida con los puntos (1, 1/2 o 0) del motor
+
+        """
+        if puntos == 1:
+            self.victorias += 1
+        elif puntos == 0:
+            self.derrotas += 1
+        else:
+            self.empates += 1
+
+    @property
+    def partidas(self):
+        return self.victorias + self.empates + self.derrotas
+
+    @property
+    def puntaje(self):
+        """
+        Puntos por partida
+
+        """
+        if not self.partidas:
+            return 0.5
+        return (self.victorias + self.empates / 2) / self.partidas
+
+    @property
+    def varianza(self):
+        """
+        Varianza de los puntos de una partida
+
+        """
+        if not self.partidas:
+            return 0.0
+        return _varianza(self.victorias, self.empates, self.derrotas)
+
+    @property
+    def elo(self):
+        return diferencia_elo(self.puntaje)
+
+    @property
+    def margen(self):
+        """
+        Intervalo de 95% de la diferencia de Elo, como (mínimo, máximo)
+
+        """
+        if not self.partidas:
+            return -math.inf, math.inf
+        error = Z_95 * math.sqrt(self.varianza / self.partidas)
+        return (
+            diferencia_elo(self.puntaje - error),
+            diferencia_elo(self.puntaje + error),
+        )
+
+    @property
+    def llr(self):
+        """
+        Logaritmo del cociente de verosimilitudes de H1 contra H0
+
+        """
+        if self.elo0 is None or not self.partidas:
+            return 0.0
+        ficticias = PSEUDOPARTIDAS / 3
+        victorias = self.victorias + ficticias
+        empates = self.empates + ficticias
+        derrotas = self.derrotas + ficticias
+        puntaje = (victorias + empates / 2) / (victorias + empates + derrotas)
+        s0, s1 = puntaje_esperado(self.elo0), puntaje_esperado(self.elo1)
+        return (
+            self.partidas
+            * (s1 - s0)
+            * (2 * puntaje - s0 - s1)
+            / (2 * _varianza(victorias, empates, derrotas))
+        )
+
+    @property
+    def decision(self):
+        """
+        "H1" o "H0" si el SPRT ya aceptó una hipótesis, si no None
+
+        """
+        llr = self.llr
+        if llr >= self.superior:
+            return "H1"
+        if llr <= self.inferior:
+            return "H0"
+        return None
+
+    def __str__(self):
+        minimo, maximo = self.margen
+        linea = (
+            f"{self.partidas} partidas +{self.victorias} ={self.empates} "
+            f"-{self.derrotas}  Elo {self.elo:+.1f} [{minimo:+.1f}, {maximo:+.1f}]"
+        )
+        if self.elo0 is not None:
+            linea += f"  LLR {self.llr:.2f} [{self.inferior:.2f}, {self.superior:.2f}]"
+        return linea
+
+
+def _varianza(victorias, empates, derrotas):
+    """
+    Varianza de los puntos de una partida con esos resultados (pueden ser
+    fraccionarios)
+
+    """
+    partidas = victorias + empates + derrotas
+    p = (victorias + empates / 2) / partidas
+    return (
+        victorias * (1 - p) ** 2 + empates * (0.5 - p) ** 2 + derrotas * p**2
+    ) / partidas
+
+
+def verifica_sprt(elo0=0, elo1=50, maximo=2000):
+    """
+    Revisa que el SPRT decida con rachas de un solo resultado: H1 con
+    puras victorias y H0 con puros empates o puras derrotas, antes de
+    `maximo` partidas. Necesita 0 <= elo0 < elo1.
+
+    Regresa
+    -------
+    dict: partidas que tardó cada racha en decidir
+
+    """
+    partidas = {}
+    for puntos, esperada in ((1, "H1"), (0.5, "H0"), (0, "H0")):
+        marcador = Marcador(elo0, elo1)
+        while marcador.decision is None and marcador.partidas < maximo:
+            marcador.registra(puntos)
+        if marcador.decision != esperada:
+            raise AssertionError(
+                f"{puntos} puntos por partida: {marcador.decision} "
+                f"después de {marcador.partidas} partidas, se esperaba {esperada}"
+            )
+        partidas[puntos] = marcador.partidas
+    return partidas
+
+
+def torneo(
+    modelo,
+    motor_a,
+    motor_b,
+    partidas=100,
+    plies=4,
+    procesos=1,
+    semilla=0,
+    salida=None,
+    sprt=None,
+    alfa=0.05,
+    beta=0.05,
+):
+    """
+    Juega un torneo de motor_a contra motor_b
+
+    Es un generador: regresa (registro, marcador) conforme terminan las
+    partidas, que con procesos > 1 no es el orden en que se mandaron. El
+    registro es el de `juega_partida` con además partida (número) y
+    puntos (de motor_a); el marcador (Marcador) es desde el punto de
+    vista de motor_a. Si el SPRT decide, las partidas pendientes se
+    cancelan y el generador termina.
+
+    Parametros
+    ----------
+    partidas (int): Número de partidas; las partidas 2k y 2k + 1 usan la
+        misma apertura con los colores invertidos
+    plies (int): Jugadas al azar de cada apertura
+    procesos (int): Procesos que juegan partidas al mismo tiempo
+    salida (str): Archivo JSON lines donde se escribe cada partida
+    sprt (tuple): (elo0, elo1) para detener el torneo con un SPRT
+    alfa, beta (float): Errores del SPRT (ver `Marcador`)
+
+    """
+    azar = Random(semilla)
+    juego = modelo()
+    aperturas = [apertura(juego, plies, azar) for _ in range((partidas + 1) // 2)]
+    argumentos = []
+    for k in range(partidas):
+        motores = (motor_a, motor_b) if k % 2 == 0 else (motor_b, motor_a)
+        argumentos.append((modelo, *motores, aperturas[k // 2], semilla + 2 * k))
+    marcador = Marcador(*(sprt or (None, None)), alfa, beta)
+    archivo = open(salida, "w") if salida is not None else None
+    try:
+        if procesos > 1:
+            alberca = ProcessPoolExecutor(procesos)
+            try:
+                futuros = {
+                    alberca.submit(juega_partida, *x): k
+                    for k, x in enumerate(argumentos)
+                }
+                terminadas = ((futuros[f], f.result()) for f in as_completed(futuros))
+                for resultado in _registra(terminadas, marcador, archivo):
+                    yield resultado
+                    if marcador.decision is not None:
+                        return
+            finally:
+                # También si quien consume el generador deja de pedir
+                alberca.shutdown(cancel_futures=True)
+        else:
+            terminadas = ((k, juega_partida(*x)) for k, x in enumerate(argumentos))
+            for resultado in _registra(terminadas, marcador, archivo):
+                yield resultado
+                if marcador.decision is not None:
+                    return
+    finally:
+        if archivo is not None:
+            archivo.close()
+
+
+def _registra(terminadas, marcador, archivo):
+    """
+    Anota en el marcador y en el archivo cada (número, registro) de
+    partida terminada
+
+    """
+    for k, registro in terminadas:
+        registro = {"partida": k, **registro}
+        registro["puntos"] = puntos(registro["ganancia"] * (1 if k % 2 == 0 else -1))
+        marcador.registra(registro["puntos"])
+        if archivo is not None:
+            archivo.write(json.dumps(registro) + "\n")
+            archivo.flush()
+        yield registro, marcador
+
+
+def _modelos():
+    return {
+        "gato": (Gato, evalua_gato, None),
+        "conecta4": (Conecta4, evalua_3con, ordena_centro),
+        "othello": (Othello, evalua, ordena_jugadas),
+    }
+
+
+if __name__ == "__main__":
+    modelos = _modelos()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("juego", choices=sorted(modelos))
+    parser.add_argument("--profundidades", type=int, nargs=2, metavar=("A", "B"))
+    parser.add_argument("--tiempos", type=float, nargs=2, metavar=("A", "B"))
+    parser.add_argument("--partidas", type=int, default=100)
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="archivo JSON lines para las partidas")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"))
+    parser.add_argument("--cada", type=int, default=10, help="partidas por reporte")
+    parser.add_argument(
+        "--ajustada",
+        choices=("A", "B"),
+        nargs="*",
+        default=(),
+        help="motores con la evaluación y el orden de ajuste.py",
+    )
+    parser.add_argument("--libro", help="libro de aperturas.py")
+    parser.add_argument(
+        "--con-libro",
+        choices=("A", "B"),
+        nargs="*",
+        default=("A", "B"),
+        help="motores que usan el libro",
+    )
+    args = parser.parse_args()
+
+    modelo, ev, ordena = modelos[args.juego]
+    profundidades = args.profundidades or (None, None)
+    # Con profundidad fija el tiempo solo es un límite de seguridad
+    tiempos = args.tiempos or ((1.0, 1.0) if args.profundidades is None else (60, 60))
+    motores = []
+    for nombre, d, t in zip("AB", profundidades, tiempos):
+        motor = Motor(nombre + " " + (f"d={d}" if d is not None else f"{t:g} s"), ev)
+        motor = motor._replace(ordena=ordena, d=d, tiempo=t)
+        if nombre in args.ajustada:
+            from ajuste import Evaluacion
+
+            ajustada = Evaluacion(modelo())
+            motor = motor._replace(
+                nombre=motor.nombre + " ajustada",
+                evalua=ajustada,
+                ordena=ajustada.ordena,
+            )
+        if args.libro is not None and nombre in args.con_libro:
+            from aperturas import abre
+
+            motor = motor._replace(
+                nombre=motor.nombre + " libro", libro=abre(args.libro)
+            )
+        motores.append(motor)
+    marcador = None
+    for registro, marcador in torneo(
+        modelo,
+        *motores,
+        args.partidas,
+        args.plies,
+        args.procesos,
+        args.semilla,
+        args.salida,
+        args.sprt,
+    ):
+        if marcador.partidas % args.cada == 0:
+            print(marcador)
+    if marcador is not None:
+        print(marcador)
+        if marcador.decision is not None:
+            print(f"SPRT: se acepta {marcador.decision}")
@@ -0,0 +1,480 @@
+"""
+Tablas de transposición para el negamax
+
+    1- Claves Zobrist para tableros de casillas
+    2- Claves canónicas para tableros con simetrías
+    3- Tabla de capacidad fija, con límite de memoria en megabytes
+    4- Tabla en memoria compartida entre procesos, sin candados
+
+Las claves son enteros de 64 bits. Cada juego las calcula con su método
+`clave` (ver `juegos_simplificado.ModeloJuegoZT2`); los juegos con
+tableros de bits las actualizan de forma incremental en `transicion`.
+
+"""
+
+import struct
+import weakref
+from array import array
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from random import Random
+
+import numpy as np
+
+MASCARA_64 = (1 << 64) - 1
+
+# Se combina con la clave del estado cuando el jugador en turno es -1
+TURNO = Random("turno").getrandbits(64)
+
+# Profundidad con la que se guarda una búsqueda hasta el final del juego
+PROFUNDIDAD_TOTAL = 10000
+
+# Tipos de cota del valor guardado
+EXACTO, INFERIOR, SUPERIOR = 0, 1, 2
+
+# Memoria aproximada por entrada: clave (8), valor (8), profundidad (2),
+# tipo de cota (1), edad (1) y la referencia a la mejor jugada (8)
+BYTES_POR_ENTRADA = 28
+
+# Las entradas de la tabla compartida son tres palabras de 64 bits
+BYTES_POR_ENTRADA_COMPARTIDA = 24
+
+
+class ZobristCasillas:
+    """
+    Claves Zobrist para un tablero de `casillas` casillas, donde cada
+    casilla puede tener una ficha del jugador 1, del jugador -1 o estar
+    vacía (0)
+
+    """
+
+    def __init__(self, casillas, semilla=0):
+        azar = Random(semilla)
+        self.jugador1 = tuple(azar.getrandbits(64) for _ in range(casillas))
+        self.jugador2 = tuple(azar.getrandbits(64) for _ in range(casillas))
+        self.cambio = tuple(a ^ b for a, b in zip(self.jugador1, self.jugador2))
+        self._arreglo1 = np.array(self.jugador1, dtype=np.uint64)
+        self._arreglo2 = np.array(self.jugador2, dtype=np.uint64)
+
+    def ficha(self, casilla, j):
+        """
+        Clave de una ficha del jugador j en la casilla
+
+        """
+        return self.jugador1[casilla] if j == 1 else self.jugador2[casilla]
+
+    def clave(self, s):
+        """
+        Clave de una secuencia de casillas con valores 1, -1 o 0
+
+        """
+        clave = 0
+        for casilla, x in enumerate(s):
+            if x == 1:
+                clave ^= self.jugador1[casilla]
+            elif x == -1:
+                clave ^= self.jugador2[casilla]
+        return clave
+
+    def clave_arreglo(self, s):
+        """
+        Clave de un arreglo de NumPy con valores 1, -1 o 0
+
+        """
+        plano = s.ravel()
+        return int(
+            np.bitwise_xor.reduce(self._arreglo1[plano == 1])
+            ^ np.bitwise_xor.reduce(self._arreglo2[plano == -1])
+        )
+
+    def clave_bits(self, uno, dos):
+        """
+        Clave de dos tableros de bits, uno por jugador
+
+        """
+        clave = 0
+        for fichas, claves in ((uno, self.jugador1), (dos, self.jugador2)):
+            while fichas:
+                b = fichas & -fichas
+                clave ^= claves[b.bit_length() - 1]
+                fichas ^= b
+        return clave
+
+
+def permutaciones_diedrales(n):
+    """
+    Las ocho simetrías de un tablero de n x n (rotaciones y reflejos),
+    empezando por la identidad. Cada una es una tupla con la casilla del
+    tablero original que va a cada casilla del tablero transformado.
+
+    """
+    transformaciones = (
+        lambda i, j: (i, j),
+        lambda i, j: (n - 1 - i, j),
+        lambda i, j: (i, n - 1 - j),
+        lambda i, j: (n - 1 - i, n - 1 - j),
+        lambda i, j: (j, i),
+        lambda i, j: (n - 1 - j, i),
+        lambda i, j: (j, n - 1 - i),
+        lambda i, j: (n - 1 - j, n - 1 - i),
+    )
+    return tuple(
+        tuple(n * f(i, j)[0] + f(i, j)[1] for i in range(n) for j in range(n))
+        for f in transformaciones
+    )
+
+
+def permutaciones_espejo(filas, columnas):
+    """
+    La identidad y el reflejo izquierda-derecha de un tablero de
+    filas x columnas, como en `permutaciones_diedrales`
+
+    """
+    return (
+        tuple(range(filas * columnas)),
+        tuple(
+            columnas * i + columnas - 1 - j
+            for i in range(filas)
+            for j in range(columnas)
+        ),
+    )
+
+
+class SimetriasCasillas:
+    """
+    Claves canónicas para un tablero de casillas con simetrías
+
+    La clave canónica de un estado es la menor de las claves Zobrist de
+    sus transformaciones, así que un estado y sus simétricos comparten
+    entrada en la tabla de transposición. Las claves de cada simetría se
+    precalculan por casilla, de modo que las de todas las simetrías se
+    obtienen en una pasada por el tablero.
+
+    Parametros
+    ----------
+    zobrist (ZobristCasillas): Claves de las casillas
+    permutaciones (tuple): Para cada simetría, la casilla del tablero
+        original que va a cada casilla del tablero transformado. La
+        primera debe ser la identidad, para que su clave sea la de
+        `zobrist`.
+
+    """
+
+    def __init__(self, zobrist, permutaciones):
+        n = len(permutaciones[0])
+        self.permutaciones = tuple(tuple(p) for p in permutaciones)
+        self.inversas = tuple(
+            tuple(sorted(range(n), key=p.__getitem__)) for p in self.permutaciones
+        )
+        # Clave de una ficha en la casilla i del original dentro de cada
+        # tablero transformado, con las casillas como índice principal
+        self._jugador1 = tuple(
+            tuple(zobrist.jugador1[inv[i]] for inv in self.inversas) for i in range(n)
+        )
+        self._jugador2 = tuple(
+            tuple(zobrist.jugador2[inv[i]] for inv in self.inversas) for i in range(n)
+        )
+        self._arreglo1 = np.array(self._jugador1, dtype=np.uint64)
+        self._arreglo2 = np.array(self._jugador2, dtype=np.uint64)
+
+    def clave(self, s):
+        """
+        (clave canónica, simetría) de una secuencia de casillas con
+        valores 1, -1 o 0
+
+        """
+        claves = [0] * len(self.permutaciones)
+        for casilla, x in enumerate(s):
+            if x == 1:
+                fichas = self._jugador1[casilla]
+            elif x == -1:
+                fichas = self._jugador2[casilla]
+            else:
+                continue
+            claves = [c ^ f for c, f in zip(claves, fichas)]
+        clave = min(claves)
+        return clave, claves.index(clave)
+
+    def clave_arreglo(self, s):
+        """
+        (clave canónica, simetría) de un arreglo de NumPy con valores 1,
+        -1 o 0
+
+        """
+        plano = s.ravel()
+        claves = np.bitwise_xor.reduce(
+            self._arreglo1[plano == 1], axis=0, initial=0
+        ) ^ np.bitwise_xor.reduce(self._arreglo2[plano == -1], axis=0, initial=0)
+        k = int(claves.argmin())
+        return int(claves[k]), k
+
+    def transforma(self, casilla, simetria):
+        """
+        Casilla que ocupa, en el tablero transformado por la simetría, la
+        casilla dada del original
+
+        """
+        return self.inversas[simetria][casilla]
+
+    def original(self, casilla, simetria):
+        """
+        Inverso de `transforma`
+
+        """
+        return self.permutaciones[simetria][casilla]
+
+
+class TablaTransposicion:
+    """
+    Tabla de transposición de tamaño fijo
+
+    Las entradas se guardan en arreglos preasignados y se organizan en
+    cubetas de dos lugares: el primero se reemplaza solo por búsquedas
+    de igual o mayor profundidad, el segundo siempre se reemplaza. Así la
+    memoria no crece sin importar cuánto dure la búsqueda.
+
+    Cada entrada guarda el valor, la profundidad a la que se buscó, si el
+    valor es exacto o solo una cota (INFERIOR cuando la búsqueda se cortó
+    por beta, SUPERIOR cuando ninguna jugada superó a alpha) y la mejor
+    jugada encontrada.
+
+    La tabla tiene una edad que se incrementa con `envejece` al empezar
+    la búsqueda de otra posición. Las entradas de edades anteriores se
+    reemplazan en el lugar por profundidad aunque sean más profundas.
+
+    Parametros
+    ----------
+    mb (float): Memoria aproximada que puede usar la tabla, en megabytes.
+        Con 0 la tabla no guarda nada.
+
+    """
+
+    def __init__(self, mb=16):
+        self.cubetas = int(mb * 2**20) // (2 * BYTES_POR_ENTRADA)
+        if mb and not self.cubetas:
+            self.cubetas = 1
+        n = 2 * self.cubetas
+        self.claves = array("Q", bytes(8 * n))
+        self.valores = array("d", bytes(8 * n))
+        self.profundidades = array("h", [-1]) * n
+        self.tipos = array("b", bytes(n))
+        self.edades = array("B", bytes(n))
+        self.jugadas = [None] * n
+        self.edad = 0
+
+    def __len__(self):
+        return 2 * self.cubetas
+
+    def limpia(self):
+        """
+        Borra todas las entradas
+
+        """
+        self.profundidades = array("h", [-1]) * len(self)
+        self.jugadas = [None] * len(self)
+
+    def envejece(self):
+        """
+        Marca como viejas a todas las entradas guardadas hasta ahora
+
+        """
+        self.edad = (self.edad + 1) % 256
+
+    def busca(self, clave):
+        """
+        Devuelve el índice de la entrada con la clave, o None
+
+        """
+        if not self.cubetas:
+            return None
+        i = 2 * (clave % self.cubetas)
+        if self.claves[i] == clave and self.profundidades[i] >= 0:
+            return i
+        if self.claves[i + 1] == clave and self.profundidades[i + 1] >= 0:
+            return i + 1
+        return None
+
+    def entrada(self, clave):
+        """
+        Devuelve (valor, profundidad, tipo, jugada) de la entrada con la
+        clave, o None
+
+        """
+        i = self.busca(clave)
+        if i is None:
+            return None
+        return self.valores[i], self.profundidades[i], self.tipos[i], self.jugadas[i]
+
+    def guarda(self, clave, valor, profundidad, tipo=EXACTO, jugada=None):
+        """
+        Guarda una entrada. Si la entrada del lugar por profundidad es de
+        esta edad y más profunda que la nueva, la nueva va al lugar de
+        reemplazo; si no, la anterior pasa al lugar de reemplazo
+
+        Regresa
+        -------
+        bool: True si se perdió la entrada de otra posición (la que estaba
+            en el lugar de reemplazo)
+
+        """
+        if not self.cubetas:
+            return False
+        i = 2 * (clave % self.cubetas)
+        reemplazo = False
+        if self.claves[i] != clave and self.profundidades[i] >= 0:
+            reemplazo = self.claves[i + 1] != clave and self.profundidades[i + 1] >= 0
+            if profundidad < self.profundidades[i] and self.edades[i] == self.edad:
+                i += 1
+            else:
+                self._copia(i, i + 1)
+        self.claves[i] = clave
+        self.valores[i] = valor
+        self.profundidades[i] = profundidad
+        self.tipos[i] = tipo
+        self.edades[i] = self.edad
+        self.jugadas[i] = jugada
+        return reemplazo
+
+    def _copia(self, origen, destino):
+        self.claves[destino] = self.claves[origen]
+        self.valores[destino] = self.valores[origen]
+        self.profundidades[destino] = self.profundidades[origen]
+        self.tipos[destino] = self.tipos[origen]
+        self.edades[destino] = self.edades[origen]
+        self.jugadas[destino] = self.jugadas[origen]
+
+
+def _bits(x):
+    return struct.unpack("<Q", struct.pack("<d", x))[0]
+
+
+def _flotante(b):
+    return struct.unpack("<d", struct.pack("<Q", b))[0]
+
+
+class TablaCompartida:
+    """
+    Tabla de transposición en memoria compartida, para que varios procesos
+    busquen con la misma tabla (ver `minimax.minimax_iterativo` con
+    workers)
+
+    Cada entrada son tres palabras de 64 bits:
+
+        datos = profundidad + 1 | tipo << 16 | edad << 18 | (jugada + 1) << 26
+        valor = los bits del valor (float64)
+        verificacion = clave ^ valor ^ datos
+
+    No se usan candados: si dos procesos escriben la misma entrada a la
+    vez, la verificación no coincide con la clave y la entrada se ignora.
+    Las cubetas, el reemplazo y la edad funcionan igual que en
+    `TablaTransposicion`. Las jugadas se guardan como enteros con
+    `codifica_jugada` y `decodifica_jugada` del juego.
+
+    La tabla se crea en el proceso que la construye y se libera cuando
+    ese objeto se recolecta; al enviarla a otro proceso (con pickle) ese
+    proceso solo se conecta a la misma memoria.
+
+    Parametros
+    ----------
+    juego (ModeloJuegoZT2): Juego del que se guardan posiciones
+    mb (float): Memoria que puede usar la tabla, en megabytes
+
+    """
+
+    def __init__(self, juego, mb=16):
+        self.juego = juego
+        self.cubetas = max(1, int(mb * 2**20) // (2 * BYTES_POR_ENTRADA_COMPARTIDA))
+        self.edad = 0
+        self._memoria = SharedMemory(
+            create=True, size=2 * self.cubetas * BYTES_POR_ENTRADA_COMPARTIDA
+        )
+        self._conecta()
+        self._entradas[:] = 0
+        weakref.finalize(self, _libera, self._memoria)
+
+    def _conecta(self):
+        self._entradas = np.ndarray(
+            (2 * self.cubetas, 3), dtype=np.uint64, buffer=self._memoria.buf
+        )
+
+    def __getstate__(self):
+        return self.juego, self.cubetas, self.edad, self._memoria.name
+
+    def __setstate__(self, estado):
+        self.juego, self.cubetas, self.edad, nombre = estado
+        self._memoria = SharedMemory(name=nombre)
+        # Quien libera la memoria es el proceso que la creó
+        resource_tracker.unregister(self._memoria._name, "shared_memory")
+        self._conecta()
+        weakref.finalize(self, self._memoria.close)
+
+    def __len__(self):
+        return 2 * self.cubetas
+
+    def limpia(self):
+        """
+        Borra todas las entradas
+
+        """
+        self._entradas[:] = 0
+
+    def envejece(self):
+        """
+        Marca como viejas a todas las entradas guardadas hasta ahora
+
+        """
+        self.edad = (self.edad + 1) % 256
+
+    def _lee(self, i):
+        verificacion, valor, datos = self._entradas[i].tolist()
+        if not datos:
+            return None, 0, 0
+        return verificacion ^ valor ^ datos, valor, datos
+
+    def entrada(self, clave):
+        """
+        Devuelve (valor, profundidad, tipo, jugada) de la entrada con la
+        clave, o None
+
+        """
+        i = 2 * (clave % self.cubetas)
+        for k in (i, i + 1):
+            clave_k, valor, datos = self._lee(k)
+            if clave_k == clave:
+                codigo = datos >> 26
+                return (
+                    _flotante(valor),
+                    (datos & 0xFFFF) - 1,
+                    (datos >> 16) & 0b11,
+                    None if codigo == 0 else self.juego.decodifica_jugada(codigo - 1),
+                )
+        return None
+
+    def guarda(self, clave, valor, profundidad, tipo=EXACTO, jugada=None):
+        """
+        Guarda una entrada, con el mismo reemplazo y el mismo resultado
+        que `TablaTransposicion.guarda`
+
+        """
+        i = 2 * (clave % self.cubetas)
+        clave_i, _, datos_i = self._lee(i)
+        reemplazo = False
+        if clave_i is not None and clave_i != clave:
+            clave_r = self._lee(i + 1)[0]
+            reemplazo = clave_r is not None and clave_r != clave
+            if (datos_i & 0xFFFF) - 1 > profundidad and (
+                datos_i >> 18
+            ) & 0xFF == self.edad:
+                i += 1
+            else:
+                self._entradas[i + 1] = self._entradas[i]
+        codigo = 0 if jugada is None else self.juego.codifica_jugada(jugada) + 1
+        datos = (profundidad + 1) | tipo << 16 | self.edad << 18 | codigo << 26
+        valor = _bits(valor)
+        self._entradas[i] = (clave ^ valor ^ datos, valor, datos)
+        return reemplazo
+
+
+def _libera(memoria):
+    memoria.close()
+    memoria.unlink()